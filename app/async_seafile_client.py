@@ -0,0 +1,208 @@
+"""
+Асинхронный клиент Seafile (httpx) с тем же набором методов, что и SeafileClient.
+
+Нужен async-маршрутам и воркерам: запросы не занимают поток из threadpool, а ссылки на
+файлы галереи или матрицы дизайнов запрашиваются параллельно на одном event loop.
+Если установлен пакет h2, соединение с сервером идёт по HTTP/2 и параллельные запросы
+мультиплексируются в одном TCP+TLS соединении; без h2 используется пул HTTP/1.1.
+
+Повторы 429/5xx и статистика вызовов — те же, что у http_pool; содержимое папок берётся
+из общего listing_cache, так что синхронный и асинхронный клиенты не дублируют запросы.
+"""
+
+import asyncio
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import http_pool, seafile_guard
+from .listing_cache import ListingCache, shared as shared_listing_cache
+from .seafile_client import LINK_WORKERS, fallback_listing
+
+TIMEOUT = 15
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class AsyncSeafileClient:
+    def __init__(
+        self,
+        server: str,
+        repo_id: str,
+        token: str,
+        listing_cache: Optional[ListingCache] = None,
+        max_concurrency: int = LINK_WORKERS,
+    ):
+        self.server = server
+        self.repo_id = repo_id
+        self.token = token
+        # SEAFILE_SERVER обычно просто хост; со схемой (http://127.0.0.1:8800) — адрес как есть
+        self.base_url = f"{server.rstrip('/') if '://' in server else 'https://' + server}/api2"
+        self.listing_cache = listing_cache or shared_listing_cache()
+        self.max_concurrency = max_concurrency
+        self.http2 = _http2_available()
+        self._client = None
+        self._loop = None
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Token {self.token}"}
+
+    def _http(self):
+        # Соединения httpx привязаны к event loop, поэтому клиент создаётся заново для нового loop
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            try:
+                import httpx
+            except ImportError as e:
+                raise RuntimeError("AsyncSeafileClient требует пакет httpx") from e
+            limits = httpx.Limits(
+                max_connections=http_pool.POOL_MAXSIZE, max_keepalive_connections=http_pool.POOL_CONNECTIONS
+            )
+            self._client = httpx.AsyncClient(
+                http2=self.http2, limits=limits, timeout=TIMEOUT, headers=self._headers()
+            )
+            self._loop = loop
+            self._pending = {}
+        return self._client
+
+    async def _get(self, url: str, label: str, **kwargs):
+        """
+        GET с повторами 429/5xx и сетевых ошибок (как Retry в http_pool) и записью в http_pool.stats().
+        Перед запросом — ограничитель и предохранитель seafile_guard, итог запроса уходит туда же.
+        """
+        wait = seafile_guard.admit()
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            response = await self._get_with_retries(url, label, **kwargs)
+        except Exception as e:
+            seafile_guard.record_result(None, e)
+            raise
+        except BaseException:
+            # Отмена (asyncio.CancelledError) — не сбой Seafile, но если это был пробный запрос,
+            # его надо отпустить, иначе предохранитель останется полуоткрытым без пробы навсегда
+            seafile_guard.breaker.release_probe()
+            raise
+        seafile_guard.record_result(response.status_code)
+        return response
+
+    async def _get_with_retries(self, url: str, label: str, **kwargs):
+        started = time.perf_counter()
+        response = None
+        retries = 0
+        try:
+            while True:
+                try:
+                    response = await self._http().get(url, **kwargs)
+                except Exception:
+                    if retries >= http_pool.RETRY_TOTAL:
+                        raise
+                else:
+                    if response.status_code not in http_pool.RETRY_STATUSES or retries >= http_pool.RETRY_TOTAL:
+                        return response
+                    await response.aclose()
+                retry_after = response.headers.get("Retry-After") if response is not None else None
+                delay = http_pool.RETRY_BACKOFF * (2 ** retries) + random.uniform(0, http_pool.RETRY_JITTER)
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                retries += 1
+                response = None
+                await asyncio.sleep(delay)
+        finally:
+            error = response is None or response.status_code >= 400
+            http_pool.record_call(label, (time.perf_counter() - started) * 1000, error, retries)
+
+    async def list_directory(self, path: str = "/", fresh: bool = False) -> List[Dict]:
+        """Содержимое папки; в пределах TTL — из общего кеша, одновременные запросы одной папки объединяются."""
+        if fresh:
+            return await self._fetch_directory(path)
+        key = (self.repo_id, "/" + path.strip("/"))
+        items = self.listing_cache.peek(key)
+        if items is None:
+            self._http()
+            future = self._pending.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self._load_directory(key, path))
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._pending.pop(key, None))
+            try:
+                items = await asyncio.shield(future)
+            except seafile_guard.SeafileUnavailable:
+                items = fallback_listing(self.listing_cache, key)
+        return [dict(item) for item in items]
+
+    async def _load_directory(self, key: Tuple[str, str], path: str) -> List[Dict]:
+        epoch = self.listing_cache.epoch
+        items = await self._fetch_directory(path)
+        self.listing_cache.put(key, items, epoch)
+        return items
+
+    async def _fetch_directory(self, path: str) -> List[Dict]:
+        url = f"{self.base_url}/repos/{self.repo_id}/dir/"
+        response = await self._get(url, "seafile.list_directory", params={"p": path})
+        response.raise_for_status()
+        return response.json()
+
+    async def get_file_download_link(self, file_path: str) -> str:
+        url = f"{self.base_url}/repos/{self.repo_id}/file/"
+        if not file_path.startswith("/"):
+            file_path = "/" + file_path
+        response = await self._get(url, "seafile.download_link", params={"p": file_path, "reuse": "1"})
+        response.raise_for_status()
+        # Seafile возвращает прямую ссылку текстом (может быть в кавычках)
+        return response.text.strip().strip('"')
+
+    async def get_file_download_links(
+        self, file_paths: Iterable[str], max_concurrency: Optional[int] = None
+    ) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """Как SeafileClient.get_file_download_links: (ссылки, ошибки), не больше max_concurrency запросов сразу."""
+        paths = list(dict.fromkeys(p for p in file_paths if p))
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.max_concurrency))
+
+        async def resolve(path: str) -> str:
+            async with semaphore:
+                return await self.get_file_download_link(path)
+
+        results = await asyncio.gather(*(resolve(p) for p in paths), return_exceptions=True)
+        links: Dict[str, str] = {}
+        errors: Dict[str, Exception] = {}
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                errors[path] = result
+            else:
+                links[path] = result
+        return links, errors
+
+    async def list_file_links(self, folder_path: str) -> List[str]:
+        """Вернуть прямые ссылки на все файлы в указанной папке."""
+        if not folder_path.startswith("/"):
+            folder_path = "/" + folder_path
+        items = await self.list_directory(folder_path)
+        file_paths = [
+            item.get("path") or f"{folder_path.rstrip('/')}/{item.get('name')}"
+            for item in items
+            if item.get("type") == "file"
+        ]
+        links, errors = await self.get_file_download_links(file_paths)
+        if errors:
+            raise next(iter(errors.values()))
+        return [links[path] for path in file_paths]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+    async def __aenter__(self) -> "AsyncSeafileClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
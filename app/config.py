@@ -20,10 +20,20 @@ class Settings(BaseSettings):
     # Telegram for lead notifications
     telegram_bot_token: Optional[str] = Field(None, env="TELEGRAM_BOT_TOKEN")
     telegram_chat_id: Optional[str] = Field(None, env="TELEGRAM_CHAT_ID")
+    # Адреса API можно подменить локальными заглушками (scripts/fake_services.py)
+    telegram_api_url: str = Field("https://api.telegram.org", env="TELEGRAM_API_URL")
+
+    # При промахе кеша отдавать картинки через потоковый прокси /api/media/... (см. services/media_proxy)
+    media_proxy: bool = Field(True, env="MEDIA_PROXY")
+    # Отдача /static: app (Range/206 в приложении), x-accel (nginx) или x-sendfile — см. static_files.py
+    media_serve_mode: str = Field("app", env="MEDIA_SERVE_MODE")
+    # internal-location nginx, указывающий на app/static (для x-accel)
+    media_accel_prefix: str = Field("/protected-static/", env="MEDIA_ACCEL_PREFIX")
 
     # Ozon Seller API
     ozon_client_id: Optional[str] = Field(None, env="OZON_CLIENT_ID")
     ozon_api_key: Optional[str] = Field(None, env="OZON_API_KEY")
+    ozon_api_url: str = Field("https://api-seller.ozon.ru", env="OZON_API_URL")
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
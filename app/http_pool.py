@@ -0,0 +1,106 @@
+"""
+Общий пул HTTP-соединений для Seafile (API и скачивание файлов через seafhttp).
+
+Одна requests.Session на процесс: соединения переиспользуются (keep-alive), поэтому прогрев
+тысяч файлов открывает несколько TCP+TLS соединений, а не по одному на запрос.
+Временные ошибки (429, 5xx, обрыв соединения) повторяются с экспоненциальной задержкой и
+случайным разбросом (jitter), Retry-After от сервера учитывается. Время каждого вызова
+копится в статистике по меткам (stats()).
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Сколько разных хостов держать в пуле (API Seafile, seafhttp, ...)
+POOL_CONNECTIONS = 10
+# Соединений на хост: не меньше числа потоков прогрева (scripts/warm_media_cache.py --workers)
+POOL_MAXSIZE = 32
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5  # 0.5 с, 1 с, 2 с ...
+RETRY_JITTER = 0.3  # + до 0.3 с случайно, чтобы параллельные потоки не повторяли запросы синхронно
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def _retry() -> Retry:
+    options = dict(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        # После исчерпания попыток отдаём последний ответ, raise_for_status решает вызывающий код
+        raise_on_status=False,
+    )
+    try:
+        return Retry(backoff_jitter=RETRY_JITTER, **options)
+    except TypeError:
+        # urllib3 < 2.0 не умеет jitter
+        return Retry(**options)
+
+
+def create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=_retry())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def record_call(label: str, elapsed_ms: float, error: bool, retries: int) -> None:
+    with _stats_lock:
+        entry = _stats.setdefault(label, {"count": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+        entry["count"] += 1
+        entry["errors"] += int(error)
+        entry["retries"] += retries
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+
+def get(url: str, label: str, session: Optional[requests.Session] = None, **kwargs) -> requests.Response:
+    """
+    session.get с учётом времени под меткой label. Для stream=True время — до получения заголовков,
+    тело читает вызывающий код.
+    """
+    started = time.perf_counter()
+    response = None
+    try:
+        response = (session or get_session()).get(url, **kwargs)
+        return response
+    finally:
+        retries = 0
+        if response is not None:
+            history = getattr(getattr(response.raw, "retries", None), "history", None)
+            retries = len(history) if history else 0
+        error = response is None or response.status_code >= 400
+        record_call(label, (time.perf_counter() - started) * 1000, error, retries)
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    with _stats_lock:
+        return {
+            label: {
+                **entry,
+                "total_ms": round(entry["total_ms"], 1),
+                "max_ms": round(entry["max_ms"], 1),
+                "avg_ms": round(entry["total_ms"] / entry["count"], 1) if entry["count"] else 0.0,
+            }
+            for label, entry in _stats.items()
+        }
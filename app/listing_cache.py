@@ -0,0 +1,129 @@
+"""
+Кеш содержимого папок Seafile (list_directory) с TTL и объединением одинаковых запросов.
+
+Браузер Seafile в админке, загрузка галереи в machine_to_dict и cache_machine_media читают
+одни и те же папки. Ответ хранится TTL секунд; если несколько потоков одновременно просят
+папку, которой нет в кеше, в Seafile уходит один запрос, остальные ждут его результат.
+Ошибки не кешируются. После изменения папки её (и вложенные папки) можно сбросить через invalidate.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_TTL = 60.0
+# Сколько папок держать в памяти; старые вытесняются первыми
+MAX_ENTRIES = 2000
+
+Key = Tuple[str, str]  # (repo_id, path)
+
+
+class ListingCache:
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Key, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._pending: Dict[Key, Future] = {}
+        self._lock = threading.Lock()
+        # Растёт при каждом invalidate: ответ, начатый до сброса, в кеш уже не кладём
+        self._epoch = 0
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    def get(self, key: Key, loader: Callable[[], List[Dict]]) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[1]
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+                epoch = self._epoch
+                self._counters["misses"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+                self._counters["errors"] += 1
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._pending.pop(key, None)
+            if epoch == self._epoch and self.ttl > 0:
+                self._store(key, value)
+        future.set_result(value)
+        return value
+
+    def peek(self, key: Key, stale: bool = False) -> Optional[List[Dict]]:
+        """
+        Свежий ответ из кеша без загрузки (для асинхронного клиента, который грузит сам).
+        stale=True — вернуть и просроченный ответ (когда Seafile недоступен, лучше старый список, чем ошибка).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] <= time.monotonic() and not stale):
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[1]
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def put(self, key: Key, value: List[Dict], epoch: Optional[int] = None) -> None:
+        """Кладёт ответ, загруженный снаружи; epoch — значение self.epoch на момент начала загрузки."""
+        with self._lock:
+            self._counters["misses"] += 1
+            if self.ttl > 0 and (epoch is None or epoch == self._epoch):
+                self._store(key, value)
+
+    def _store(self, key: Key, value: List[Dict]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, path: Optional[str] = None, recursive: bool = True) -> int:
+        """Сбрасывает папку path (и вложенные, если recursive) во всех библиотеках; без path — всё."""
+        with self._lock:
+            self._epoch += 1
+            if path is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            target = "/" + path.strip("/")
+            prefix = target.rstrip("/") + "/"
+            keys = [
+                key for key in self._entries
+                if key[1] == target or (recursive and key[1].startswith(prefix))
+            ]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"ttl": self.ttl, "entries": len(self._entries), "in_flight": len(self._pending), **self._counters}
+
+
+_shared = ListingCache()
+
+
+def shared() -> ListingCache:
+    """Общий кеш процесса: им пользуются все SeafileClient, если не передан свой."""
+    return _shared
@@ -1,6 +1,5 @@
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from starlette.responses import JSONResponse, RedirectResponse
 from datetime import datetime
@@ -10,6 +9,7 @@ from .config import Settings
 from .database import Base, engine
 from sqlalchemy import text
 from .routes import router as api_router
+from .static_files import MediaStaticFiles
 from . import models  # noqa: F401
 
 settings = Settings()
@@ -24,7 +24,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount(
+    "/static",
+    MediaStaticFiles(
+        directory="app/static",
+        serve_mode=settings.media_serve_mode,
+        accel_prefix=settings.media_accel_prefix,
+    ),
+    name="static",
+)
 
 Base.metadata.create_all(bind=engine)
 
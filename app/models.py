@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, Integer, String, Text, DateTime
+from sqlalchemy import Column, Float, Integer, String, Text, DateTime, UniqueConstraint
 from sqlalchemy.types import JSON
 from datetime import datetime
 
@@ -52,3 +52,36 @@ class Lead(Base):
     email = Column(String(255), nullable=True)
     selection_data = Column(JSON, nullable=True)  # Данные о выбранной конфигурации
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class MediaAsset(Base):
+    """Манифест закешированных картинок: одна строка на main / design-комбинацию / файл галереи."""
+
+    __tablename__ = "media_assets"
+    __table_args__ = (UniqueConstraint("machine_id", "kind", "key", name="uq_media_assets_machine_kind_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    machine_id = Column(Integer, nullable=False, index=True)
+    kind = Column(String(20), nullable=False)  # main / design / gallery
+    key = Column(String(255), nullable=False, default="")  # design: "<frame>/<insert>", gallery: имя файла
+    source_path = Column(String(500), index=True)  # путь в Seafile
+    file_id = Column(String(64))  # id объекта в Seafile (меняется при изменении файла)
+    local_url = Column(String(500), index=True)  # /static/cache/machines/...
+    size = Column(Integer)
+    sha256 = Column(String(64))
+    content_type = Column(String(100))
+    # Производные файлы: {"gzip": url, "br": url, ...}
+    variants = Column(JSON, nullable=True)
+    # Размеры и размытая заглушка (data URI WebP) для резервирования места на фронтенде
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    placeholder = Column(Text, nullable=True)
+    last_access_at = Column(DateTime, nullable=True)
+    verified_at = Column(DateTime, nullable=True)
+    # Негативный кеш: неудачные скачивания не повторяются до retry_after (экспоненциальная задержка)
+    failure_count = Column(Integer, default=0, nullable=False)
+    last_error = Column(String(500), nullable=True)
+    last_failure_at = Column(DateTime, nullable=True)
+    retry_after = Column(DateTime, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
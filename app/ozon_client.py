@@ -5,10 +5,10 @@ import requests
 
 
 class OzonClient:
-    def __init__(self, client_id: str, api_key: str):
+    def __init__(self, client_id: str, api_key: str, base_url: str = "https://api-seller.ozon.ru"):
         self.client_id = client_id
         self.api_key = api_key
-        self.base_url = "https://api-seller.ozon.ru"
+        self.base_url = base_url.rstrip("/")
 
     def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         url = self.base_url + path
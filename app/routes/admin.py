@@ -1,24 +1,27 @@
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, Request, UploadFile
 from starlette.responses import RedirectResponse
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
-from .. import crud
+from .. import crud, http_pool, seafile_guard
+from ..async_seafile_client import AsyncSeafileClient
 from ..auth import get_current_user
 from ..config import Settings
 from ..database import get_db
 from ..seafile_client import SeafileClient
 from ..services import import_export as import_service
-from ..services import media_cache
+from ..services import media_cache, media_manifest, seafile_tree
 
 router = APIRouter(prefix="/admin", dependencies=[Depends(get_current_user)])
 
 templates = Jinja2Templates(directory="app/templates")
 settings = Settings()
 seafile_client = SeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
+# Для async-обработчиков: не занимают threadpool, кеш папок общий с seafile_client
+async_seafile_client = AsyncSeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
 
 
 @router.get("/")
@@ -64,23 +67,141 @@ def export_data(format: str = "xlsx", db=Depends(get_db)):
 
 
 @router.get("/seafile-browser")
-def seafile_browser(path: str = "/"):
+async def seafile_browser(path: str = "/", fresh: bool = False):
     try:
-        contents = seafile_client.list_directory(path)
+        contents = await async_seafile_client.list_directory(path, fresh=fresh)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"Seafile request failed: {exc}")
     return {"path": path, "items": contents}
 
 
 @router.get("/seafile-file")
-def seafile_file(path: str):
+async def seafile_file(path: str):
     try:
-        link = seafile_client.get_file_download_link(path)
+        link = await async_seafile_client.get_file_download_link(path)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"Seafile request failed: {exc}")
     return {"path": path, "link": link}
 
 
+# Больше путей за раз не принимаем: один запрос не должен занимать пул соединений надолго
+MAX_BATCH_PATHS = 500
+
+
+@router.post("/seafile-files")
+async def seafile_files(paths: List[str] = Body(..., embed=True)):
+    """Ссылки на скачивание для списка файлов одним запросом (вместо /seafile-file на каждый)."""
+    if len(paths) > MAX_BATCH_PATHS:
+        raise HTTPException(status_code=400, detail=f"Не больше {MAX_BATCH_PATHS} путей за запрос")
+    links, errors = await async_seafile_client.get_file_download_links(paths)
+    if errors and not links:
+        raise HTTPException(status_code=502, detail=f"Seafile request failed: {next(iter(errors.values()))}")
+    return {"links": links, "errors": {path: str(exc) for path, exc in errors.items()}}
+
+
+@router.get("/media/pipeline-stats")
+def media_pipeline_stats():
+    return {"workers": media_cache.PIPELINE.max_workers, "stages": media_cache.PIPELINE.stats()}
+
+
+@router.get("/seafile/http-stats")
+def seafile_http_stats():
+    """Время и число вызовов Seafile по видам (API, скачивание файлов), повторы и ошибки."""
+    return {
+        "pool": {"connections": http_pool.POOL_CONNECTIONS, "maxsize": http_pool.POOL_MAXSIZE},
+        "calls": http_pool.stats(),
+        "listing_cache": seafile_client.listing_cache.stats(),
+        **seafile_guard.state(),
+    }
+
+
+@router.post("/seafile/breaker/reset")
+def seafile_breaker_reset():
+    """Замкнуть предохранитель вручную (например, после восстановления Seafile), не дожидаясь пробного запроса."""
+    seafile_guard.breaker.reset()
+    return seafile_guard.state()
+
+
+@router.post("/seafile/listing-cache/invalidate")
+def seafile_listing_cache_invalidate(path: Optional[str] = None, recursive: bool = True):
+    """Сбросить закешированное содержимое папки (и вложенных); без path — весь кеш."""
+    return {"path": path, "dropped": seafile_client.invalidate_directory(path, recursive)}
+
+
+@router.get("/seafile/tree")
+def seafile_tree_status():
+    """Сведения о снимке дерева Seafile, которым пользуются скрипты автоподбора и API."""
+    snapshot = seafile_tree.current()
+    return {"snapshot": snapshot.stats() if snapshot else None}
+
+
+@router.post("/seafile/tree/refresh")
+def seafile_tree_refresh(root: str = seafile_tree.DEFAULT_ROOT):
+    try:
+        snapshot = seafile_tree.get_snapshot(seafile_client, root, force=True)
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"Seafile request failed: {exc}")
+    return {"snapshot": snapshot.stats()}
+
+
+@router.get("/seafile/tree/find")
+def seafile_tree_find(name: str, type: Optional[str] = None, under: Optional[str] = None):
+    """Поиск папок/файлов по нормализованному имени в снимке (без запросов в Seafile, если head не менялся)."""
+    try:
+        snapshot = seafile_tree.get_snapshot(seafile_client)
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"Seafile request failed: {exc}")
+    return {"name": name, "items": snapshot.find(name, type=type, under=under)}
+
+
+@router.get("/media/manifest")
+def media_manifest_summary(machine_id: Optional[int] = None):
+    """Сводка по кешу из таблицы media_assets, без обхода диска."""
+    if machine_id is None:
+        return media_manifest.summary()
+    return [
+        {
+            "kind": a.kind,
+            "key": a.key,
+            "url": a.local_url,
+            "source_path": a.source_path,
+            "size": a.size,
+            "sha256": a.sha256,
+            "content_type": a.content_type,
+            "variants": a.variants,
+            "last_access_at": a.last_access_at,
+            "verified_at": a.verified_at,
+        }
+        for a in media_manifest.machine_assets(machine_id)
+    ]
+
+
+@router.get("/media/failures")
+def media_failures(active_only: bool = False):
+    """Файлы, которые не удалось скачать: причина, число попыток и когда будет следующая."""
+    return [
+        {
+            "id": a.id,
+            "machine_id": a.machine_id,
+            "kind": a.kind,
+            "key": a.key,
+            "source_path": a.source_path,
+            "failure_count": a.failure_count,
+            "last_error": a.last_error,
+            "last_failure_at": a.last_failure_at,
+            "retry_after": a.retry_after,
+            "cached_url": a.local_url,
+        }
+        for a in media_manifest.list_failures(active_only=active_only)
+    ]
+
+
+@router.post("/media/failures/reset")
+def media_failures_reset(asset_id: Optional[int] = None):
+    """Снимает задержку: следующий запрос снова попробует скачать файл."""
+    return {"reset": media_manifest.reset_failures(asset_id)}
+
+
 def _build_machine_payload(
     name: Optional[str],
     model: Optional[str],
@@ -1,22 +1,24 @@
 from typing import Any, Dict, List, Optional
 import requests
 import json
+from pathlib import Path
 from sqlalchemy.orm import Session
 
 from fastapi import APIRouter, Depends, HTTPException
+from starlette.responses import RedirectResponse, StreamingResponse
 
 from .. import crud
 from ..config import Settings
 from ..database import get_db
 from ..seafile_client import SeafileClient
 from ..ozon_client import OzonClient
-from ..services import media_cache
+from ..services import media_cache, media_manifest, media_proxy
 from ..models import Lead
 
 router = APIRouter(prefix="/api")
 settings = Settings()
 seafile_client = SeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
-ozon_client = OzonClient(settings.ozon_client_id or "", settings.ozon_api_key or "") if settings.ozon_client_id and settings.ozon_api_key else None
+ozon_client = OzonClient(settings.ozon_client_id or "", settings.ozon_api_key or "", settings.ozon_api_url) if settings.ozon_client_id and settings.ozon_api_key else None
 
 
 def machine_to_dict(
@@ -31,32 +33,61 @@ def machine_to_dict(
     main_source_path = None
     gallery_folder_override = None
 
+    main_is_design = False
+
     if frame_color and insert_color and machine.design_images:
         design_config = machine.design_images.get(frame_color, {}).get(insert_color, {})
         if design_config:
             main_source_path = design_config.get("main_image_path") or design_config.get("main_image")
+            main_is_design = bool(main_source_path)
             gallery_folder_override = design_config.get("gallery_folder")
 
     # Если не нашли в design_images, используем стандартные поля
     if not main_source_path:
         main_source_path = machine.main_image_path or machine.main_image
 
-    # Кеширование работает только для обычных main_image (без цветов)
-    # Для design_images возвращаем прямые Seafile ссылки без кеширования
+    # Все записи манифеста машины одним запросом: дальше кеш и негативный кеш проверяются по ним
+    assets = media_manifest.lookup_machine(machine.id)
+
+    # Закешированные файлы отдаются по URL с отпечатком содержимого (main.<hash>.svg)
     cached_main = None
     if not frame_color and not insert_color:
         # Обычная машина без выбора цветов - используем кеш
-        cached_main = media_cache.get_cached_main(machine.id)
-
-    if main_source_path:
+        cached_main = media_cache.get_cached_main(machine.id, assets)
+    elif frame_color and insert_color:
+        cached_main = media_cache.get_cached_design_image(machine.id, frame_color, insert_color, assets)
+
+    # Недавно не скачавшийся main не дёргаем до истечения задержки (негативный кеш)
+    main_backed_off = bool(
+        main_source_path
+        and not cached_main
+        and not frame_color
+        and not insert_color
+        and media_cache.is_backed_off(machine.id, media_manifest.MAIN, source_path=main_source_path, assets=assets)
+    )
+
+    # Потоковый прокси: клиент сразу получает картинку, а она параллельно пишется в кеш
+    proxied_main = None
+    if settings.media_proxy and main_source_path and not cached_main and not main_backed_off:
+        if main_is_design:
+            proxied_main = media_proxy.proxy_url(
+                machine.id, media_manifest.DESIGN, frame=frame_color, insert=insert_color
+            )
+        elif not main_source_path.startswith("/static/"):
+            proxied_main = media_proxy.proxy_url(machine.id, media_manifest.MAIN)
+
+    # Ссылку Seafile запрашиваем только если в кеше ничего нет
+    if main_source_path and not cached_main and not main_backed_off and not proxied_main:
         try:
             main_source_url = seafile_client.get_file_download_link(main_source_path)
-        except Exception:
+        except Exception as e:
             main_source_url = main_source_path
+            if not frame_color and not insert_color:
+                media_cache.record_fetch_failure(machine.id, media_manifest.MAIN, "", main_source_path, e)
 
     # Кешируем только обычные main_image
-    if not cached_main and main_source_url and not frame_color and not insert_color:
-        cached_main = media_cache.cache_main_image(machine.id, main_source_url)
+    if not cached_main and main_source_url and not frame_color and not insert_color and not main_backed_off:
+        cached_main = media_cache.cache_main_image(machine.id, main_source_url, source_path=main_source_path)
 
     # Используем переопределенную gallery_folder если есть
     effective_gallery_folder = gallery_folder_override or machine.gallery_folder
@@ -87,17 +118,35 @@ def machine_to_dict(
                     img_path = config.get("main_image_path") or config.get("main_image")
 
                     # Проверяем кеш
-                    cached_design = media_cache.get_cached_design_image(machine.id, frame_col, insert_col)
+                    cached_design = media_cache.get_cached_design_image(machine.id, frame_col, insert_col, assets)
                     if cached_design:
                         processed_config["main_image"] = cached_design
                         processed_config["main_image_path"] = img_path
                         print(f"  ✓ {frame_col}/{insert_col}: Using cached {cached_design}")
+                    elif media_cache.is_backed_off(
+                        machine.id,
+                        media_manifest.DESIGN,
+                        media_manifest.design_key(frame_col, insert_col),
+                        img_path,
+                        assets=assets,
+                    ):
+                        # Файл недавно не скачался — не повторяем до истечения задержки
+                        processed_config["main_image"] = img_path
+                        processed_config["main_image_path"] = img_path
+                        print(f"  ⏸  {frame_col}/{insert_col}: Skipped, recent download failure")
+                    elif settings.media_proxy:
+                        processed_config["main_image"] = media_proxy.proxy_url(
+                            machine.id, media_manifest.DESIGN, frame=frame_col, insert=insert_col
+                        )
+                        processed_config["main_image_path"] = img_path
                     else:
                         # Кеша нет, получаем Seafile ссылку и кешируем
                         try:
                             img_url = seafile_client.get_file_download_link(img_path)
                             # Кешируем на диск
-                            cached_design = media_cache.cache_design_image(machine.id, frame_col, insert_col, img_url)
+                            cached_design = media_cache.cache_design_image(
+                                machine.id, frame_col, insert_col, img_url, source_path=img_path
+                            )
                             if cached_design:
                                 processed_config["main_image"] = cached_design
                                 print(f"  ✓ {frame_col}/{insert_col}: Cached {img_path[:50]}... -> {cached_design}")
@@ -108,6 +157,9 @@ def machine_to_dict(
                             processed_config["main_image_path"] = img_path
                         except Exception as e:
                             print(f"  ❌ Failed to get Seafile link for {frame_col}/{insert_col}: {img_path} - {e}")
+                            media_cache.record_fetch_failure(
+                                machine.id, media_manifest.DESIGN, media_manifest.design_key(frame_col, insert_col), img_path, e
+                            )
                             # Если не удалось получить ссылку, используем путь как есть
                             processed_config["main_image"] = img_path
                             processed_config["main_image_path"] = img_path
@@ -132,35 +184,69 @@ def machine_to_dict(
         "ozon_link": machine.ozon_link,
         "ozon_price": None,
         "graphic_link": machine.graphic_link,
-        "main_image": cached_main or main_source_url or machine.main_image,
+        "main_image": cached_main or proxied_main or main_source_url or machine.main_image,
         "main_image_path": main_source_path,
         "gallery_folder": effective_gallery_folder,
         "description": machine.description,
         "design_images": processed_design_images,
     }
     if include_gallery and effective_gallery_folder:
-        cached_gallery = media_cache.get_cached_gallery(machine.id)
+        cached_gallery = media_cache.get_cached_gallery(machine.id, assets)
         if cached_gallery:
             dto["gallery_files"] = cached_gallery
         else:
-            # Если нет кеша, пробуем подтянуть и закешировать на лету
-            try:
-                folder_path = effective_gallery_folder
-                if not folder_path.startswith("/"):
-                    folder_path = "/" + folder_path
-                items = seafile_client.list_directory(folder_path)
-                files = []
-                for item in items:
-                    if item.get("type") != "file":
-                        continue
-                    file_path = item.get("path") or f"{folder_path.rstrip('/')}/{item.get('name')}"
-                    link = seafile_client.get_file_download_link(file_path)
-                    files.append((item.get("name"), link))
-                dto["gallery_files"] = media_cache.cache_gallery_files(machine.id, files)
-            except Exception:
+            folder_path = effective_gallery_folder
+            if not folder_path.startswith("/"):
+                folder_path = "/" + folder_path
+            # Галерея целиком попадает в негативный кеш (ключ ""), если не удалось закешировать ни одного файла
+            if media_cache.is_backed_off(machine.id, media_manifest.GALLERY, "", folder_path, assets=assets):
                 dto["gallery_files"] = []
+            else:
+                # Если нет кеша, пробуем подтянуть и закешировать на лету
+                try:
+                    items = seafile_client.list_directory(folder_path)
+                    file_items = [item for item in items if item.get("type") == "file"]
+                    if settings.media_proxy:
+                        # Папка дизайна передаётся цветами: прокси найдёт ту же gallery_folder, что и здесь
+                        design = {"frame": frame_color, "insert": insert_color} if gallery_folder_override else {}
+                        dto["gallery_files"] = [
+                            media_proxy.proxy_url(machine.id, media_manifest.GALLERY, name=item.get("name"), **design)
+                            for item in file_items
+                        ]
+                    else:
+                        paths = [
+                            item.get("path") or f"{folder_path.rstrip('/')}/{item.get('name')}" for item in file_items
+                        ]
+                        links, errors = seafile_client.get_file_download_links(paths)
+                        if errors:
+                            raise next(iter(errors.values()))
+                        files = [
+                            (item.get("name"), links[path], path, item.get("id"))
+                            for item, path in zip(file_items, paths)
+                        ]
+                        dto["gallery_files"] = media_cache.cache_gallery_files(machine.id, files)
+                        if files and not dto["gallery_files"]:
+                            raise RuntimeError(f"none of {len(files)} gallery files could be cached")
+                except Exception as e:
+                    dto["gallery_files"] = []
+                    media_cache.record_fetch_failure(machine.id, media_manifest.GALLERY, "", folder_path, e)
     # Ozon price fetching отключено: ozon_price оставляем None
 
+    # Размеры и размытые заглушки закешированных картинок — из тех же записей манифеста
+    design_configs = [
+        cfg for insert_colors in (processed_design_images or {}).values() for cfg in insert_colors.values()
+    ]
+    gallery_files = dto.get("gallery_files") or []
+    meta = media_cache.get_image_meta(
+        [dto["main_image"], *(cfg.get("main_image") for cfg in design_configs), *gallery_files], assets
+    )
+    dto["main_image_meta"] = meta.get(dto["main_image"])
+    for cfg in design_configs:
+        if cfg.get("main_image") in meta:
+            cfg["main_image_meta"] = meta[cfg["main_image"]]
+    if include_gallery:
+        dto["gallery_meta"] = [meta.get(url) for url in gallery_files]
+
     # Debug: проверяем финальный тип design_images в DTO
     if dto.get("design_images"):
         print(f"  📤 Returning design_images: type={type(dto['design_images'])}, keys={list(dto['design_images'].keys()) if isinstance(dto['design_images'], dict) else 'NOT A DICT'}")
@@ -214,6 +300,96 @@ def get_coffee_machine(
     return machine_to_dict(machine, include_gallery=include_gallery, frame_color=frame_color, insert_color=insert_color)
 
 
+@router.get("/media/{machine_id}/{kind}")
+def media_proxy_file(
+    machine_id: int,
+    kind: str,
+    frame: Optional[str] = None,
+    insert: Optional[str] = None,
+    name: Optional[str] = None,
+    db=Depends(get_db),
+):
+    """
+    Картинка записи через кеш: если файл уже закеширован — редирект на /static/...,
+    иначе поток из Seafile с одновременной записью в кеш (см. services/media_proxy).
+    kind: main | design (frame, insert) | gallery (name; frame, insert — для галереи дизайна)
+    """
+    machine = crud.get_coffee_machine(db, machine_id)
+    if not machine:
+        raise HTTPException(status_code=404, detail="Coffee machine not found")
+
+    if kind == media_manifest.MAIN:
+        key = ""
+        source_path = machine.main_image_path or machine.main_image
+        cached = media_cache.get_cached_main(machine_id)
+        dest = media_cache.main_destination(machine_id, source_path or "")
+    elif kind == media_manifest.DESIGN:
+        if not frame or not insert:
+            raise HTTPException(status_code=400, detail="frame and insert are required")
+        config = (machine.design_images or {}).get(frame, {}).get(insert, {})
+        key = media_manifest.design_key(frame, insert)
+        source_path = config.get("main_image_path") or config.get("main_image")
+        cached = media_cache.get_cached_design_image(machine_id, frame, insert)
+        dest = media_cache.design_destination(machine_id, frame, insert, source_path or "")
+    elif kind == media_manifest.GALLERY:
+        # Для дизайна (frame, insert) галерея может лежать в своей папке — как в machine_to_dict
+        design_config = (machine.design_images or {}).get(frame, {}).get(insert, {}) if frame and insert else {}
+        gallery_folder = design_config.get("gallery_folder") or machine.gallery_folder
+        if not name or not gallery_folder:
+            raise HTTPException(status_code=400, detail="name is required")
+        folder = gallery_folder if gallery_folder.startswith("/") else "/" + gallery_folder
+        source_path = f"{folder.rstrip('/')}/{Path(name).name}"
+        dest = media_cache.gallery_destination(machine_id, name, source_path)
+        key = dest.name
+        asset = media_manifest.lookup(machine_id, media_manifest.GALLERY, key)
+        cached = asset.local_url if asset is not None else None
+        if asset is None:
+            # Имя приходит от клиента: ссылку в Seafile (и запись о неудаче в манифест) делаем
+            # только для файла, который действительно лежит в папке галереи
+            try:
+                items = seafile_client.list_directory(folder)
+            except Exception as e:
+                print(f"⚠️  Gallery listing failed for machine {machine_id} ({folder}): {e}")
+                raise HTTPException(status_code=502, detail="Upstream error")
+            if Path(name).name not in {item.get("name") for item in items if item.get("type") == "file"}:
+                raise HTTPException(status_code=404, detail="Image not found")
+    else:
+        raise HTTPException(status_code=404, detail="Unknown media kind")
+
+    if cached:
+        return RedirectResponse(url=cached, status_code=307)
+    if not source_path:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if source_path.startswith("/static/"):
+        return RedirectResponse(url=source_path, status_code=307)
+    if media_cache.is_backed_off(machine_id, kind, key, source_path):
+        raise HTTPException(status_code=503, detail="Image is temporarily unavailable", headers={"Retry-After": "60"})
+
+    def resolve_url() -> str:
+        if source_path.startswith("/"):
+            return seafile_client.get_file_download_link(source_path)
+        return source_path
+
+    asset = {"machine_id": machine_id, "kind": kind, "key": key, "source_path": source_path, "file_id": None}
+    # Текст ошибки только в лог: исключения requests содержат URL, а это подписанная ссылка Seafile
+    try:
+        entry, handle = media_proxy.open_stream(dest, resolve_url, asset)
+    except Exception as e:
+        print(f"⚠️  Media proxy failed for machine {machine_id} {kind} {key}: {e}")
+        raise HTTPException(status_code=502, detail="Upstream error")
+    try:
+        entry.wait_for_headers()
+    except Exception as e:
+        handle.close()
+        print(f"⚠️  Media proxy failed for machine {machine_id} {kind} {key}: {e}")
+        raise HTTPException(status_code=502, detail="Upstream error")
+
+    headers = {"Cache-Control": "no-cache"}
+    if entry.content_length is not None:
+        headers["Content-Length"] = str(entry.content_length)
+    return StreamingResponse(entry.follow(handle), media_type=entry.content_type, headers=headers)
+
+
 @router.get("/models")
 def list_models(db=Depends(get_db)):
     return crud.get_models(db)
@@ -292,7 +468,7 @@ def send_to_telegram(lead_data: Dict[str, Any]) -> bool:
         return False
         
     # Формируем URL
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    url = f"{settings.telegram_api_url.rstrip('/')}/bot{bot_token}/sendMessage"
 
     # ВЫВОД В КОНСОЛЬ (Можно удалить потом)
     print("\n" + "="*40)
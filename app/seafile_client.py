@@ -1,46 +1,174 @@
-from typing import Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import requests
 from urllib.parse import quote
 
+from . import http_pool, seafile_guard
+from .listing_cache import ListingCache, shared as shared_listing_cache
+
+# Сколько ссылок на скачивание запрашивать параллельно (не больше соединений в пуле http_pool)
+LINK_WORKERS = 8
+
+
+def fallback_listing(cache: ListingCache, key: Tuple[str, str]) -> List[Dict]:
+    """
+    Содержимое папки, когда Seafile недоступен (seafile_guard): просроченный ответ из кеша
+    или снимок дерева. Если нет ни того, ни другого — SeafileUnavailable дальше.
+    """
+    items = cache.peek(key, stale=True)
+    if items is not None:
+        return items
+    from .services import seafile_tree
+
+    snapshot = seafile_tree.current()
+    if snapshot is not None and snapshot.covers(key[1]) and snapshot.is_dir(key[1]):
+        return snapshot.list_directory(key[1])
+    raise seafile_guard.SeafileUnavailable(f"Seafile unavailable and no cached listing for {key[1]}")
+
 
 class SeafileClient:
-    def __init__(self, server: str, repo_id: str, token: str):
+    def __init__(
+        self,
+        server: str,
+        repo_id: str,
+        token: str,
+        session: Optional[requests.Session] = None,
+        listing_cache: Optional[ListingCache] = None,
+    ):
         self.server = server
         self.repo_id = repo_id
         self.token = token
-        self.base_url = f"https://{server}/api2"
+        # SEAFILE_SERVER обычно просто хост; со схемой (http://127.0.0.1:8800) — адрес как есть
+        self.base_url = f"{server.rstrip('/') if '://' in server else 'https://' + server}/api2"
+        # Общий пул соединений с повторами (см. http_pool), его же используют скачивания файлов
+        self.session = session or http_pool.get_session()
+        # Кеш содержимого папок общий для всех клиентов процесса (см. listing_cache)
+        self.listing_cache = listing_cache or shared_listing_cache()
 
     def _headers(self) -> dict:
         return {"Authorization": f"Token {self.token}"}
 
-    def list_directory(self, path: str = "/") -> List[Dict]:
+    def _get(self, url: str, label: str, **kwargs) -> requests.Response:
+        """GET к API через ограничитель частоты и предохранитель (seafile_guard)."""
+        wait = seafile_guard.admit()
+        try:
+            if wait:
+                time.sleep(wait)
+            response = http_pool.get(url, label, self.session, headers=self._headers(), **kwargs)
+        except requests.RequestException as e:
+            seafile_guard.record_result(None, e)
+            raise
+        except BaseException:
+            # Не сетевая ошибка (или KeyboardInterrupt) ничего не говорит о Seafile,
+            # но пробный запрос полуоткрытого предохранителя надо отпустить
+            seafile_guard.breaker.release_probe()
+            raise
+        seafile_guard.record_result(response.status_code)
+        return response
+
+    def list_directory(self, path: str = "/", fresh: bool = False) -> List[Dict]:
+        """Содержимое папки; повторные запросы в пределах TTL отвечает кеш, fresh=True — всегда из Seafile."""
+        if fresh:
+            return self._fetch_directory(path)
+        key = (self.repo_id, "/" + path.strip("/"))
+        try:
+            items = self.listing_cache.get(key, lambda: self._fetch_directory(path))
+        except seafile_guard.SeafileUnavailable:
+            items = fallback_listing(self.listing_cache, key)
+        # Копии, чтобы вызывающий код не менял закешированный ответ
+        return [dict(item) for item in items]
+
+    def invalidate_directory(self, path: Optional[str] = None, recursive: bool = True) -> int:
+        return self.listing_cache.invalidate(path, recursive)
+
+    def _fetch_directory(self, path: str) -> List[Dict]:
         url = f"{self.base_url}/repos/{self.repo_id}/dir/"
         params = {"p": path}
-        response = requests.get(url, headers=self._headers(), params=params, timeout=15)
+        response = self._get(url, "seafile.list_directory", params=params, timeout=15)
         response.raise_for_status()
         return response.json()
 
+    def get_repo_head(self) -> str:
+        """Идентификатор текущего коммита библиотеки: меняется при любом изменении файлов."""
+        url = f"{self.base_url}/repos/{self.repo_id}/"
+        response = self._get(url, "seafile.repo_info", timeout=15)
+        response.raise_for_status()
+        info = response.json()
+        # Старые версии Seafile не отдают head_commit_id, тогда ориентируемся на корень и mtime
+        return str(info.get("head_commit_id") or info.get("root") or info.get("mtime") or "")
+
+    def list_directory_recursive(self, path: str = "/") -> List[Dict]:
+        """
+        Все файлы и папки под path одним списком; у каждого элемента есть parent_dir.
+        Если сервер не поддерживает recursive=1, дерево обходится по папкам.
+        """
+        url = f"{self.base_url}/repos/{self.repo_id}/dir/"
+        params = {"p": path, "recursive": "1"}
+        response = self._get(url, "seafile.list_recursive", params=params, timeout=60)
+        response.raise_for_status()
+        items = response.json()
+        if all("parent_dir" in item for item in items):
+            return items
+
+        # Без recursive=1 сервер вернул обычное содержимое path: с него и начинаем обход
+        result: List[Dict] = []
+        pending = [(path, items)]
+        while pending:
+            folder, listing = pending.pop()
+            for item in listing if listing is not None else self.list_directory(folder, fresh=True):
+                item = {**item, "parent_dir": folder}
+                result.append(item)
+                if item.get("type") == "dir":
+                    pending.append((f"{folder.rstrip('/')}/{item.get('name')}", None))
+        return result
+
     def get_file_download_link(self, file_path: str) -> str:
         url = f"{self.base_url}/repos/{self.repo_id}/file/"
         if not file_path.startswith("/"):
             file_path = "/" + file_path
         params = {"p": file_path, "reuse": "1"}
-        response = requests.get(url, headers=self._headers(), params=params, timeout=15)
+        response = self._get(url, "seafile.download_link", params=params, timeout=15)
         response.raise_for_status()
         # Seafile возвращает прямую ссылку текстом (может быть в кавычках)
         link = response.text.strip().strip('"')
         return link
 
+    def get_file_download_links(
+        self, file_paths: Iterable[str], max_workers: int = LINK_WORKERS
+    ) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """
+        Ссылки на много файлов за один параллельный шаг (не больше max_workers запросов одновременно).
+        Возвращает (ссылки, ошибки) — оба словаря по исходному пути; одна ошибка не срывает остальные.
+        """
+        paths = list(dict.fromkeys(p for p in file_paths if p))
+        links: Dict[str, str] = {}
+        errors: Dict[str, Exception] = {}
+        if not paths:
+            return links, errors
+        workers = max(1, min(max_workers, http_pool.POOL_MAXSIZE, len(paths)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="seafile-links") as pool:
+            futures = {pool.submit(self.get_file_download_link, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    links[path] = future.result()
+                except Exception as e:
+                    errors[path] = e
+        return links, errors
+
     def list_file_links(self, folder_path: str) -> List[str]:
         """Вернуть прямые ссылки на все файлы в указанной папке."""
         if not folder_path.startswith("/"):
             folder_path = "/" + folder_path
         items = self.list_directory(folder_path)
-        links: List[str] = []
-        for item in items:
-            if item.get("type") != "file":
-                continue
-            file_path = item.get("path") or f"{folder_path.rstrip('/')}/{item.get('name')}"
-            links.append(self.get_file_download_link(file_path))
-        return links
+        file_paths = [
+            item.get("path") or f"{folder_path.rstrip('/')}/{item.get('name')}"
+            for item in items
+            if item.get("type") == "file"
+        ]
+        links, errors = self.get_file_download_links(file_paths)
+        if errors:
+            raise next(iter(errors.values()))
+        return [links[path] for path in file_paths]
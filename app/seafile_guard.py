@@ -0,0 +1,180 @@
+"""
+Ограничитель частоты запросов и предохранитель (circuit breaker) для API Seafile.
+
+Общие на процесс для всех SeafileClient и AsyncSeafileClient:
+  - token bucket: не больше RATE запросов в секунду (с запасом BURST), так прогрев и скрипты
+    автоподбора не заваливают сервер; если токена нет дольше MAX_WAIT секунд — отказ;
+  - предохранитель: после FAILURE_THRESHOLD подряд сбоев (таймауты, обрывы, 429/5xx) он
+    размыкается, и OPEN_SECONDS секунд запросы сразу получают SeafileUnavailable вместо ожидания
+    таймаута. Затем пропускается один пробный запрос (half-open): успех замыкает цепь, сбой — снова open.
+
+Вызывающий код при SeafileUnavailable отдаёт закешированные данные (список папок, манифест),
+а не записывает ошибку на конкретный файл. Состояние — state(), в админке /admin/seafile/http-stats.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+RATE = 20.0
+BURST = 40
+MAX_WAIT = 10.0
+
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Статусы, которые говорят о проблеме сервера, а не запроса
+FAILURE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class SeafileUnavailable(RuntimeError):
+    """Seafile сейчас не опрашиваем: предохранитель разомкнут или превышен лимит запросов."""
+
+
+class TokenBucket:
+    def __init__(self, rate: float = RATE, burst: int = BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+        self.rejected = 0
+
+    def reserve(self) -> float:
+        """Забирает токен (возможно, в долг) и возвращает, сколько секунд надо подождать перед запросом."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if wait > MAX_WAIT:
+                # Очередь слишком длинная: возвращаем токен и отказываем сразу
+                self._tokens += 1
+                self.rejected += 1
+                raise SeafileUnavailable(f"Seafile rate limit: queue longer than {MAX_WAIT:.0f}s")
+            self.waited += wait
+            return wait
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 1),
+                "waited_s": round(self.waited, 1),
+                "rejected": self.rejected,
+            }
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, open_seconds: float = OPEN_SECONDS):
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.short_circuited = 0
+        self.last_error: Optional[str] = None
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.short_circuited += 1
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        raise SeafileUnavailable(f"Seafile circuit open, retry in {retry_in:.0f}s (last error: {self.last_error})")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self._failures += 1
+            self.last_error = error
+            if self._state == HALF_OPEN or self._failures >= self.threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                    print(f"🔌 Seafile недоступен ({error}), запросы приостановлены на {self.open_seconds:.0f} с")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+
+    def reset(self) -> None:
+        self.record_success()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def stats(self) -> Dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "threshold": self.threshold,
+                "open_seconds": self.open_seconds,
+                "retry_in_s": round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+                if state == OPEN else 0.0,
+                "trips": self.trips,
+                "short_circuited": self.short_circuited,
+                "last_error": self.last_error,
+            }
+
+
+limiter = TokenBucket()
+breaker = CircuitBreaker()
+
+
+def admit() -> float:
+    """Проверка перед запросом: SeafileUnavailable или сколько подождать (для async — через asyncio.sleep)."""
+    breaker.before_call()
+    try:
+        return limiter.reserve()
+    except SeafileUnavailable:
+        # Пробный запрос не состоялся — следующий вызов сможет попробовать снова
+        breaker.release_probe()
+        raise
+
+
+def record_result(status_code: Optional[int], error: Optional[BaseException] = None) -> None:
+    """Итог запроса: сетевые ошибки и FAILURE_STATUSES размыкают цепь, остальное (в т.ч. 404) — успех связи."""
+    if error is not None:
+        breaker.record_failure(f"{type(error).__name__}: {error}")
+    elif status_code in FAILURE_STATUSES:
+        breaker.record_failure(f"HTTP {status_code}")
+    else:
+        breaker.record_success()
+
+
+def state() -> Dict:
+    return {"breaker": breaker.stats(), "limiter": limiter.stats()}
@@ -0,0 +1,182 @@
+"""
+Размеры картинки и крошечная размытая заглушка (LQIP) для фронтенда.
+
+Размеры читаются из заголовков файла без декодирования картинки (PNG, JPEG, GIF, WebP)
+и из атрибутов width/height/viewBox корневого <svg>. Заглушка — WebP шириной
+PLACEHOLDER_SIZE пикселей в виде data URI (несколько сотен байт), её можно сразу подставить
+в background-image, пока грузится оригинал. Для заглушки нужен Pillow (есть в requirements.txt).
+SVG растеризуется через cairosvg — он необязателен, потому что требует системную libcairo;
+без него берётся самая большая встроенная base64-картинка, если её пропорции совпадают с SVG,
+а векторные SVG без такой картинки остаются без заглушки.
+"""
+
+import base64
+import io
+import re
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+# Сколько байт SVG читать в поисках корневого тега
+SVG_HEAD_BYTES = 64 * 1024
+RASTER_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+IMAGE_SUFFIXES = (".svg",) + RASTER_SUFFIXES
+
+_SVG_ROOT = re.compile(rb"<svg\b[^>]*>", re.IGNORECASE | re.DOTALL)
+_SVG_ATTR = re.compile(rb"""\b(width|height|viewBox)\s*=\s*["']([^"']*)["']""")
+_SVG_LENGTH = re.compile(rb"^\s*([0-9.]+)\s*(px)?\s*$")
+_DATA_URI = re.compile(rb"""data:image/[A-Za-z0-9.+-]+;base64,([A-Za-z0-9+/=\s]+)""")
+
+
+def _svg_size(head: bytes) -> Optional[Tuple[int, int]]:
+    root = _SVG_ROOT.search(head)
+    if not root:
+        return None
+    attrs = {name.decode(): value for name, value in _SVG_ATTR.findall(root.group(0))}
+    width, height = (_SVG_LENGTH.match(attrs.get(k, b"")) for k in ("width", "height"))
+    if width and height:
+        return round(float(width.group(1))), round(float(height.group(1)))
+    # Проценты/em и отсутствие размеров — берём пропорции из viewBox
+    view_box = attrs.get("viewBox", b"").replace(b",", b" ").split()
+    if len(view_box) == 4:
+        try:
+            return round(float(view_box[2])), round(float(view_box[3]))
+        except ValueError:
+            return None
+    return None
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        # SOF0..SOF15, кроме DHT (C4), JPG (C8) и DAC (CC)
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def _raster_size(path: Path) -> Optional[Tuple[int, int]]:
+    with path.open("rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head.startswith(b"\xff\xd8"):
+            return _jpeg_size(f)
+        if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+            chunk = head[12:16]
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L":
+                bits = struct.unpack("<I", head[21:25])[0]
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b"VP8X":
+                width = int.from_bytes(head[24:27], "little") + 1
+                height = int.from_bytes(head[27:30], "little") + 1
+                return width, height
+    return None
+
+
+def image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """(ширина, высота) по заголовку файла или None, если формат не распознан."""
+    try:
+        if path.suffix.lower() == ".svg":
+            with path.open("rb") as f:
+                return _svg_size(f.read(SVG_HEAD_BYTES))
+        return _raster_size(path)
+    except (OSError, struct.error):
+        return None
+
+
+def _placeholder_from_image(image) -> str:
+    from PIL import ImageFilter
+
+    image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    image = image.filter(ImageFilter.GaussianBlur(1))
+    out = io.BytesIO()
+    image.save(out, "WEBP", quality=PLACEHOLDER_QUALITY)
+    return "data:image/webp;base64," + base64.b64encode(out.getvalue()).decode("ascii")
+
+
+def _largest_embedded_raster(data: bytes) -> Optional[bytes]:
+    best = max(_DATA_URI.finditer(data), key=lambda m: len(m.group(1)), default=None)
+    if best is None:
+        return None
+    try:
+        return base64.b64decode(b"".join(best.group(1).split()))
+    except ValueError:
+        return None
+
+
+def _svg_placeholder_image(path: Path, size: Optional[Tuple[int, int]]):
+    from PIL import Image
+
+    data = path.read_bytes()
+    try:
+        import cairosvg
+
+        png = cairosvg.svg2png(bytestring=data, output_width=PLACEHOLDER_SIZE * 4)
+        return Image.open(io.BytesIO(png))
+    except (ImportError, OSError):
+        # OSError — cairosvg установлен, но не нашёл libcairo
+        pass
+    raw = _largest_embedded_raster(data)
+    if raw is None or not size or not size[1]:
+        return None
+    image = Image.open(io.BytesIO(raw))
+    # Встроенная фотография годится как заглушка, только если занимает весь кадр
+    if abs(image.width / image.height - size[0] / size[1]) > 0.05:
+        return None
+    return image
+
+
+def missing_dependencies() -> List[str]:
+    """Каких библиотек для заглушек не хватает: "Pillow" — заглушек нет совсем, "cairosvg" — нет у векторных SVG."""
+    missing = []
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        missing.append("Pillow")
+    try:
+        import cairosvg  # noqa: F401
+    except (ImportError, OSError):
+        missing.append("cairosvg")
+    return missing
+
+
+def placeholder(path: Path, size: Optional[Tuple[int, int]] = None) -> Optional[str]:
+    """data:image/webp;base64,... или None (нет Pillow, формат не поддерживается)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        if path.suffix.lower() == ".svg":
+            image = _svg_placeholder_image(path, size or image_size(path))
+        else:
+            image = Image.open(path)
+        return _placeholder_from_image(image) if image is not None else None
+    except Exception:
+        return None
+
+
+def inspect_image(path: Path) -> Dict:
+    """Стадия конвейера (inspect): {"width", "height", "placeholder"}."""
+    size = image_size(path)
+    return {
+        "width": size[0] if size else None,
+        "height": size[1] if size else None,
+        "placeholder": placeholder(path, size),
+    }
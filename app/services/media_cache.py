@@ -1,15 +1,33 @@
+import gzip
+import hashlib
+import re
 import shutil
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import requests
+from .. import http_pool, seafile_guard
+from . import image_meta, media_integrity, media_manifest, media_pipeline
+from .media_pipeline import CONVERT, DERIVE, INSPECT, OPTIMIZE, Stage
 
 # Простое файловое кеширование картинок из Seafile и других URL.
 # Все файлы складываются в /app/static/cache/machines/{id}/...
 CACHE_ROOT = Path("app/static/cache/machines")
 STATIC_PREFIX = "/static/cache/machines"
 
+# Предсжатые копии (sidecar-файлы) рядом с закешированными файлами.
+# Отдаются MediaStaticFiles по Accept-Encoding без сжатия на каждый запрос.
+PRECOMPRESS_SUFFIXES = {".svg"}
+SIDECAR_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Имена файлов в кеше содержат отпечаток содержимого: main.<hash>.svg.
+# Файл под таким именем никогда не перезаписывается, поэтому его можно кешировать навсегда.
+FINGERPRINT_LENGTH = 12
+TEMP_SUFFIXES = {".part", ".tmp"}
+
+# Конвертировать SVG в WebP после скачивания (требует: pip install pillow cairosvg)
+CONVERT_SVG_TO_WEBP = False
+
 
 def _guess_ext(url: str, fallback: str = ".jpg") -> str:
     parsed = urlparse(url)
@@ -24,98 +42,429 @@ def _safe_name(name: str) -> str:
     return Path(name).name
 
 
+def _is_sidecar(path: Path) -> bool:
+    return path.suffix in SIDECAR_SUFFIXES.values()
+
+
+def _is_cache_entry(path: Path) -> bool:
+    return path.is_file() and not _is_sidecar(path) and path.suffix not in TEMP_SUFFIXES
+
+
+def fingerprinted_name(stem: str, suffix: str, digest: str) -> str:
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{suffix}"
+
+
+_FINGERPRINT_SUFFIX = re.compile(rf"\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}$")
+
+
+def name_fingerprint(path: Path) -> Optional[str]:
+    """Отпечаток из имени файла (main.<hash>.svg -> <hash>) или None для имён без отпечатка."""
+    match = _FINGERPRINT_SUFFIX.search(Path(path).stem)
+    return match.group(0)[1:] if match else None
+
+
+def content_name(path: Path, sha256: str) -> Path:
+    """Имя для нового содержимого файла: main.<старый hash>.svg -> main.<новый hash>.svg."""
+    return path.with_name(fingerprinted_name(_FINGERPRINT_SUFFIX.sub("", path.stem), path.suffix, sha256))
+
+
+def _remove_versions(folder: Path, stem: str, suffix: str, keep: Optional[Path] = None) -> None:
+    """Удаляет прежние версии файла (с отпечатком и без) вместе с их sidecar-копиями."""
+    if not folder.exists():
+        return
+    suffixes = {suffix}
+    if CONVERT_SVG_TO_WEBP and suffix.lower() == ".svg":
+        # Прежняя версия могла быть уже сконвертирована конвейером
+        suffixes.add(".webp")
+    alternatives = "|".join(re.escape(s) for s in sorted(suffixes))
+    pattern = re.compile(
+        rf"^{re.escape(stem)}(\.[0-9a-f]{{{FINGERPRINT_LENGTH}}})?({alternatives})(\.gz|\.br)?$"
+    )
+    for file in folder.iterdir():
+        if file == keep:
+            continue
+        if pattern.match(file.name):
+            file.unlink(missing_ok=True)
+
+
+def _compress_brotli(data: bytes) -> Optional[bytes]:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def write_precompressed(path: Path) -> List[Path]:
+    """Пишет .gz/.br рядом с файлом. Сжатая копия сохраняется только если она меньше оригинала."""
+    for suffix in SIDECAR_SUFFIXES.values():
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    if path.suffix.lower() not in PRECOMPRESS_SUFFIXES or not path.is_file():
+        return []
+
+    data = path.read_bytes()
+    compressed = {
+        "gzip": gzip.compress(data, compresslevel=9, mtime=0),
+        "br": _compress_brotli(data),
+    }
+    written: List[Path] = []
+    for encoding, payload in compressed.items():
+        if payload is None or len(payload) >= len(data):
+            continue
+        sidecar = Path(f"{path}{SIDECAR_SUFFIXES[encoding]}")
+        tmp = sidecar.with_name(sidecar.name + ".tmp")
+        tmp.write_bytes(payload)
+        tmp.replace(sidecar)
+        written.append(sidecar)
+    return written
+
+
+# Обработка после скачивания: оптимизация, конвертация, производные файлы (см. media_pipeline)
+PIPELINE = media_pipeline.MediaPipeline(
+    [
+        Stage("optimize_svg", OPTIMIZE, media_pipeline.optimize_svg, (".svg",)),
+        Stage("precompress", DERIVE, write_precompressed, tuple(PRECOMPRESS_SUFFIXES)),
+    ],
+    # Оптимизированный или сконвертированный файл получает отпечаток новых байтов, а не перезаписывается
+    namer=content_name,
+)
+if CONVERT_SVG_TO_WEBP:
+    PIPELINE.add_stage(Stage("svg_to_webp", CONVERT, media_pipeline.convert_svg_to_webp, (".svg",)))
+# Размеры и LQIP-заглушка для machine_to_dict (см. image_meta)
+PIPELINE.add_stage(Stage("image_meta", INSPECT, image_meta.inspect_image, image_meta.IMAGE_SUFFIXES))
+
+
+def _path_to_url(path: Path) -> str:
+    """app/static/cache/machines/1/main.svg -> /static/cache/machines/1/main.svg"""
+    return f"{STATIC_PREFIX}/{Path(path).relative_to(CACHE_ROOT).as_posix()}"
+
+
+def _variant_name(path: Path, source: Path) -> str:
+    if path.name == f"{source.name}.gz":
+        return "gzip"
+    if path.name == f"{source.name}.br":
+        return "br"
+    return path.suffix.lstrip(".")
+
+
+def _record_variants(result: Dict) -> None:
+    """Колбэк конвейера: сохраняет производные файлы в манифест."""
+    source, final = Path(result["source"]), Path(result["path"])
+    variants: Dict[str, str] = {}
+    for derived in map(Path, result["derived"]):
+        variants[_variant_name(derived, final)] = _path_to_url(derived)
+    try:
+        size = final.stat().st_size if final.exists() else None
+        media_manifest.set_variants(
+            _path_to_url(source),
+            variants,
+            new_local_url=_path_to_url(final),
+            size=size,
+            meta=result.get("meta"),
+            sha256=result.get("sha256"),
+        )
+    except Exception as e:
+        print(f"  ⚠️  Failed to store variants for {final.name}: {e}")
+
+
+PIPELINE.add_listener(_record_variants)
+
+
 def clear_machine_cache(machine_id: int) -> None:
     shutil.rmtree(CACHE_ROOT / str(machine_id), ignore_errors=True)
+    media_manifest.delete_machine(machine_id)
 
 
-def _download_to(path: Path, url: str) -> Optional[Path]:
+def _download_to(path: Path, url: str, asset: Optional[Dict] = None) -> Optional[Path]:
+    """
+    Скачивает url и кладёт файл рядом с path под именем с отпечатком содержимого
+    (main.svg -> main.<hash>.svg). Прежние версии файла удаляются.
+    asset: {"machine_id", "kind", "key", "source_path", "file_id"} — запись в манифесте.
+    Неудачи с asset записываются в манифест с причиной (негативный кеш, см. is_backed_off).
+    """
+    tmp = path.with_name(path.name + ".part")
     try:
         # Seafile ссылки могут быть с самоподписанным/несовпадающим сертификатом (seafhttp),
         # поэтому отключаем verify, чтобы гарантированно скачать и положить в кеш.
-        resp = requests.get(url, stream=True, timeout=20, verify=False)
-        if resp.status_code == 403 or resp.status_code == 401:
-            return None
-        resp.raise_for_status()
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("wb") as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        return path
-    except Exception:
+        # Соединение берётся из общего пула (http_pool) и возвращается в него после чтения тела.
+        with http_pool.get(url, "seafhttp.download", stream=True, timeout=20, verify=False) as resp:
+            if resp.status_code == 403 or resp.status_code == 401:
+                # Обычно это протухшая ссылка или токен Seafile
+                _record_failure(asset, f"HTTP {resp.status_code}: access denied")
+                return None
+            resp.raise_for_status()
+            problem = media_integrity.check_content_type(resp.headers.get("Content-Type"))
+            if problem:
+                # Seafile с протухшей ссылкой может вернуть страницу логина с кодом 200
+                _record_failure(asset, problem)
+                return None
+            path.parent.mkdir(parents=True, exist_ok=True)
+            digest = hashlib.sha256()
+            with tmp.open("wb") as f:
+                for chunk in resp.iter_content(chunk_size=8192):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+            content_type = resp.headers.get("Content-Type")
+            expected_size = expected_length(resp.headers)
+        return finalize_download(path, tmp, digest.hexdigest(), content_type, asset, expected_size)
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        _record_failure(asset, f"{type(e).__name__}: {e}")
+        return None
+
+
+def expected_length(headers) -> Optional[int]:
+    """Content-Length ответа, если по нему можно проверить размер файла (тело не перекодировано)."""
+    length = headers.get("Content-Length")
+    if not length or headers.get("Content-Encoding"):
         return None
+    try:
+        return int(length)
+    except ValueError:
+        return None
+
+
+def finalize_download(
+    path: Path,
+    tmp: Path,
+    sha256: str,
+    content_type: Optional[str] = None,
+    asset: Optional[Dict] = None,
+    expected_size: Optional[int] = None,
+) -> Path:
+    """
+    Скачанный tmp-файл -> имя с отпечатком рядом с path, запись в манифест и запуск конвейера.
+    Если конвейер меняет содержимое (optimize/convert), возвращается путь с новым отпечатком.
+    Общая часть для _download_to и потокового прокси (media_proxy).
+    Битый файл (HTML вместо картинки, обрезанный, не разбирается) удаляется, выбрасывается ValueError.
+    expected_size — Content-Length ответа: оборванное соединение даёт файл короче.
+    """
+    problem = media_integrity.check_file(tmp, expected_size, suffix=path.suffix)
+    if problem:
+        tmp.unlink(missing_ok=True)
+        raise ValueError(f"Downloaded file failed integrity check: {problem}")
+    final = path.with_name(fingerprinted_name(path.stem, path.suffix, sha256))
+    tmp.replace(final)
+    _remove_versions(path.parent, path.stem, path.suffix, keep=final)
+    if asset:
+        media_manifest.record(
+            local_url=_path_to_url(final),
+            size=final.stat().st_size,
+            sha256=sha256,
+            content_type=(content_type or "").split(";")[0].strip() or None,
+            **asset,
+        )
+    return PIPELINE.process(final)
+
+
+def _record_failure(asset: Optional[Dict], reason: str) -> None:
+    if not asset:
+        return
+    try:
+        retry_after = media_manifest.record_failure(
+            asset["machine_id"], asset["kind"], asset["key"], reason, source_path=asset.get("source_path")
+        )
+        label = f"{asset['kind']} {asset['key']}".strip()
+        print(f"  ⚠️  {label} (machine {asset['machine_id']}): {reason}; retry after {retry_after:%Y-%m-%d %H:%M:%S}")
+    except Exception as e:
+        print(f"  ⚠️  Failed to record download failure: {e}")
+
+
+def local_path(url: str) -> Path:
+    """/static/cache/machines/1/main.<hash>.svg -> app/static/cache/machines/1/main.<hash>.svg"""
+    return Path("app") / url.lstrip("/")
+
+
+def quarantine_asset(asset, reason: str) -> Optional[Path]:
+    """Переносит битый файл в карантин, удаляет его производные и снимает запись с кеша."""
+    moved = None
+    if asset.local_url:
+        for variant_url in (asset.variants or {}).values():
+            if variant_url.startswith(STATIC_PREFIX):
+                local_path(variant_url).unlink(missing_ok=True)
+        moved = media_integrity.quarantine(local_path(asset.local_url), CACHE_ROOT)
+    media_manifest.invalidate(asset.id, reason)
+    return moved
+
+
+def is_backed_off(
+    machine_id: int, kind: str, key: str = "", source_path: Optional[str] = None, assets: Optional[Dict] = None
+) -> bool:
+    """
+    True, если файл недавно не скачался и повторять попытку ещё рано (для горячих путей API).
+    assets — записи машины из media_manifest.lookup_machine, чтобы не делать отдельный запрос.
+    """
+    if assets is not None:
+        asset = assets.get((kind, key))
+    else:
+        asset = media_manifest.lookup(machine_id, kind, key, touch=False)
+    return media_manifest.is_backed_off(asset, source_path)
+
+
+def record_fetch_failure(machine_id: int, kind: str, key: str, source_path: str, error: Exception) -> None:
+    """Ошибка до скачивания: не получили ссылку или список файлов в Seafile (файл удалён, нет доступа и т.п.)."""
+    if isinstance(error, seafile_guard.SeafileUnavailable):
+        # Недоступен сам Seafile, а не файл: задержку на запись не вешаем, предохранитель разберётся сам
+        return
+    _record_failure(_asset(machine_id, kind, key, source_path), f"{type(error).__name__}: {error}")
+
+
+def _asset(machine_id: int, kind: str, key: str = "", source_path: Optional[str] = None, file_id: Optional[str] = None) -> Dict:
+    return {"machine_id": machine_id, "kind": kind, "key": key, "source_path": source_path, "file_id": file_id}
+
+
+def main_destination(machine_id: int, url: str) -> Path:
+    return CACHE_ROOT / str(machine_id) / f"main{_guess_ext(url)}"
 
 
-def cache_main_image(machine_id: int, url: str) -> Optional[str]:
+def design_destination(machine_id: int, frame_color: str, insert_color: str, url: str) -> Path:
+    # Создаем безопасное имя файла из цветов
+    safe_frame = frame_color.replace("/", "_").replace("\\", "_")
+    safe_insert = insert_color.replace("/", "_").replace("\\", "_")
+    filename = f"design_{safe_frame}_{safe_insert}"
+    return CACHE_ROOT / str(machine_id) / f"{filename}{_guess_ext(url)}"
+
+
+def gallery_destination(machine_id: int, name: str, url: str) -> Path:
+    fname = _safe_name(name)
+    ext = Path(fname).suffix or _guess_ext(url, ".jpg")
+    dest_name = fname if Path(fname).suffix else f"{fname}{ext}"
+    return CACHE_ROOT / str(machine_id) / "gallery" / dest_name
+
+
+def cache_main_image(machine_id: int, url: str, source_path: Optional[str] = None) -> Optional[str]:
     if not url:
         return None
-    ext = _guess_ext(url)
-    dest = CACHE_ROOT / str(machine_id) / f"main{ext}"
-    path = _download_to(dest, url)
+    dest = main_destination(machine_id, url)
+    path = _download_to(dest, url, _asset(machine_id, media_manifest.MAIN, source_path=source_path))
     if not path:
         return None
     return f"{STATIC_PREFIX}/{machine_id}/{path.name}"
 
 
-def cache_design_image(machine_id: int, frame_color: str, insert_color: str, url: str) -> Optional[str]:
+def cache_design_image(
+    machine_id: int, frame_color: str, insert_color: str, url: str, source_path: Optional[str] = None
+) -> Optional[str]:
     """Кеширует фото для конкретной комбинации цветов каркаса и вставки"""
     if not url:
         return None
-    # Создаем безопасное имя файла из цветов
-    safe_frame = frame_color.replace("/", "_").replace("\\", "_")
-    safe_insert = insert_color.replace("/", "_").replace("\\", "_")
-    filename = f"design_{safe_frame}_{safe_insert}"
-    ext = _guess_ext(url)
-    dest = CACHE_ROOT / str(machine_id) / f"{filename}{ext}"
-    path = _download_to(dest, url)
+    dest = design_destination(machine_id, frame_color, insert_color, url)
+    key = media_manifest.design_key(frame_color, insert_color)
+    path = _download_to(dest, url, _asset(machine_id, media_manifest.DESIGN, key, source_path))
     if not path:
         return None
     return f"{STATIC_PREFIX}/{machine_id}/{path.name}"
 
 
-def cache_gallery_files(machine_id: int, files: Iterable[Tuple[str, str]]) -> List[str]:
-    """files: iterable of (name, url)"""
+def cache_gallery_files(machine_id: int, files: Iterable[Tuple]) -> List[str]:
+    """files: iterable of (name, url[, source_path[, file_id]])"""
     cached: List[str] = []
-    for name, url in files:
+    for name, url, *source in files:
         if not url:
             continue
-        fname = _safe_name(name)
-        ext = Path(fname).suffix or _guess_ext(url, ".jpg")
-        dest_name = fname if Path(fname).suffix else f"{fname}{ext}"
-        dest = CACHE_ROOT / str(machine_id) / "gallery" / dest_name
-        path = _download_to(dest, url)
+        dest = gallery_destination(machine_id, name, url)
+        asset = _asset(machine_id, media_manifest.GALLERY, dest.name, *source[:2])
+        path = _download_to(dest, url, asset)
         if path:
             cached.append(f"{STATIC_PREFIX}/{machine_id}/gallery/{path.name}")
+    if cached:
+        # Снимаем негативный кеш галереи целиком (см. api.machine_to_dict)
+        media_manifest.delete_asset(machine_id, media_manifest.GALLERY, "")
     return cached
 
 
-def get_cached_main(machine_id: int) -> Optional[str]:
+def _probe_main(machine_id: int) -> Optional[Path]:
     folder = CACHE_ROOT / str(machine_id)
     if not folder.exists():
         return None
-    for file in folder.glob("main.*"):
-        return f"{STATIC_PREFIX}/{machine_id}/{file.name}"
+    for file in sorted(folder.glob("main.*")):
+        if _is_cache_entry(file):
+            return file
     return None
 
 
-def get_cached_design_image(machine_id: int, frame_color: str, insert_color: str) -> Optional[str]:
-    """Получает закешированное фото для комбинации цветов"""
+def _probe_design(machine_id: int, frame_color: str, insert_color: str) -> Optional[Path]:
     folder = CACHE_ROOT / str(machine_id)
     if not folder.exists():
         return None
     safe_frame = frame_color.replace("/", "_").replace("\\", "_")
     safe_insert = insert_color.replace("/", "_").replace("\\", "_")
     pattern = f"design_{safe_frame}_{safe_insert}.*"
-    for file in folder.glob(pattern):
-        return f"{STATIC_PREFIX}/{machine_id}/{file.name}"
+    for file in sorted(folder.glob(pattern)):
+        if _is_cache_entry(file):
+            return file
     return None
 
 
-def get_cached_gallery(machine_id: int) -> List[str]:
+def _backfill(machine_id: int, kind: str, key: str, file: Optional[Path]) -> Optional[str]:
+    """Файл есть на диске, но не в манифесте (кеш создан до появления манифеста) — дописываем запись."""
+    if file is None:
+        return None
+    url = _path_to_url(file)
+    media_manifest.record(machine_id, kind, key, url, size=file.stat().st_size, verified=False)
+    return url
+
+
+def _find(machine_id: int, kind: str, key: str, assets: Optional[Dict]):
+    """Запись из заранее загруженных assets (lookup_machine) или отдельным запросом."""
+    if assets is None:
+        return media_manifest.lookup(machine_id, kind, key)
+    asset = assets.get((kind, key))
+    media_manifest.note_access([asset])
+    return asset
+
+
+def get_cached_main(machine_id: int, assets: Optional[Dict] = None) -> Optional[str]:
+    asset = _find(machine_id, media_manifest.MAIN, "", assets)
+    if asset is not None and asset.local_url:
+        return asset.local_url
+    return _backfill(machine_id, media_manifest.MAIN, "", _probe_main(machine_id))
+
+
+def get_cached_design_image(
+    machine_id: int, frame_color: str, insert_color: str, assets: Optional[Dict] = None
+) -> Optional[str]:
+    """Получает закешированное фото для комбинации цветов"""
+    key = media_manifest.design_key(frame_color, insert_color)
+    asset = _find(machine_id, media_manifest.DESIGN, key, assets)
+    if asset is not None and asset.local_url:
+        return asset.local_url
+    return _backfill(machine_id, media_manifest.DESIGN, key, _probe_design(machine_id, frame_color, insert_color))
+
+
+def get_cached_gallery(machine_id: int, assets: Optional[Dict] = None) -> List[str]:
+    if assets is None:
+        gallery = media_manifest.list_kind(machine_id, media_manifest.GALLERY)
+    else:
+        gallery = [a for (kind, key), a in sorted(assets.items()) if kind == media_manifest.GALLERY]
+        media_manifest.note_access(gallery)
+    if gallery:
+        return [a.local_url for a in gallery if a.local_url]
     folder = CACHE_ROOT / str(machine_id) / "gallery"
     if not folder.exists():
         return []
-    return [f"{STATIC_PREFIX}/{machine_id}/gallery/{p.name}" for p in sorted(folder.iterdir()) if p.is_file()]
+    files = [p for p in sorted(folder.iterdir()) if _is_cache_entry(p)]
+    return [_backfill(machine_id, media_manifest.GALLERY, _original_name(p), p) for p in files]
+
+
+def get_image_meta(urls: Iterable[Optional[str]], assets: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Размеры и заглушки для закешированных URL (прокси и ссылки Seafile пропускаются)."""
+    urls = [u for u in urls if u and u.startswith(STATIC_PREFIX)]
+    if assets is None:
+        return media_manifest.image_meta(urls)
+    by_url = {a.local_url: a for a in assets.values() if a.local_url}
+    return {
+        url: {"width": a.width, "height": a.height, "placeholder": a.placeholder}
+        for url, a in ((u, by_url.get(u)) for u in urls)
+        if a is not None and (a.width or a.placeholder)
+    }
+
+
+def _original_name(path: Path) -> str:
+    """gallery/photo.<hash>.jpg -> photo.jpg"""
+    match = re.match(rf"^(.+)\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}(\.[^.]+)$", path.name)
+    return f"{match.group(1)}{match.group(2)}" if match else path.name
 
 
 def cache_machine_media(machine, seafile_client) -> None:
@@ -132,18 +481,26 @@ def cache_machine_media(machine, seafile_client) -> None:
         main_url = machine.main_image
 
     if main_url:
-        cache_main_image(machine.id, main_url)
+        cache_main_image(machine.id, main_url, source_path=getattr(machine, "main_image_path", None))
 
     # Кешируем design_images если есть
     if hasattr(machine, 'design_images') and machine.design_images:
         print(f"🎨 Caching design_images for machine {machine.id}")
+        # Ссылки на всю матрицу цветов запрашиваем одним параллельным шагом
+        design_links, design_errors = seafile_client.get_file_download_links(
+            config.get("main_image_path") or config.get("main_image")
+            for insert_colors in machine.design_images.values()
+            for config in insert_colors.values()
+        )
         for frame_color, insert_colors in machine.design_images.items():
             for insert_color, config in insert_colors.items():
                 img_path = config.get("main_image_path") or config.get("main_image")
                 if img_path:
                     try:
-                        img_url = seafile_client.get_file_download_link(img_path)
-                        cached = cache_design_image(machine.id, frame_color, insert_color, img_url)
+                        if img_path in design_errors:
+                            raise design_errors[img_path]
+                        img_url = design_links[img_path]
+                        cached = cache_design_image(machine.id, frame_color, insert_color, img_url, source_path=img_path)
                         if cached:
                             print(f"  ✓ Cached {frame_color}/{insert_color}: {cached}")
                     except Exception as e:
@@ -161,15 +518,130 @@ def cache_machine_media(machine, seafile_client) -> None:
     except Exception:
         return
 
-    files: List[Tuple[str, str]] = []
+    file_items = [
+        (item, item.get("path") or f"{folder_path.rstrip('/')}/{item.get('name')}")
+        for item in items
+        if item.get("type") == "file"
+    ]
+    links, _ = seafile_client.get_file_download_links(file_path for _, file_path in file_items)
+    files: List[Tuple] = [
+        (item.get("name") or Path(file_path).name, links[file_path], file_path, item.get("id"))
+        for item, file_path in file_items
+        if file_path in links
+    ]
+
+    cache_gallery_files(machine.id, files)
+
+
+def _is_fresh(asset, source_path: Optional[str], file_id: Optional[str] = None) -> bool:
+    """Запись в манифесте есть, файл на диске на месте и источник не поменялся."""
+    if asset is None or not asset.local_url:
+        return False
+    if source_path and asset.source_path and asset.source_path != source_path:
+        return False
+    if file_id and asset.file_id and asset.file_id != file_id:
+        return False
+    return local_path(asset.local_url).is_file()
+
+
+def warm_machine_media(machine, seafile_client, force: bool = False) -> Dict[str, int]:
+    """
+    Инкрементальный прогрев кеша записи: в отличие от cache_machine_media ничего не удаляет
+    и скачивает только то, чего нет в манифесте или что сменилось в Seafile.
+    Возвращает счётчики {"cached", "skipped", "failed", "bytes"}.
+    """
+    stats = {"cached": 0, "skipped": 0, "failed": 0, "bytes": 0}
+
+    def fetch(kind: str, key: str, source_path: str, file_id: Optional[str], cache) -> None:
+        asset = media_manifest.lookup(machine.id, kind, key, touch=False)
+        # main_image может уже указывать на локальный файл (/static/...) — качать нечего
+        if source_path.startswith("/static/") or (not force and _is_fresh(asset, source_path, file_id)):
+            stats["skipped"] += 1
+            return
+        if not force and media_manifest.is_backed_off(asset, source_path):
+            stats["failed"] += 1
+            return
+        try:
+            url = source_path
+            if source_path.startswith("/"):
+                url = seafile_client.get_file_download_link(source_path)
+        except Exception as e:
+            record_fetch_failure(machine.id, kind, key, source_path, e)
+            stats["failed"] += 1
+            return
+        try:
+            cached = cache(url)
+        except Exception:
+            cached = None
+        if not cached:
+            stats["failed"] += 1
+            return
+        stats["cached"] += 1
+        fresh = media_manifest.lookup(machine.id, kind, key, touch=False)
+        stats["bytes"] += (fresh.size or 0) if fresh else 0
+
+    main_source = getattr(machine, "main_image_path", None) or machine.main_image
+    if main_source:
+        fetch(
+            media_manifest.MAIN, "", main_source, None,
+            lambda url: cache_main_image(machine.id, url, source_path=main_source),
+        )
+
+    for frame_color, insert_colors in (getattr(machine, "design_images", None) or {}).items():
+        for insert_color, config in insert_colors.items():
+            img_path = config.get("main_image_path") or config.get("main_image")
+            if not img_path:
+                continue
+            fetch(
+                media_manifest.DESIGN, media_manifest.design_key(frame_color, insert_color), img_path, None,
+                lambda url, f=frame_color, i=insert_color, p=img_path: cache_design_image(
+                    machine.id, f, i, url, source_path=p
+                ),
+            )
+
+    if not machine.gallery_folder:
+        return stats
+
+    folder_path = machine.gallery_folder
+    if not folder_path.startswith("/"):
+        folder_path = "/" + folder_path
+    gallery_failure = media_manifest.lookup(machine.id, media_manifest.GALLERY, "", touch=False)
+    if not force and media_manifest.is_backed_off(gallery_failure, folder_path):
+        stats["failed"] += 1
+        return stats
+    try:
+        items = seafile_client.list_directory(folder_path)
+    except Exception as e:
+        record_fetch_failure(machine.id, media_manifest.GALLERY, "", folder_path, e)
+        stats["failed"] += 1
+        return stats
+
+    by_source = {a.source_path: a for a in media_manifest.list_kind(machine.id, media_manifest.GALLERY, touch=False)}
+    pending = []
     for item in items:
         if item.get("type") != "file":
             continue
         file_path = item.get("path") or f"{folder_path.rstrip('/')}/{item.get('name')}"
-        try:
-            link = seafile_client.get_file_download_link(file_path)
-        except Exception:
+        if not force and _is_fresh(by_source.get(file_path), file_path, item.get("id")):
+            stats["skipped"] += 1
             continue
-        files.append((item.get("name") or Path(file_path).name, link))
-
-    cache_gallery_files(machine.id, files)
+        if not force and media_manifest.is_backed_off(by_source.get(file_path), file_path):
+            stats["failed"] += 1
+            continue
+        pending.append((item, file_path))
+
+    links, _ = seafile_client.get_file_download_links(file_path for _, file_path in pending)
+    for item, file_path in pending:
+        name = item.get("name") or Path(file_path).name
+        link = links.get(file_path)
+        if link is None:
+            stats["failed"] += 1
+            continue
+        cached = cache_gallery_files(machine.id, [(name, link, file_path, item.get("id"))])
+        if cached:
+            stats["cached"] += 1
+            fresh = media_manifest.lookup(machine.id, media_manifest.GALLERY, _original_name(Path(cached[0])), touch=False)
+            stats["bytes"] += (fresh.size or 0) if fresh else 0
+        else:
+            stats["failed"] += 1
+    return stats
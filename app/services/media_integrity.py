@@ -0,0 +1,138 @@
+"""
+Проверка целостности файлов в кеше картинок.
+
+check_file ищет типичные поломки:
+  - пустой или обрезанный файл (прерванное скачивание, размер не совпадает с манифестом);
+  - HTML вместо картинки (Seafile отдаёт страницу логина с кодом 200, если ссылка протухла);
+  - файл не того формата, что обещает расширение, или который не удаётся разобрать
+    (SVG — как XML, растровые — по сигнатуре и концу файла, а при наличии Pillow — Image.verify).
+
+Те же проверки выполняются сразу после скачивания (media_cache.finalize_download) и
+в scripts/verify_media_cache.py для уже лежащего кеша. Плохие файлы переносятся в карантин.
+"""
+
+import shutil
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Optional
+
+QUARANTINE_ROOT = Path("app/cache_quarantine")
+HEAD_BYTES = 1024
+TAIL_BYTES = 1024
+PARSE_CHUNK = 256 * 1024
+
+_HTML_MARKERS = (b"<!doctype html", b"<html", b"<head", b"<body")
+_SIGNATURES = {
+    ".png": (b"\x89PNG\r\n\x1a\n",),
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+    ".gif": (b"GIF87a", b"GIF89a"),
+    ".webp": (b"RIFF",),
+}
+
+
+def looks_like_html(head: bytes) -> bool:
+    start = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    return start.startswith(_HTML_MARKERS)
+
+
+def check_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Проверка заголовка ответа до скачивания тела: text/html — это страница логина, а не картинка."""
+    mime = (content_type or "").split(";")[0].strip().lower()
+    if mime in ("text/html", "application/xhtml+xml"):
+        return f"unexpected content type {mime}"
+    return None
+
+
+def _check_svg(path: Path) -> Optional[str]:
+    parser = ET.XMLParser()
+    try:
+        with path.open("rb") as f:
+            while True:
+                chunk = f.read(PARSE_CHUNK)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        root = parser.close()
+    except ET.ParseError as e:
+        return f"SVG is not well-formed XML ({e})"
+    if not root.tag.endswith("svg"):
+        return f"root element is <{root.tag}>, not <svg>"
+    return None
+
+
+def _check_raster(path: Path, suffix: str, head: bytes) -> Optional[str]:
+    signatures = _SIGNATURES.get(suffix)
+    if signatures and not head.startswith(signatures):
+        return f"file does not start with a {suffix} signature"
+    if suffix == ".webp" and head[8:12] != b"WEBP":
+        return "RIFF file is not WebP"
+
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read()
+    if suffix == ".png" and b"IEND" not in tail:
+        return "PNG is truncated (no IEND chunk)"
+    if suffix in (".jpg", ".jpeg") and b"\xff\xd9" not in tail:
+        return "JPEG is truncated (no EOI marker)"
+    if suffix == ".webp" and int.from_bytes(head[4:8], "little") + 8 > size:
+        return "WebP is truncated (RIFF size exceeds file size)"
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception as e:
+        return f"image cannot be decoded ({type(e).__name__}: {e})"
+    return None
+
+
+def check_file(path: Path, expected_size: Optional[int] = None, suffix: Optional[str] = None) -> Optional[str]:
+    """
+    Возвращает описание проблемы или None, если файл в порядке.
+    suffix — если файл ещё лежит под временным именем (.part), расширение берётся отсюда.
+    """
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return "file is missing"
+    if size == 0:
+        return "file is empty"
+    if expected_size is not None and size != expected_size:
+        return f"size {size} does not match expected {expected_size}"
+
+    with path.open("rb") as f:
+        head = f.read(HEAD_BYTES)
+    if looks_like_html(head):
+        return "HTML page instead of an image"
+
+    suffix = (suffix or path.suffix).lower()
+    if suffix == ".svg":
+        return _check_svg(path)
+    if suffix in _SIGNATURES:
+        return _check_raster(path, suffix, head)
+    return None
+
+
+def quarantine(path: Path, cache_root: Path) -> Optional[Path]:
+    """
+    Переносит файл и его .gz/.br копии в QUARANTINE_ROOT с сохранением относительного пути.
+    Возвращает новый путь основного файла.
+    """
+    if not path.exists():
+        return None
+    try:
+        relative = path.relative_to(cache_root)
+    except ValueError:
+        relative = Path(path.name)
+    target = QUARANTINE_ROOT / relative.parent / f"{int(time.time())}.{relative.name}"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(path), str(target))
+    for sidecar in (Path(f"{path}.gz"), Path(f"{path}.br")):
+        sidecar.unlink(missing_ok=True)
+    return target
@@ -0,0 +1,494 @@
+"""
+Манифест кеша картинок (таблица media_assets).
+
+Единственный источник правды о том, что лежит в кеше: API, прогрев кеша и служебные
+скрипты читают его вместо обхода файловой системы или запросов в Seafile.
+Каждая операция открывает свою короткую сессию, поэтому модуль можно вызывать
+из кеша, фоновых колбэков конвейера и скриптов без передачи db.
+"""
+
+import atexit
+import mimetypes
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, inspect, or_
+from sqlalchemy.exc import IntegrityError
+
+from ..database import SessionLocal, engine
+from ..models import MediaAsset
+
+MAIN = "main"
+DESIGN = "design"
+GALLERY = "gallery"
+
+# last_access_at обновляем не чаще раза в час, чтобы чтение не превращалось в запись на каждый запрос
+ACCESS_TOUCH_INTERVAL = timedelta(hours=1)
+# Обращения копятся в памяти и пишутся одним UPDATE в фоне, не в потоке запроса (секунды)
+ACCESS_FLUSH_DELAY = 30
+
+# Задержка перед повторной попыткой скачать файл: 1 мин, 2, 4, ... но не больше суток
+FAILURE_BACKOFF_BASE = timedelta(minutes=1)
+FAILURE_BACKOFF_MAX = timedelta(hours=24)
+
+# Колонки, добавленные после создания таблицы: (имя, DDL)
+_LATE_COLUMNS = (
+    ("failure_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("last_error", "VARCHAR(500)"),
+    ("last_failure_at", "DATETIME"),
+    ("retry_after", "DATETIME"),
+    ("width", "INTEGER"),
+    ("height", "INTEGER"),
+    ("placeholder", "TEXT"),
+)
+
+_table_ready = False
+
+
+def ensure_table() -> None:
+    """Создаёт таблицу, если её нет (скрипты могут работать без запуска app.main)."""
+    global _table_ready
+    if not _table_ready:
+        MediaAsset.__table__.create(bind=engine, checkfirst=True)
+        _add_missing_columns()
+        _table_ready = True
+
+
+def _add_missing_columns() -> None:
+    # Быстрая миграция для таблиц, созданных до появления новых колонок
+    existing = {c["name"] for c in inspect(engine).get_columns(MediaAsset.__tablename__)}
+    missing = [(name, ddl) for name, ddl in _LATE_COLUMNS if name not in existing]
+    if not missing:
+        return
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name, ddl in missing:
+            conn.exec_driver_sql(f"ALTER TABLE {MediaAsset.__tablename__} ADD COLUMN {name} {ddl}")
+
+
+def _session():
+    # Объекты отдаются наружу после закрытия сессии, поэтому не expire'им их при commit
+    return SessionLocal(expire_on_commit=False)
+
+
+def design_key(frame_color: str, insert_color: str) -> str:
+    return f"{frame_color}/{insert_color}"
+
+
+def record(
+    machine_id: int,
+    kind: str,
+    key: str,
+    local_url: str,
+    size: Optional[int] = None,
+    sha256: Optional[str] = None,
+    source_path: Optional[str] = None,
+    file_id: Optional[str] = None,
+    content_type: Optional[str] = None,
+    verified: bool = True,
+) -> None:
+    """Создаёт или обновляет запись о закешированном файле."""
+    ensure_table()
+    now = datetime.utcnow()
+    for attempt in range(2):
+        db = _session()
+        try:
+            asset = (
+                db.query(MediaAsset)
+                .filter(MediaAsset.machine_id == machine_id, MediaAsset.kind == kind, MediaAsset.key == key)
+                .first()
+            )
+            if asset is None:
+                asset = MediaAsset(machine_id=machine_id, kind=kind, key=key)
+                db.add(asset)
+            if asset.local_url != local_url:
+                asset.variants = None
+                asset.width = asset.height = asset.placeholder = None
+            asset.local_url = local_url
+            asset.size = size
+            asset.sha256 = sha256
+            asset.content_type = content_type or mimetypes.guess_type(local_url)[0]
+            if source_path is not None:
+                asset.source_path = source_path
+            if file_id is not None:
+                asset.file_id = file_id
+            if verified:
+                asset.verified_at = now
+            # Успешное скачивание снимает негативный кеш
+            asset.failure_count = 0
+            asset.last_error = None
+            asset.retry_after = None
+            db.commit()
+            return
+        except IntegrityError:
+            # Параллельная запись создала строку раньше нас — повторяем как обновление
+            db.rollback()
+            if attempt:
+                raise
+        finally:
+            db.close()
+
+
+def backoff_delay(failure_count: int) -> timedelta:
+    if failure_count <= 0:
+        return timedelta(0)
+    return min(FAILURE_BACKOFF_BASE * (2 ** (failure_count - 1)), FAILURE_BACKOFF_MAX)
+
+
+def record_failure(
+    machine_id: int, kind: str, key: str, reason: str, source_path: Optional[str] = None
+) -> Optional[datetime]:
+    """Запоминает неудачное скачивание. Возвращает момент, раньше которого повторять не стоит."""
+    ensure_table()
+    now = datetime.utcnow()
+    for attempt in range(2):
+        db = _session()
+        try:
+            asset = (
+                db.query(MediaAsset)
+                .filter(MediaAsset.machine_id == machine_id, MediaAsset.kind == kind, MediaAsset.key == key)
+                .first()
+            )
+            if asset is None:
+                asset = MediaAsset(machine_id=machine_id, kind=kind, key=key, failure_count=0)
+                db.add(asset)
+            if source_path is not None:
+                asset.source_path = source_path
+            asset.failure_count = (asset.failure_count or 0) + 1
+            asset.last_error = reason[:500]
+            asset.last_failure_at = now
+            asset.retry_after = now + backoff_delay(asset.failure_count)
+            db.commit()
+            return asset.retry_after
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+        finally:
+            db.close()
+    return None
+
+
+def is_backed_off(asset: Optional[MediaAsset], source_path: Optional[str] = None) -> bool:
+    """
+    True, если последнее скачивание упало и окно задержки ещё не истекло.
+    Если источник сменился (другой путь в Seafile), прошлые ошибки не учитываются.
+    """
+    if asset is None or not asset.retry_after:
+        return False
+    if source_path and asset.source_path and asset.source_path != source_path:
+        return False
+    return asset.retry_after > datetime.utcnow()
+
+
+def list_failures(active_only: bool = False) -> List[MediaAsset]:
+    """Записи с ошибками скачивания, сначала самые свежие."""
+    ensure_table()
+    db = _session()
+    try:
+        query = db.query(MediaAsset).filter(MediaAsset.failure_count > 0)
+        if active_only:
+            query = query.filter(MediaAsset.retry_after > datetime.utcnow())
+        return query.order_by(MediaAsset.last_failure_at.desc()).all()
+    finally:
+        db.close()
+
+
+def reset_failures(asset_id: Optional[int] = None) -> int:
+    """Снимает негативный кеш (для одной записи или для всех) — следующий запрос попробует снова."""
+    ensure_table()
+    db = _session()
+    try:
+        query = db.query(MediaAsset).filter(MediaAsset.failure_count > 0)
+        if asset_id is not None:
+            query = query.filter(MediaAsset.id == asset_id)
+        count = query.update(
+            {MediaAsset.failure_count: 0, MediaAsset.retry_after: None, MediaAsset.last_error: None},
+            synchronize_session=False,
+        )
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def lookup(machine_id: int, kind: str, key: str = "", touch: bool = True) -> Optional[MediaAsset]:
+    """Одна запись по уникальному индексу (machine_id, kind, key)."""
+    ensure_table()
+    db = _session()
+    try:
+        asset = (
+            db.query(MediaAsset)
+            .filter(MediaAsset.machine_id == machine_id, MediaAsset.kind == kind, MediaAsset.key == key)
+            .first()
+        )
+        if asset is not None and touch:
+            note_access([asset])
+        return asset
+    finally:
+        db.close()
+
+
+def lookup_machine(machine_id: int) -> Dict[Tuple[str, str], MediaAsset]:
+    """Все записи машины одним запросом: {(kind, key): asset}. last_access_at не трогает (см. note_access)."""
+    ensure_table()
+    db = _session()
+    try:
+        return {(a.kind, a.key): a for a in db.query(MediaAsset).filter(MediaAsset.machine_id == machine_id)}
+    finally:
+        db.close()
+
+
+def list_kind(machine_id: int, kind: str, touch: bool = True) -> List[MediaAsset]:
+    ensure_table()
+    db = _session()
+    try:
+        assets = (
+            db.query(MediaAsset)
+            .filter(MediaAsset.machine_id == machine_id, MediaAsset.kind == kind)
+            .order_by(MediaAsset.key)
+            .all()
+        )
+        if assets and touch:
+            note_access(assets)
+        return assets
+    finally:
+        db.close()
+
+
+def machine_assets(machine_id: int) -> List[MediaAsset]:
+    ensure_table()
+    db = _session()
+    try:
+        return db.query(MediaAsset).filter(MediaAsset.machine_id == machine_id).all()
+    finally:
+        db.close()
+
+
+def all_assets(kind: Optional[str] = None) -> List[MediaAsset]:
+    ensure_table()
+    db = _session()
+    try:
+        query = db.query(MediaAsset)
+        if kind:
+            query = query.filter(MediaAsset.kind == kind)
+        return query.order_by(MediaAsset.machine_id, MediaAsset.kind, MediaAsset.key).all()
+    finally:
+        db.close()
+
+
+_pending_access: Set[int] = set()
+_access_lock = threading.Lock()
+_flush_scheduled = False
+
+
+def note_access(assets: Iterable[Optional[MediaAsset]]) -> None:
+    """
+    Отмечает обращение к записям. В БД попадают только записи, не тронутые дольше
+    ACCESS_TOUCH_INTERVAL, и не сразу: одним UPDATE в фоновом потоке через ACCESS_FLUSH_DELAY.
+    """
+    global _flush_scheduled
+    now = datetime.utcnow()
+    stale_ids = [
+        a.id
+        for a in assets
+        if a is not None and (a.last_access_at is None or now - a.last_access_at > ACCESS_TOUCH_INTERVAL)
+    ]
+    if not stale_ids:
+        return
+    with _access_lock:
+        _pending_access.update(stale_ids)
+        if _flush_scheduled:
+            return
+        _flush_scheduled = True
+    timer = threading.Timer(ACCESS_FLUSH_DELAY, flush_access)
+    timer.daemon = True
+    timer.start()
+
+
+def flush_access() -> None:
+    """Пишет накопленные обращения в last_access_at (вызывается таймером и при выходе)."""
+    global _flush_scheduled
+    with _access_lock:
+        ids = list(_pending_access)
+        _pending_access.clear()
+        _flush_scheduled = False
+    if not ids:
+        return
+    db = _session()
+    try:
+        db.query(MediaAsset).filter(MediaAsset.id.in_(ids)).update(
+            {MediaAsset.last_access_at: datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    except Exception as e:
+        print(f"  ⚠️  Failed to store media access times: {e}")
+    finally:
+        db.close()
+
+
+atexit.register(flush_access)
+
+
+def set_variants(
+    local_url: str,
+    variants: Dict[str, str],
+    new_local_url: Optional[str] = None,
+    size: Optional[int] = None,
+    meta: Optional[Dict] = None,
+    sha256: Optional[str] = None,
+) -> None:
+    """
+    Сохраняет производные файлы (после конвейера). new_local_url — если optimize/convert
+    сменили файл, size и sha256 — итогового файла, meta — {"width", "height", "placeholder"}.
+    """
+    ensure_table()
+    db = _session()
+    try:
+        asset = db.query(MediaAsset).filter(MediaAsset.local_url == local_url).first()
+        if asset is None:
+            return
+        asset.variants = variants or None
+        if size is not None:
+            asset.size = size
+        if sha256 is not None:
+            asset.sha256 = sha256
+        if meta:
+            asset.width = meta.get("width")
+            asset.height = meta.get("height")
+            asset.placeholder = meta.get("placeholder")
+        if new_local_url and new_local_url != local_url:
+            asset.local_url = new_local_url
+            asset.content_type = mimetypes.guess_type(new_local_url)[0]
+        db.commit()
+    finally:
+        db.close()
+
+
+def mark_verified(asset_ids: List[int]) -> None:
+    if not asset_ids:
+        return
+    ensure_table()
+    db = _session()
+    try:
+        db.query(MediaAsset).filter(MediaAsset.id.in_(asset_ids)).update(
+            {MediaAsset.verified_at: datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def update_checksum(asset_id: int, size: int, sha256: str) -> None:
+    """Файл цел, но манифест хранит размер/sha256 до оптимизации (записи до переименования по отпечатку)."""
+    ensure_table()
+    db = _session()
+    try:
+        db.query(MediaAsset).filter(MediaAsset.id == asset_id).update(
+            {MediaAsset.size: size, MediaAsset.sha256: sha256}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def invalidate(asset_id: int, reason: str) -> None:
+    """
+    Файл в кеше оказался битым: запись остаётся (с источником), но без local_url,
+    поэтому следующий прогрев или запрос скачает файл заново. Причина видна в /admin/media/failures.
+    """
+    ensure_table()
+    db = _session()
+    try:
+        asset = db.get(MediaAsset, asset_id)
+        if asset is None:
+            return
+        asset.local_url = None
+        asset.variants = None
+        asset.width = asset.height = asset.placeholder = None
+        asset.verified_at = None
+        asset.failure_count = (asset.failure_count or 0) + 1
+        asset.last_error = f"quarantined: {reason}"[:500]
+        asset.last_failure_at = datetime.utcnow()
+        # Без задержки: повторное скачивание разрешено сразу
+        asset.retry_after = None
+        db.commit()
+    finally:
+        db.close()
+
+
+def image_meta(local_urls: List[str]) -> Dict[str, Dict]:
+    """{url: {"width", "height", "placeholder"}} одним запросом; url без сведений не попадают в ответ."""
+    urls = [u for u in local_urls if u]
+    if not urls:
+        return {}
+    ensure_table()
+    db = _session()
+    try:
+        rows = (
+            db.query(MediaAsset.local_url, MediaAsset.width, MediaAsset.height, MediaAsset.placeholder)
+            .filter(MediaAsset.local_url.in_(urls))
+            .all()
+        )
+        return {
+            url: {"width": width, "height": height, "placeholder": placeholder}
+            for url, width, height, placeholder in rows
+            if width or placeholder
+        }
+    finally:
+        db.close()
+
+
+def delete_machine(machine_id: int) -> None:
+    ensure_table()
+    db = _session()
+    try:
+        db.query(MediaAsset).filter(MediaAsset.machine_id == machine_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def delete_asset(machine_id: int, kind: str, key: str = "") -> None:
+    ensure_table()
+    db = _session()
+    try:
+        db.query(MediaAsset).filter(
+            MediaAsset.machine_id == machine_id, MediaAsset.kind == kind, MediaAsset.key == key
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def summary(stale_after: timedelta = timedelta(days=7)) -> Dict:
+    """Сводка по кешу: количество и объём по видам, непроверенные давно записи, прогретые машины."""
+    ensure_table()
+    db = _session()
+    try:
+        cached = MediaAsset.local_url.isnot(None)
+        rows = (
+            db.query(MediaAsset.kind, func.count(MediaAsset.id), func.coalesce(func.sum(MediaAsset.size), 0))
+            .filter(cached)
+            .group_by(MediaAsset.kind)
+            .all()
+        )
+        threshold = datetime.utcnow() - stale_after
+        unverified = (
+            db.query(func.count(MediaAsset.id))
+            .filter(cached, or_(MediaAsset.verified_at.is_(None), MediaAsset.verified_at < threshold))
+            .scalar()
+        )
+        failing = db.query(func.count(MediaAsset.id)).filter(MediaAsset.failure_count > 0).scalar()
+        warm_machines = (
+            db.query(func.count(func.distinct(MediaAsset.machine_id))).filter(cached, MediaAsset.kind == MAIN).scalar()
+        )
+        return {
+            "by_kind": {kind: {"count": count, "size": int(size)} for kind, count, size in rows},
+            "unverified": unverified,
+            "failing": failing,
+            "warm_machines": warm_machines,
+        }
+    finally:
+        db.close()
@@ -0,0 +1,266 @@
+"""
+Конвейер обработки файлов после скачивания в кеш.
+
+Стадии трёх видов выполняются по порядку:
+  - optimize: bytes -> bytes, тот же формат (результат сохраняется, только если он меньше);
+  - convert:  Path -> Path, другой формат (оригинал удаляется после успешной конвертации);
+  - derive:   Path -> List[Path], дополнительные файлы рядом с основным (.gz/.br и т.п.);
+  - inspect:  Path -> Dict, сведения о готовом файле (размеры, заглушка), попадают в result["meta"].
+
+Работа идёт в пуле процессов размером с число CPU, поэтому тяжёлые операции
+(например, WebP с method=6) не блокируют запросы. Если стадия падает, файл остаётся
+в том виде, в котором был до неё.
+
+Если задан namer, optimize и convert не перезаписывают файл на месте, а пишут новое
+содержимое под именем namer(path, sha256) (в кеше — имя с отпечатком новых байтов).
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import svg_optimizer
+
+OPTIMIZE = "optimize"
+CONVERT = "convert"
+DERIVE = "derive"
+INSPECT = "inspect"
+STAGE_ORDER = (OPTIMIZE, CONVERT, DERIVE, INSPECT)
+
+
+class Stage(NamedTuple):
+    name: str
+    kind: str
+    # Функция должна быть объявлена на уровне модуля, чтобы её можно было передать в процесс
+    func: Callable
+    # Расширения файлов, к которым применяется стадия (пусто = ко всем)
+    suffixes: Tuple[str, ...] = ()
+
+    def applies_to(self, path: Path) -> bool:
+        return not self.suffixes or path.suffix.lower() in self.suffixes
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def _rename_for_content(path: Path, data: bytes, namer: Optional[Callable], result: Dict) -> Path:
+    """Путь для нового содержимого файла: namer(path, sha256) или тот же путь без namer."""
+    if namer is None:
+        return path
+    result["sha256"] = hashlib.sha256(data).hexdigest()
+    return Path(namer(path, result["sha256"]))
+
+
+def run_stages(path_str: str, stages: Tuple[Stage, ...], namer: Optional[Callable] = None) -> Dict:
+    """Выполняет стадии над одним файлом. Вызывается в процессе пула (или inline как фоллбек)."""
+    current = Path(path_str)
+    result: Dict = {"source": path_str, "path": path_str, "timings": {}, "errors": {}, "derived": [], "meta": {}}
+
+    for stage in stages:
+        if not current.exists() or not stage.applies_to(current):
+            continue
+        started = time.perf_counter()
+        try:
+            if stage.kind == OPTIMIZE:
+                original = current.read_bytes()
+                optimized = stage.func(original)
+                if optimized and len(optimized) < len(original):
+                    target = _rename_for_content(current, optimized, namer, result)
+                    _atomic_write(target, optimized)
+                    if target != current:
+                        current.unlink(missing_ok=True)
+                        current = target
+            elif stage.kind == CONVERT:
+                converted = stage.func(current)
+                if converted and Path(converted).exists() and Path(converted) != current:
+                    converted = Path(converted)
+                    target = _rename_for_content(converted, converted.read_bytes(), namer, result)
+                    if target != converted:
+                        converted.replace(target)
+                    current.unlink(missing_ok=True)
+                    current = target
+            elif stage.kind == DERIVE:
+                derived = stage.func(current) or []
+                result["derived"].extend(str(p) for p in derived)
+            elif stage.kind == INSPECT:
+                result["meta"].update(stage.func(current) or {})
+        except Exception as exc:
+            result["errors"][stage.name] = f"{type(exc).__name__}: {exc}"
+        finally:
+            result["timings"][stage.name] = round((time.perf_counter() - started) * 1000, 1)
+
+    result["path"] = str(current)
+    return result
+
+
+class MediaPipeline:
+    def __init__(
+        self,
+        stages: Iterable[Stage] = (),
+        max_workers: Optional[int] = None,
+        namer: Optional[Callable[[Path, str], Path]] = None,
+    ):
+        # namer объявляется на уровне модуля: он передаётся в процесс пула вместе со стадиями
+        self.namer = namer
+        self._stages: List[Stage] = []
+        for stage in stages:
+            self.add_stage(stage)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._listeners: List[Callable[[Dict], None]] = []
+
+    def add_stage(self, stage: Stage) -> None:
+        if stage.kind not in STAGE_ORDER:
+            raise ValueError(f"Unknown stage kind: {stage.kind}")
+        self._stages.append(stage)
+        self._stages.sort(key=lambda s: STAGE_ORDER.index(s.kind))
+
+    def remove_stage(self, name: str) -> None:
+        self._stages = [s for s in self._stages if s.name != name]
+
+    def add_listener(self, callback: Callable[[Dict], None]) -> None:
+        """callback(result) вызывается в основном процессе после обработки каждого файла."""
+        self._listeners.append(callback)
+
+    @property
+    def stages(self) -> Tuple[Stage, ...]:
+        return tuple(self._stages)
+
+    def _applicable(self, path: Path) -> Tuple[Stage, ...]:
+        return tuple(s for s in self._stages if s.applies_to(path))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, а не fork: пул создаётся из многопоточного процесса (uvicorn)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _record(self, result: Dict) -> None:
+        with self._lock:
+            for name, ms in result["timings"].items():
+                entry = self._stats.setdefault(name, {"count": 0, "total_ms": 0.0, "errors": 0})
+                entry["count"] += 1
+                entry["total_ms"] += ms
+                if name in result["errors"]:
+                    entry["errors"] += 1
+        timings = ", ".join(f"{name} {ms:.0f}ms" for name, ms in result["timings"].items())
+        if timings:
+            print(f"  ⏱  {Path(result['path']).name}: {timings}")
+        for name, error in result["errors"].items():
+            print(f"  ⚠️  Stage '{name}' failed for {Path(result['source']).name}, keeping previous file: {error}")
+        for callback in self._listeners:
+            callback(result)
+
+    def _on_done(self, future: Future) -> None:
+        try:
+            self._record(future.result())
+        except BrokenProcessPool as exc:
+            # Воркер упал: файл остаётся как есть, пул пересоздаётся при следующей задаче
+            with self._lock:
+                self._executor = None
+            print(f"  ⚠️  Media pipeline worker crashed, keeping original file: {exc}")
+        except Exception as exc:
+            print(f"  ⚠️  Media pipeline error: {exc}")
+
+    def submit(self, path: Path, stages: Optional[Tuple[Stage, ...]] = None) -> Future:
+        """Ставит файл в очередь пула и сразу возвращает Future с результатом run_stages."""
+        stages = self._applicable(path) if stages is None else stages
+        try:
+            future = self._get_executor().submit(run_stages, str(path), stages, self.namer)
+        except (BrokenProcessPool, RuntimeError, OSError):
+            # Пул недоступен (например, при завершении процесса) — выполняем в текущем потоке
+            with self._lock:
+                self._executor = None
+            future = Future()
+            future.set_result(run_stages(str(path), stages, self.namer))
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _run_now(self, path: Path, stages: Tuple[Stage, ...]) -> Dict:
+        """Выполняет стадии в пуле и ждёт результата; слушатели вызываются до возврата."""
+        try:
+            result = self._get_executor().submit(run_stages, str(path), stages, self.namer).result()
+        except BrokenProcessPool:
+            with self._lock:
+                self._executor = None
+            result = run_stages(str(path), stages, self.namer)
+        except (RuntimeError, OSError):
+            result = run_stages(str(path), stages, self.namer)
+        self._record(result)
+        return result
+
+    def process(self, path: Path) -> Path:
+        """
+        Обрабатывает файл после скачивания.
+        Стадии, меняющие содержимое (optimize, convert), выполняются до возврата: путь уходит
+        в манифест и DTO уже с итоговым именем. Производные файлы и inspect — в фоне.
+        """
+        stages = self._applicable(path)
+        if not stages:
+            return path
+        content = tuple(s for s in stages if s.kind in (OPTIMIZE, CONVERT))
+        rest = tuple(s for s in stages if s.kind not in (OPTIMIZE, CONVERT))
+        if content:
+            try:
+                path = Path(self._run_now(path, content)["path"])
+            except Exception as exc:
+                print(f"  ⚠️  Media pipeline error: {exc}")
+                return path
+        # convert мог сменить формат: производные стадии подбираются по итоговому файлу
+        rest = tuple(s for s in rest if s.applies_to(path))
+        if rest and path.exists():
+            self.submit(path, rest)
+        return path
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {**entry, "avg_ms": round(entry["total_ms"] / entry["count"], 1) if entry["count"] else 0.0}
+                for name, entry in self._stats.items()
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# === Встроенные стадии ===
+
+def optimize_svg(data: bytes) -> Optional[bytes]:
+    """Оптимизация SVG в памяти (см. svg_optimizer), без запуска scour отдельным процессом."""
+    return svg_optimizer.optimize_svg(data)
+
+
+def convert_svg_to_webp(svg_path: Path, width: int = 2000, quality: int = 85) -> Optional[Path]:
+    """SVG -> WebP через cairosvg + Pillow. Возвращает путь к .webp или None, если библиотек нет."""
+    try:
+        import io
+
+        import cairosvg
+        from PIL import Image
+    except ImportError:
+        return None
+
+    png_data = cairosvg.svg2png(bytestring=svg_path.read_bytes(), output_width=width)
+    webp_path = svg_path.with_suffix(".webp")
+    tmp = webp_path.with_name(webp_path.name + ".tmp")
+    Image.open(io.BytesIO(png_data)).save(tmp, "WEBP", quality=quality, method=6)
+    tmp.replace(webp_path)
+    return webp_path
@@ -0,0 +1,191 @@
+"""
+Потоковый прокси картинок из Seafile с одновременной записью в кеш.
+
+При промахе кеша первый запрос запускает скачивание в фоновом потоке: байты пишутся
+в .part-файл, а клиент читает этот же файл по мере записи и получает картинку со скоростью
+Seafile, не дожидаясь конца скачивания. Параллельные запросы того же файла подключаются
+к уже идущему скачиванию и читают тот же .part-файл с начала. После завершения файл
+переименовывается в кеш (media_cache.finalize_download), и следующие запросы получают
+локальную копию.
+"""
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlencode
+
+from .. import http_pool
+from . import media_cache, media_integrity
+
+CHUNK_SIZE = 64 * 1024
+CONNECT_TIMEOUT = 10
+# Сколько ждать следующего куска от Seafile (и сколько клиент ждёт появления новых данных)
+READ_TIMEOUT = 30
+
+PROXY_PREFIX = "/api/media"
+
+
+class InFlightDownload:
+    """Одно скачивание, которое читают один или несколько клиентов."""
+
+    def __init__(self, dest: Path, resolve_url: Callable[[], str], asset: Dict):
+        self.dest = dest
+        self.resolve_url = resolve_url
+        self.asset = asset
+        # Отдельное имя, чтобы не пересекаться с обычным _download_to того же файла
+        self.tmp = dest.with_name(f"{dest.name}.proxy.part")
+        # Текущее расположение данных: .part, после завершения — итоговый файл
+        self.path = self.tmp
+        self.cond = threading.Condition()
+        self.written = 0
+        self.content_type: Optional[str] = None
+        self.content_length: Optional[int] = None
+        self.headers_ready = False
+        self.done = False
+        self.error: Optional[Exception] = None
+
+    def start(self) -> None:
+        self.tmp.parent.mkdir(parents=True, exist_ok=True)
+        # Файл создаётся до регистрации, чтобы подключившиеся клиенты могли сразу его открыть
+        self.tmp.open("wb").close()
+        threading.Thread(target=self._run, name=f"media-proxy:{self.dest.name}", daemon=True).start()
+
+    def _run(self) -> None:
+        resp = None
+        try:
+            url = self.resolve_url()
+            # verify=False по той же причине, что и в media_cache._download_to (сертификат seafhttp)
+            resp = http_pool.get(
+                url, "seafhttp.proxy", stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), verify=False
+            )
+            if resp.status_code in (401, 403):
+                raise PermissionError(f"HTTP {resp.status_code}: access denied")
+            resp.raise_for_status()
+            problem = media_integrity.check_content_type(resp.headers.get("Content-Type"))
+            if problem:
+                raise ValueError(problem)
+            with self.cond:
+                self.content_type = resp.headers.get("Content-Type")
+                self.content_length = media_cache.expected_length(resp.headers)
+                self.headers_ready = True
+                self.cond.notify_all()
+
+            digest = hashlib.sha256()
+            with self.tmp.open("wb") as f:
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    f.flush()
+                    digest.update(chunk)
+                    with self.cond:
+                        self.written += len(chunk)
+                        self.cond.notify_all()
+
+            # Проверка, манифест и конвейер — без блокировки, чтобы не задерживать читателей;
+            # клиент, который не успел открыть .part до переименования, дождётся нового path в attach()
+            final = media_cache.finalize_download(
+                self.dest, self.tmp, digest.hexdigest(), self.content_type, self.asset, self.content_length
+            )
+            with self.cond:
+                self.path = final
+                self.done = True
+                self.cond.notify_all()
+        except Exception as e:
+            with self.cond:
+                self.error = e
+                self.done = True
+                self.cond.notify_all()
+            self.tmp.unlink(missing_ok=True)
+            media_cache.record_fetch_failure(
+                self.asset["machine_id"], self.asset["kind"], self.asset["key"], self.asset.get("source_path"), e
+            )
+        finally:
+            if resp is not None:
+                resp.close()
+            _unregister(self)
+
+    def attach(self) -> BinaryIO:
+        with self.cond:
+            path = self.path
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            # .part уже переименован (или удалён после ошибки), а path ещё не обновлён
+            with self.cond:
+                self.cond.wait_for(lambda: self.path != path or self.done, timeout=READ_TIMEOUT)
+                if self.error is not None:
+                    raise self.error
+                path = self.path
+            return open(path, "rb")
+
+    def wait_for_headers(self, timeout: float = CONNECT_TIMEOUT + READ_TIMEOUT) -> None:
+        with self.cond:
+            self.cond.wait_for(lambda: self.headers_ready or self.done, timeout=timeout)
+            if self.error is not None:
+                raise self.error
+            if not self.headers_ready:
+                raise TimeoutError("Upstream did not respond in time")
+
+    def follow(self, f: BinaryIO) -> Iterator[bytes]:
+        """Отдаёт файл с начала, дожидаясь новых данных, пока скачивание не закончится."""
+        offset = 0
+        try:
+            while True:
+                with self.cond:
+                    while offset >= self.written and not self.done:
+                        if not self.cond.wait(timeout=READ_TIMEOUT):
+                            raise TimeoutError("Upstream stalled")
+                    available, done, error = self.written, self.done, self.error
+                if error is not None:
+                    # Клиент получит оборванный ответ, а не битую картинку с кодом 200 в кеше
+                    raise RuntimeError(f"Upstream download failed: {error}")
+                while offset < available:
+                    chunk = f.read(min(CHUNK_SIZE, available - offset))
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    yield chunk
+                if done and offset >= available:
+                    return
+        finally:
+            f.close()
+
+
+_inflight: Dict[Tuple[int, str, str], InFlightDownload] = {}
+_lock = threading.Lock()
+
+
+def _unregister(entry: InFlightDownload) -> None:
+    key = (entry.asset["machine_id"], entry.asset["kind"], entry.asset["key"])
+    with _lock:
+        if _inflight.get(key) is entry:
+            del _inflight[key]
+
+
+def open_stream(dest: Path, resolve_url: Callable[[], str], asset: Dict) -> Tuple[InFlightDownload, BinaryIO]:
+    """
+    Подключается к идущему скачиванию файла или запускает новое.
+    resolve_url вызывается в фоновом потоке (обычно это запрос ссылки в Seafile).
+    """
+    key = (asset["machine_id"], asset["kind"], asset["key"])
+    with _lock:
+        entry = _inflight.get(key)
+        if entry is None:
+            entry = InFlightDownload(dest, resolve_url, asset)
+            entry.start()
+            _inflight[key] = entry
+    # Открываем вне _lock: attach() может ждать завершения скачивания, а _lock нужен всем файлам
+    return entry, entry.attach()
+
+
+def in_flight() -> int:
+    with _lock:
+        return len(_inflight)
+
+
+def proxy_url(machine_id: int, kind: str, **params: str) -> str:
+    """URL прокси для DTO: /api/media/10/design?frame=...&insert=..."""
+    query = urlencode({k: v for k, v in params.items() if v is not None})
+    return f"{PROXY_PREFIX}/{machine_id}/{kind}" + (f"?{query}" if query else "")
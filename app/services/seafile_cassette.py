@@ -0,0 +1,158 @@
+"""
+Запись и воспроизведение ответов Seafile («кассета») для скриптов.
+
+В режиме записи CassetteClient пропускает вызовы в настоящий SeafileClient и сохраняет
+ответы (и ошибки) в JSON-файл. В режиме воспроизведения отвечает только из файла, без сети:
+повторный прогон auto_assign_design_images.py --dry-run с другими правилами сопоставления
+занимает секунды, а результат детерминирован — кассету можно брать как вход для замеров.
+
+Ссылки на скачивание в кассете со временем протухают, поэтому воспроизведение подходит
+для --dry-run и замеров, а не для кеширования картинок.
+"""
+
+import atexit
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RECORD = "record"
+REPLAY = "replay"
+FORMAT_VERSION = 1
+
+
+class CassetteMiss(LookupError):
+    """В кассете нет ответа на этот вызов (запись делалась с другими параметрами)."""
+
+
+class RecordedError(RuntimeError):
+    """Ошибка, которую Seafile вернул при записи; при воспроизведении выбрасывается снова."""
+
+
+def _norm_path(path: str) -> str:
+    return "/" + (path or "").strip("/")
+
+
+class CassetteClient:
+    """Обёртка над SeafileClient с методами list_directory, get_file_download_link(s), get_repo_head."""
+
+    def __init__(self, client, path: Path, mode: str):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown cassette mode {mode!r}")
+        self._client = client
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict[str, Dict]] = {}
+        self.hits = 0
+        self.recorded = 0
+        if mode == REPLAY:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") != FORMAT_VERSION:
+                raise ValueError(f"{self.path}: unsupported cassette version {data.get('version')}")
+            self._calls = data["calls"]
+            print(f"📼 Воспроизведение Seafile из {self.path} ({sum(len(v) for v in self._calls.values())} ответов)")
+        else:
+            print(f"📼 Запись ответов Seafile в {self.path}")
+            atexit.register(self.save)
+
+    def _call(self, method: str, key: str, live):
+        if self.mode == REPLAY:
+            with self._lock:
+                entry = self._calls.get(method, {}).get(key)
+                self.hits += entry is not None
+            if entry is None:
+                raise CassetteMiss(f"{method}({key}) is not in cassette {self.path}")
+            if "error" in entry:
+                raise RecordedError(entry["error"])
+            return entry["result"]
+
+        try:
+            result = live()
+        except Exception as e:
+            with self._lock:
+                self._calls.setdefault(method, {})[key] = {"error": f"{type(e).__name__}: {e}"}
+                self.recorded += 1
+            raise
+        with self._lock:
+            self._calls.setdefault(method, {})[key] = {"result": result}
+            self.recorded += 1
+        return result
+
+    def list_directory(self, path: str = "/", fresh: bool = False) -> List[Dict]:
+        result = self._call("list_directory", _norm_path(path), lambda: self._client.list_directory(path, fresh=fresh))
+        return [dict(item) for item in result]
+
+    def list_directory_recursive(self, path: str = "/") -> List[Dict]:
+        result = self._call(
+            "list_directory_recursive", _norm_path(path), lambda: self._client.list_directory_recursive(path)
+        )
+        return [dict(item) for item in result]
+
+    def get_repo_head(self) -> str:
+        return self._call("get_repo_head", "", self._client.get_repo_head if self._client else None)
+
+    def get_file_download_link(self, file_path: str) -> str:
+        return self._call(
+            "get_file_download_link", _norm_path(file_path), lambda: self._client.get_file_download_link(file_path)
+        )
+
+    def get_file_download_links(
+        self, file_paths: Iterable[str], max_workers: Optional[int] = None
+    ) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        paths = list(dict.fromkeys(p for p in file_paths if p))
+        if self.mode == RECORD:
+            kwargs = {"max_workers": max_workers} if max_workers else {}
+            links, errors = self._client.get_file_download_links(paths, **kwargs)
+            with self._lock:
+                calls = self._calls.setdefault("get_file_download_link", {})
+                for path, link in links.items():
+                    calls[_norm_path(path)] = {"result": link}
+                for path, error in errors.items():
+                    calls[_norm_path(path)] = {"error": f"{type(error).__name__}: {error}"}
+                self.recorded += len(paths)
+            return links, errors
+
+        links: Dict[str, str] = {}
+        errors: Dict[str, Exception] = {}
+        for path in paths:
+            try:
+                links[path] = self.get_file_download_link(path)
+            except (CassetteMiss, RecordedError) as e:
+                errors[path] = e
+        return links, errors
+
+    def list_file_links(self, folder_path: str) -> List[str]:
+        items = self.list_directory(folder_path)
+        paths = [
+            item.get("path") or f"{_norm_path(folder_path).rstrip('/')}/{item.get('name')}"
+            for item in items
+            if item.get("type") == "file"
+        ]
+        links, errors = self.get_file_download_links(paths)
+        if errors:
+            raise next(iter(errors.values()))
+        return [links[p] for p in paths]
+
+    def invalidate_directory(self, path: Optional[str] = None, recursive: bool = True) -> int:
+        if self._client is not None and hasattr(self._client, "invalidate_directory"):
+            return self._client.invalidate_directory(path, recursive)
+        return 0
+
+    def save(self) -> None:
+        if self.mode != RECORD:
+            return
+        with self._lock:
+            data = {"version": FORMAT_VERSION, "created_at": time.time(), "calls": self._calls}
+            count = sum(len(v) for v in self._calls.values())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+        print(f"📼 Кассета сохранена: {self.path} ({count} ответов)")
+
+    def __getattr__(self, name):
+        if self._client is None:
+            raise AttributeError(name)
+        return getattr(self._client, name)
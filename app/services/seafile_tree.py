@@ -0,0 +1,262 @@
+"""
+Снимок дерева библиотеки Seafile с локальными индексами.
+
+Скрипты автоподбора картинок обходят /Конфигуратор/Графика отдельным list_directory на каждую
+папку модели, каркаса, цвета, вставки и сигнатуры, и так для каждой машины. Снимок забирает
+дерево одним рекурсивным запросом, хранит его в SNAPSHOT_PATH и строит индексы:
+  - по пути: элемент и содержимое папки (в том же формате, что отдаёт list_directory);
+  - по нормализованному имени: все папки/файлы с таким именем в любом месте дерева.
+
+Снимок привязан к head-коммиту библиотеки: пока head не поменялся, его используют и скрипты,
+и API (между процессами — через файл). Проверка head — не чаще раза в HEAD_CHECK_INTERVAL секунд.
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SNAPSHOT_PATH = Path("app/cache_seafile/tree.json")
+DEFAULT_ROOT = "/"
+HEAD_CHECK_INTERVAL = 60
+FORMAT_VERSION = 1
+
+_SEPARATORS = str.maketrans({" ": "", "_": "", "-": "", "ё": "е"})
+
+
+def normalize_name(name: str) -> str:
+    """Имя для поиска: нижний регистр, ё→е, без пробелов, '_' и '-'."""
+    return (name or "").lower().translate(_SEPARATORS)
+
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent.rstrip('/')}/{name}"
+
+
+def _norm_path(path: str) -> str:
+    return "/" + (path or "").strip("/")
+
+
+class TreeSnapshot:
+    """Неизменяемый снимок дерева: после построения читается из любых потоков без блокировок."""
+
+    def __init__(self, root: str, head: str, items: List[Dict], created_at: Optional[float] = None):
+        self.root = _norm_path(root)
+        self.head = head
+        self.created_at = created_at or time.time()
+        self.entries: Dict[str, Dict] = {}
+        self.children: Dict[str, List[Dict]] = {self.root: []}
+        self.by_name: Dict[str, List[str]] = {}
+        for item in items:
+            parent = _norm_path(item.get("parent_dir") or self.root)
+            path = _join(parent, item.get("name") or "")
+            entry = {**item, "parent_dir": parent, "path": path}
+            self.entries[path] = entry
+            self.children.setdefault(parent, []).append(entry)
+            if entry.get("type") == "dir":
+                self.children.setdefault(path, [])
+            self.by_name.setdefault(normalize_name(entry.get("name") or ""), []).append(path)
+
+    def covers(self, path: str) -> bool:
+        path = _norm_path(path)
+        return path == self.root or path.startswith(self.root.rstrip("/") + "/")
+
+    def get(self, path: str) -> Optional[Dict]:
+        return self.entries.get(_norm_path(path))
+
+    def is_dir(self, path: str) -> bool:
+        return _norm_path(path) in self.children
+
+    def list_directory(self, path: str = "/") -> List[Dict]:
+        """Содержимое папки как у SeafileClient.list_directory; FileNotFoundError, если папки нет."""
+        listing = self.children.get(_norm_path(path))
+        if listing is None:
+            raise FileNotFoundError(f"{path} not found in tree snapshot")
+        return [dict(item) for item in listing]
+
+    def find(self, name: str, type: Optional[str] = None, under: Optional[str] = None) -> List[Dict]:
+        """Элементы с тем же нормализованным именем, опционально только папки/файлы и только внутри under."""
+        prefix = _norm_path(under).rstrip("/") + "/" if under else None
+        found = []
+        for path in self.by_name.get(normalize_name(name), ()):
+            entry = self.entries[path]
+            if type and entry.get("type") != type:
+                continue
+            if prefix and not path.startswith(prefix):
+                continue
+            found.append(entry)
+        return found
+
+    def walk(self, path: Optional[str] = None) -> Iterator[Tuple[str, List[Dict]]]:
+        """Как os.walk: (папка, её содержимое) для path и всех вложенных папок."""
+        pending = [_norm_path(path or self.root)]
+        while pending:
+            folder = pending.pop()
+            listing = self.children.get(folder)
+            if listing is None:
+                continue
+            yield folder, listing
+            pending.extend(item["path"] for item in reversed(listing) if item.get("type") == "dir")
+
+    def stats(self) -> Dict:
+        files = sum(1 for e in self.entries.values() if e.get("type") == "file")
+        return {
+            "root": self.root,
+            "head": self.head,
+            "created_at": self.created_at,
+            "dirs": len(self.children),
+            "files": files,
+        }
+
+    def to_json(self) -> Dict:
+        items = [{k: v for k, v in e.items() if k != "path"} for e in self.entries.values()]
+        return {
+            "version": FORMAT_VERSION,
+            "root": self.root,
+            "head": self.head,
+            "created_at": self.created_at,
+            "items": items,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> Optional["TreeSnapshot"]:
+        if data.get("version") != FORMAT_VERSION:
+            return None
+        return cls(data["root"], data["head"], data["items"], data.get("created_at"))
+
+
+def fetch(client, root: str = DEFAULT_ROOT) -> TreeSnapshot:
+    """Забирает дерево из Seafile (head читается до обхода, чтобы не пропустить изменения во время него)."""
+    head = client.get_repo_head()
+    started = time.perf_counter()
+    items = client.list_directory_recursive(_norm_path(root))
+    snapshot = TreeSnapshot(root, head, items)
+    stats = snapshot.stats()
+    print(
+        f"🌳 Снимок дерева Seafile {snapshot.root}: {stats['dirs']} папок, {stats['files']} файлов "
+        f"за {time.perf_counter() - started:.1f} с (head {head[:12]})"
+    )
+    return snapshot
+
+
+def load(path: Path = SNAPSHOT_PATH) -> Optional[TreeSnapshot]:
+    if not path.exists():
+        return None
+    try:
+        return TreeSnapshot.from_json(json.loads(path.read_text(encoding="utf-8")))
+    except (ValueError, KeyError, OSError) as e:
+        print(f"⚠️  Не удалось прочитать снимок дерева {path}: {e}")
+        return None
+
+
+def save(snapshot: TreeSnapshot, path: Path = SNAPSHOT_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(snapshot.to_json(), ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+
+_current: Optional[TreeSnapshot] = None
+_checked_at = 0.0
+# _lock — только чтение и подмена _current; сетевые запросы идут под _refresh_lock,
+# чтобы current() (fallback_listing в API) не ждал обхода всего дерева
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def _cached(root: str) -> Tuple[Optional[TreeSnapshot], float]:
+    """Снимок из памяти или файла, если он покрывает root, и время последней проверки head."""
+    global _current, _checked_at
+    with _lock:
+        if _current is None or not _current.covers(root):
+            stored = load()
+            if stored is not None and stored.covers(root):
+                _current, _checked_at = stored, 0.0
+        if _current is not None and _current.covers(root):
+            return _current, _checked_at
+        return None, 0.0
+
+
+def get_snapshot(client, root: str = DEFAULT_ROOT, force: bool = False) -> TreeSnapshot:
+    """
+    Актуальный снимок, покрывающий root: из памяти, из файла или свежий из Seafile.
+    Если Seafile не отвечает, а снимок уже есть, возвращается он (лучше старое дерево, чем никакого).
+    """
+    global _current, _checked_at
+    snapshot, checked_at = _cached(root)
+    if snapshot is not None and not force and time.monotonic() - checked_at < HEAD_CHECK_INTERVAL:
+        return snapshot
+
+    with _refresh_lock:
+        # Пока ждали, другой поток мог уже обновить снимок
+        snapshot, checked_at = _cached(root)
+        if snapshot is not None and not force:
+            if time.monotonic() - checked_at < HEAD_CHECK_INTERVAL:
+                return snapshot
+            try:
+                head = client.get_repo_head()
+            except Exception as e:
+                print(f"⚠️  Не удалось проверить head библиотеки, используем снимок {snapshot.head[:12]}: {e}")
+                return snapshot
+            if head == snapshot.head:
+                with _lock:
+                    if _current is snapshot:
+                        _checked_at = time.monotonic()
+                return snapshot
+
+        # При смене head перечитываем весь корень прежнего снимка, а не только запрошенную папку
+        if snapshot is not None:
+            root = snapshot.root
+        try:
+            fresh = fetch(client, root)
+        except Exception:
+            if snapshot is not None:
+                print("⚠️  Не удалось обновить снимок дерева, используем предыдущий")
+                return snapshot
+            raise
+        save(fresh)
+        with _lock:
+            _current, _checked_at = fresh, time.monotonic()
+        # head поменялся — закешированное содержимое папок под root тоже могло устареть
+        if hasattr(client, "invalidate_directory"):
+            client.invalidate_directory(root)
+        return fresh
+
+
+def current() -> Optional[TreeSnapshot]:
+    """Снимок, который уже есть в памяти или в файле, без обращений к Seafile и без ожидания обновления."""
+    global _current
+    snapshot = _current
+    if snapshot is not None:
+        return snapshot
+    with _lock:
+        if _current is None:
+            _current = load()
+        return _current
+
+
+def invalidate() -> None:
+    global _current, _checked_at
+    with _lock:
+        _current, _checked_at = None, 0.0
+        SNAPSHOT_PATH.unlink(missing_ok=True)
+
+
+class SnapshotClient:
+    """
+    Обёртка над SeafileClient для скриптов: list_directory отвечает из снимка,
+    остальные методы (ссылки на скачивание и т. п.) уходят в настоящий клиент.
+    """
+
+    def __init__(self, client, snapshot: TreeSnapshot):
+        self._client = client
+        self.snapshot = snapshot
+
+    def list_directory(self, path: str = "/") -> List[Dict]:
+        if self.snapshot.covers(path):
+            return self.snapshot.list_directory(path)
+        return self._client.list_directory(path)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,200 @@
+"""
+Оптимизация SVG в памяти, без запуска scour отдельным процессом.
+
+minify_svg работает с bytes и делает то же, что чаще всего нужно от scour:
+  - удаляет комментарии, <metadata> и служебные данные редакторов (inkscape/sodipodi);
+  - удаляет неиспользуемые id и укорачивает используемые;
+  - убирает лишние пробелы между тегами и внутри геометрических атрибутов;
+  - округляет дробные числа в геометрических атрибутах до precision знаков.
+Встроенные base64-картинки, <text>, <style>, <script> и CDATA не трогаются.
+"""
+
+import importlib.util
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+# Атрибуты с геометрией, в которых безопасно округлять числа и сжимать пробелы
+NUMERIC_ATTRS = {
+    "d", "points", "transform", "viewBox", "x", "y", "x1", "y1", "x2", "y2",
+    "cx", "cy", "r", "rx", "ry", "fx", "fy", "width", "height",
+    "stroke-width", "stroke-dashoffset", "stroke-dasharray", "offset", "opacity",
+    "fill-opacity", "stroke-opacity", "stop-opacity", "gradientTransform", "patternTransform",
+}
+EDITOR_PREFIXES = ("inkscape", "sodipodi")
+
+_PROTECTED = re.compile(
+    r"<!\[CDATA\[.*?\]\]>|<(text|style|script)\b[^>]*>.*?</\1\s*>",
+    re.DOTALL | re.IGNORECASE,
+)
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_METADATA = re.compile(r"<metadata\b[^>]*?(?:/>|>.*?</metadata\s*>)", re.DOTALL | re.IGNORECASE)
+_EDITOR_ELEMENT = re.compile(
+    r"<(%s):[\w.-]+\b[^>]*?(?:/>|>.*?</\1:[\w.-]+\s*>)" % "|".join(EDITOR_PREFIXES), re.DOTALL
+)
+_TAG = re.compile(r"<[A-Za-z][^>]*>")
+_ATTR = re.compile(r"""(\s+)([\w:.-]+)(\s*=\s*)("[^"]*"|'[^']*')""")
+_NUMBER = re.compile(r"-?(?:\d+\.\d+|\.\d+|\d+)(?:[eE][-+]?\d+)?")
+_BETWEEN_TAGS = re.compile(r">\s+(?=<|\x00)|(?<=\x00)\s+(?=<)")
+_ID_ATTR = re.compile(r"""\sid=("([^"]*)"|'([^']*)')""")
+_URL_REF = re.compile(r"url\(\s*['\"]?#([^)'\"\s]+)['\"]?\s*\)")
+_HREF_REF = re.compile(r"""href=["']#([^"']+)["']""")
+
+
+@lru_cache(maxsize=None)
+def scour_available() -> bool:
+    """Проверяется один раз за процесс."""
+    return importlib.util.find_spec("scour") is not None
+
+
+def _format_number(token: str, precision: int) -> str:
+    if "." not in token or "e" in token.lower():
+        return token
+    value = round(float(token), precision)
+    text = f"{value:.{precision}f}".rstrip("0").rstrip(".")
+    if text in ("-0", ""):
+        text = "0"
+    return text
+
+
+def _needs_separator(prev: str, token: str) -> bool:
+    # В компактной записи ("M1.5.5L-.5-1") числа идут без разделителя. Если округление убрало
+    # у предыдущего числа точку (или минус у текущего), они склеятся в одно — нужен пробел
+    if not prev or not token or token[0] not in "0123456789.":
+        return False
+    return token[0] != "." or "." not in prev
+
+
+def _numbers(value: str) -> List[float]:
+    return [float(m.group(0)) for m in _NUMBER.finditer(value)]
+
+
+def _shrink_value(value: str, precision: int) -> str:
+    parts: List[str] = []
+    prev = ""
+    end = 0
+    for m in _NUMBER.finditer(value):
+        gap = value[end:m.start()]
+        token = _format_number(m.group(0), precision)
+        if not gap and _needs_separator(prev, token):
+            gap = " "
+        parts.append(gap)
+        parts.append(token)
+        prev = token
+        end = m.end()
+    parts.append(value[end:])
+    result = re.sub(r"\s+", " ", "".join(parts)).strip()
+
+    # Проверка: те же числа в том же количестве, отличаются не больше чем на округление
+    before, after = _numbers(value), _numbers(result)
+    tolerance = 0.5 * 10 ** -precision + 1e-9
+    if len(before) != len(after) or any(abs(a - b) > tolerance * max(1.0, abs(a)) for a, b in zip(before, after)):
+        return re.sub(r"\s+", " ", value).strip()
+    return result
+
+
+def _short_id(index: int) -> str:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, len(letters))
+        name = letters[rem] + name
+    return name
+
+
+def _rewrite_tag(tag: str, precision: int, id_map: Dict[str, str], strip_ids: bool) -> str:
+    def repl(m: "re.Match") -> str:
+        space, name, eq, quoted = m.groups()
+        if name.split(":", 1)[0] in EDITOR_PREFIXES or name in ("xmlns:inkscape", "xmlns:sodipodi"):
+            return ""
+        quote, value = quoted[0], quoted[1:-1]
+        if name == "id" and strip_ids:
+            if value not in id_map:
+                return ""
+            value = id_map[value]
+        elif name in NUMERIC_ATTRS:
+            value = _shrink_value(value, precision)
+        elif name in ("href", "xlink:href") and value.startswith("#") and value[1:] in id_map:
+            value = "#" + id_map[value[1:]]
+        elif "url(" in value:
+            value = _URL_REF.sub(lambda u: f"url(#{id_map.get(u.group(1), u.group(1))})", value)
+        return f" {name}={quote}{value}{quote}"
+
+    head_end = re.match(r"<[^\s/>]+", tag).end()
+    body = _ATTR.sub(repl, tag[head_end:])
+    return tag[:head_end] + re.sub(r"\s+(?=/?>$)", "", body)
+
+
+def minify_svg(data: bytes, precision: int = 3, shorten_ids: bool = True) -> bytes:
+    """Возвращает уменьшенный SVG. Если файл не удаётся разобрать как UTF-8, возвращает исходные данные."""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data
+
+    protected: List[str] = []
+
+    def protect(m: "re.Match") -> str:
+        protected.append(m.group(0))
+        return f"\x00{len(protected) - 1}\x00"
+
+    text = _COMMENT.sub("", text)
+    text = _PROTECTED.sub(protect, text)
+    text = _METADATA.sub("", text)
+    text = _EDITOR_ELEMENT.sub("", text)
+
+    # id: удаляем неиспользуемые, используемые переименовываем по частоте ссылок.
+    # Если в файле есть CSS (<style>), селекторы могут ссылаться на id — тогда id не трогаем.
+    id_map: Dict[str, str] = {}
+    strip_ids = shorten_ids and not any(p.lower().startswith("<style") for p in protected)
+    if strip_ids:
+        counts: Dict[str, int] = {}
+        for source in [text] + protected:
+            for m in list(_URL_REF.finditer(source)) + list(_HREF_REF.finditer(source)):
+                counts[m.group(1)] = counts.get(m.group(1), 0) + 1
+        declared = {m.group(2) if m.group(2) is not None else m.group(3) for m in _ID_ATTR.finditer(text)}
+        # Ссылки из защищённых фрагментов (<text> с <tspan href>) переписать нельзя — такие id не меняем,
+        # как и id, объявленные внутри них
+        pinned = set()
+        for source in protected:
+            for m in list(_URL_REF.finditer(source)) + list(_HREF_REF.finditer(source)):
+                pinned.add(m.group(1))
+            for m in _ID_ATTR.finditer(source):
+                pinned.add(m.group(2) if m.group(2) is not None else m.group(3))
+        used = sorted((i for i in declared if i in counts), key=lambda i: (-counts[i], i))
+        index = 0
+        for old in used:
+            if old in pinned:
+                id_map[old] = old
+                continue
+            while _short_id(index) in pinned:
+                index += 1
+            id_map[old] = _short_id(index)
+            index += 1
+
+    text = _TAG.sub(lambda m: _rewrite_tag(m.group(0), precision, id_map, strip_ids), text)
+    text = _BETWEEN_TAGS.sub(lambda m: ">" if m.group(0).startswith(">") else "", text).strip()
+    text = re.sub("\x00(\\d+)\x00", lambda m: protected[int(m.group(1))], text)
+    return text.encode("utf-8")
+
+
+def optimize_svg(data: bytes, precision: int = 3, use_scour: bool = False) -> bytes:
+    """
+    minify_svg + (по желанию) scour через Python API, если он установлен.
+    Возвращает самый маленький из результатов.
+    """
+    result = minify_svg(data, precision=precision)
+    if use_scour and scour_available():
+        from scour import scour
+
+        options = scour.parse_args(
+            ["--enable-id-stripping", "--enable-comment-stripping", "--shorten-ids", "--indent=none"]
+        )
+        try:
+            scoured = scour.scourString(result.decode("utf-8"), options).encode("utf-8")
+        except Exception:
+            scoured = result
+        if len(scoured) < len(result):
+            result = scoured
+    return result if len(result) < len(data) else data
@@ -0,0 +1,104 @@
+"""
+Вынос встроенных base64-картинок из SVG в отдельные файлы — офлайн-экспорт для оценки экономии.
+
+Большие SVG дизайнов почти целиком состоят из data:image/...;base64 (см. scripts/analyze_svg.py),
+и разные цветовые варианты часто встраивают одну и ту же фотографию. extract_rasters:
+  - декодирует каждую встроенную картинку и пережимает её в WebP (если установлен Pillow);
+  - кладёт её в папку shared под именем по хешу содержимого, поэтому одинаковые картинки
+    из разных SVG хранятся один раз;
+  - пишет копию SVG с относительными ссылками на эти файлы.
+
+Кеш картинок и манифест не меняются: сайт показывает SVG через <img>, а такая картинка не
+подгружает внешние ресурсы, поэтому отдавать копии со ссылками пока некуда.
+Экспорт строит scripts/extract_svg_rasters.py в отдельную папку.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SHARED_DIR = "shared"
+WEBP_QUALITY = 85
+
+_DATA_URI = re.compile(
+    r"""(href\s*=\s*)(["'])data:image/([A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)\2"""
+)
+_EXT_BY_SUBTYPE = {"png": ".png", "jpeg": ".jpg", "jpg": ".jpg", "webp": ".webp", "gif": ".gif"}
+
+
+def _recompress_webp(raw: bytes) -> Optional[bytes]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    image = Image.open(io.BytesIO(raw))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    out = io.BytesIO()
+    image.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+    return out.getvalue()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Несколько процессов пула могут одновременно сохранять одну и ту же картинку
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def store_raster(raw: bytes, subtype: str, shared_root: Path) -> Tuple[Path, bool]:
+    """Кладёт картинку в shared_root. Возвращает (путь, создан_ли_новый_файл)."""
+    digest = hashlib.sha256(raw).hexdigest()[:12]
+    shared_root.mkdir(parents=True, exist_ok=True)
+    for existing in shared_root.glob(f"img.{digest}.*"):
+        if not existing.name.endswith(".tmp"):
+            return existing, False
+
+    payload, ext = raw, _EXT_BY_SUBTYPE.get(subtype.lower(), ".bin")
+    if ext != ".webp":
+        try:
+            webp = _recompress_webp(raw)
+        except Exception:
+            webp = None
+        if webp and len(webp) < len(raw):
+            payload, ext = webp, ".webp"
+    path = shared_root / f"img.{digest}{ext}"
+    _write_atomic(path, payload)
+    return path, True
+
+
+def extract_rasters(svg_path: Path, target: Path, shared_root: Path) -> Optional[List[Path]]:
+    """
+    Пишет в target копию SVG со ссылками на картинки в shared_root.
+    Возвращает новые файлы картинок или None, если встроенных картинок нет (target не пишется).
+    """
+    text = svg_path.read_text(encoding="utf-8")
+    created: List[Path] = []
+    urls: Dict[str, str] = {}
+
+    def repl(m: "re.Match") -> str:
+        prefix, quote, subtype, payload = m.groups()
+        try:
+            raw = base64.b64decode("".join(payload.split()), validate=True)
+        except (binascii.Error, ValueError):
+            return m.group(0)
+        key = hashlib.sha256(raw).hexdigest()
+        if key not in urls:
+            path, is_new = store_raster(raw, subtype, shared_root)
+            if is_new:
+                created.append(path)
+            urls[key] = Path(os.path.relpath(path, target.parent)).as_posix()
+        return f"{prefix}{quote}{urls[key]}{quote}"
+
+    linked = _DATA_URI.sub(repl, text)
+    if not urls:
+        return None
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(target, linked.encode("utf-8"))
+    return created
@@ -0,0 +1,272 @@
+import mimetypes
+import os
+import re
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Порядок предпочтения кодировок и суффиксы sidecar-файлов (см. media_cache.write_precompressed)
+ENCODING_SIDECARS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_SUFFIXES = (".svg",)
+
+# Файлы с отпечатком содержимого в имени (main.<hash>.svg) не меняются — кешируем на год
+FINGERPRINTED_NAME = re.compile(r"\.[0-9a-f]{12}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Режимы отдачи файлов (MEDIA_SERVE_MODE):
+#   app        — приложение само отдаёт файл (с поддержкой Range/206 и zero-copy, если сервер умеет);
+#   x-accel    — только заголовок X-Accel-Redirect, файл отдаёт nginx из internal-location;
+#   x-sendfile — только заголовок X-Sendfile с абсолютным путём (Apache mod_xsendfile, lighttpd).
+SERVE_APP = "app"
+SERVE_X_ACCEL = "x-accel"
+SERVE_X_SENDFILE = "x-sendfile"
+SERVE_MODES = (SERVE_APP, SERVE_X_ACCEL, SERVE_X_SENDFILE)
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    """Разбирает Accept-Encoding, отбрасывая кодировки с q=0."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(token)
+    return accepted
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    "bytes=0-99" -> (0, 99) включительно. None — заголовок не поддерживается (отдаём весь файл),
+    (-1, -1) — диапазон за пределами файла (416).
+    Несколько диапазонов сразу (multipart/byteranges) не поддерживаем: отдаём файл целиком, это допустимо.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, sep, end_text = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_text:
+            # bytes=-500: последние 500 байт
+            suffix = int(end_text)
+            if suffix <= 0:
+                return (-1, -1)
+            return (max(0, size - suffix), size - 1)
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return (-1, -1)
+    if start < 0 or end < start:
+        return None
+    return (start, min(end, size - 1))
+
+
+class RangeFileResponse(FileResponse):
+    """
+    FileResponse с Range/206 и If-Range. Тело отдаётся через расширения ASGI-сервера,
+    если они есть: http.response.zerocopysend (sendfile без копирования в Python)
+    или http.response.pathsend; иначе — чтением кусками.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path, request_headers: Headers, stat_result: os.stat_result, **kwargs) -> None:
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.headers["Accept-Ranges"] = "bytes"
+        self.offset, self.count = 0, stat_result.st_size
+        range_header = request_headers.get("range")
+        if not range_header or self.status_code != 200 or not self._if_range_matches(request_headers):
+            return
+        byte_range = parse_range(range_header, stat_result.st_size)
+        if byte_range is None:
+            return
+        start, end = byte_range
+        if start < 0:
+            self.status_code = 416
+            self.headers["Content-Range"] = f"bytes */{stat_result.st_size}"
+            self.headers["Content-Length"] = "0"
+            self.count = 0
+            return
+        self.status_code = 206
+        self.offset, self.count = start, end - start + 1
+        self.headers["Content-Range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+        self.headers["Content-Length"] = str(self.count)
+
+    def _if_range_matches(self, request_headers: Headers) -> bool:
+        """If-Range: диапазон применяется, только если файл не изменился с прошлого раза."""
+        if_range = request_headers.get("if-range")
+        if not if_range:
+            return True
+        # Starlette отдаёт ETag без кавычек, поэтому сначала сравниваем как ETag, потом как дату
+        if if_range.strip('"') == self.headers.get("etag", "").strip('"'):
+            return True
+        if if_range.startswith(('"', "W/")):
+            return False
+        try:
+            return parsedate_to_datetime(if_range) >= parsedate_to_datetime(self.headers["last-modified"])
+        except (TypeError, ValueError, KeyError):
+            return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file.fileno(),
+                        "offset": self.offset,
+                        "count": self.count,
+                        "more_body": False,
+                    }
+                )
+            return
+        if "http.response.pathsend" in extensions and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # Файл укоротился во время отдачи — закрываем ответ
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class MediaStaticFiles(StaticFiles):
+    """
+    StaticFiles для закешированных картинок:
+    - отдаёт заранее сжатые .br/.gz копии файлов, если клиент их принимает
+      (сжатие делается один раз при кешировании, а не на каждый запрос);
+    - файлы с отпечатком содержимого в имени отдаёт с Cache-Control: immutable;
+    - поддерживает Range/206 либо передаёт отдачу фронт-прокси (serve_mode, см. SERVE_MODES).
+    """
+
+    def __init__(self, *args, serve_mode: str = SERVE_APP, accel_prefix: str = "/protected-static/", **kwargs):
+        super().__init__(*args, **kwargs)
+        if serve_mode not in SERVE_MODES:
+            raise ValueError(f"Unknown media serve mode: {serve_mode}")
+        self.serve_mode = serve_mode
+        self.accel_prefix = "/" + accel_prefix.strip("/") + "/"
+
+    def _pick_sidecar(self, full_path: str, scope: Scope) -> Optional[tuple]:
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if "*" in accepted:
+            accepted |= {encoding for encoding, _ in ENCODING_SIDECARS}
+        for encoding, suffix in ENCODING_SIDECARS:
+            if encoding not in accepted:
+                continue
+            sidecar = full_path + suffix
+            try:
+                return encoding, sidecar, os.stat(sidecar)
+            except OSError:
+                continue
+        return None
+
+    def file_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        if self.serve_mode != SERVE_APP and status_code == 200:
+            response = self._offloaded_response(full_path, stat_result, scope)
+        else:
+            response = self._encoded_file_response(full_path, stat_result, scope, status_code)
+        if FINGERPRINTED_NAME.search(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def _encoded_file_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        if not full_path.lower().endswith(COMPRESSIBLE_SUFFIXES):
+            return self._range_response(full_path, stat_result, scope, status_code)
+
+        picked = self._pick_sidecar(full_path, scope)
+        if picked is None:
+            return self._range_response(
+                full_path, stat_result, scope, status_code, headers={"Vary": "Accept-Encoding"}
+            )
+
+        encoding, sidecar, sidecar_stat = picked
+        # media_type берём по исходному имени, иначе .gz отдастся как application/gzip
+        return self._range_response(
+            sidecar,
+            sidecar_stat,
+            scope,
+            status_code,
+            media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+
+    def _range_response(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+        media_type: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        response = RangeFileResponse(
+            path,
+            request_headers,
+            stat_result,
+            status_code=status_code,
+            method=scope["method"],
+            media_type=media_type,
+            headers=headers,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _offloaded_response(self, full_path: str, stat_result: os.stat_result, scope: Scope) -> Response:
+        """
+        Пустой ответ с заголовком для фронт-прокси: файл, Range и условные запросы обрабатывает он.
+        Предсжатые копии в этом режиме отдаёт сам прокси (nginx gzip_static/brotli_static).
+        """
+        headers = {"Content-Type": mimetypes.guess_type(full_path)[0] or "application/octet-stream"}
+        if self.serve_mode == SERVE_X_ACCEL:
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            headers["X-Accel-Redirect"] = self.accel_prefix + quote(relative)
+        else:
+            headers["X-Sendfile"] = os.path.abspath(full_path)
+        return Response(status_code=200, headers=headers)
@@ -583,7 +583,7 @@
       maxIdx
     );
     v._imgIdx = idx;
-    setMainImageSrc(imgs[idx]);
+    setMainImageSrc(imgs[idx], getImageMeta(v, imgs[idx]));
 
     // Показываем стрелки только если больше одного изображения
     if ($nav.length) {
@@ -701,25 +701,57 @@
     $productImage.toggleClass("without-frame", !hasFrame);
   }
 
-  function setMainImageSrc(src) {
+  // Размеры и размытая заглушка картинки из API (main_image_meta / design main_image_meta / gallery_meta)
+  function getImageMeta(v, src) {
+    if (!v || !src) return null;
+    const candidates = [[v.main_image, v.main_image_meta]];
+    Object.values(v.design_images || {}).forEach((insertColors) => {
+      Object.values(insertColors || {}).forEach((cfg) => {
+        if (cfg) candidates.push([cfg.main_image, cfg.main_image_meta]);
+      });
+    });
+    (v.gallery_files || []).forEach((url, i) => {
+      candidates.push([url, (v.gallery_meta || [])[i]]);
+    });
+    const found = candidates.find(([url, meta]) => meta && url && normSrc(url) === src);
+    return found ? found[1] : null;
+  }
+
+  function applyImagePlaceholder(meta) {
+    if (meta && meta.width && meta.height) {
+      // Резервируем место под картинку до её загрузки, чтобы вёрстка не прыгала
+      $mainImg.attr({ width: meta.width, height: meta.height });
+    } else {
+      $mainImg.removeAttr("width height");
+    }
+    $mainImg.css({
+      "background-image": meta && meta.placeholder ? `url("${meta.placeholder}")` : "",
+      "background-size": meta && meta.placeholder ? "100% 100%" : "",
+    });
+  }
+
+  function setMainImageSrc(src, meta) {
     if (!$mainImg.length || !$productImage.length) return;
     imageLoadId += 1;
     const localId = imageLoadId;
 
     if (!src) {
       $mainImg.attr("src", "");
+      applyImagePlaceholder(null);
       $productImage.removeClass("is-loading");
       hideZoomLens();
       return;
     }
 
     $productImage.addClass("is-loading");
+    applyImagePlaceholder(meta);
 
     $mainImg.off("load.cfg error.cfg");
 
     $mainImg.on("load.cfg error.cfg", (e) => {
       if (localId === imageLoadId) {
         $productImage.removeClass("is-loading");
+        $mainImg.css("background-image", "");
         updateZoomMetrics();
         updateZoomImage(src);
         if (e.type === "error") {
@@ -1171,7 +1203,7 @@
 
     const $mainImg = $el(".cfg-main-image");
     if ($mainImg.length) {
-      setMainImageSrc(mainSrc || "");
+      setMainImageSrc(mainSrc || "", getImageMeta(v, mainSrc));
       if (mainSrc) {
         updateZoomImage(mainSrc);
       } else {
@@ -10,13 +10,31 @@ scripts/auto_assign_design_images.py
 Запуск:
   python -m scripts.auto_assign_design_images          # записывает в БД
   python -m scripts.auto_assign_design_images --dry-run  # только выводит найденные пути
+  python -m scripts.auto_assign_design_images --refresh-tree  # перечитать дерево Seafile, даже если head не менялся
+  python -m scripts.auto_assign_design_images --live     # без снимка дерева, list_directory на каждую папку
+  python -m scripts.auto_assign_design_images --workers 8  # подбирать пути для 8 машин параллельно
+  python -m scripts.auto_assign_design_images --incremental  # только изменённые машины и папки
+  python -m scripts.auto_assign_design_images --dry-run --record run.json  # записать ответы Seafile в кассету
+  python -m scripts.auto_assign_design_images --dry-run --replay run.json  # повторить прогон без сети
+
+Подбор с каркасом и без каркаса за один обход дерева и одну транзакцию — scripts/auto_assign_images.py.
+
+Папки читаются из снимка дерева (app/services/seafile_tree.py): одно рекурсивное чтение
+вместо запроса на каждую папку каждой машины.
 """
 
 import argparse
+import hashlib
+import io
+import json
 import re
 import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import copy
 
 # Добавляем корень и app в sys.path
@@ -30,12 +48,18 @@ from app.config import Settings  # noqa: E402
 from app.database import SessionLocal  # noqa: E402
 from app.models import CoffeeMachine  # noqa: E402
 from app.seafile_client import SeafileClient  # noqa: E402
-from app.services import media_cache  # noqa: E402
+from app.services import media_cache, seafile_cassette, seafile_tree  # noqa: E402
 from sqlalchemy.orm.attributes import flag_modified  # noqa: E402
 
 
 BASE_DIR = "/Конфигуратор/Графика"
 
+# Сколько обновлённых машин записывать в БД одним commit
+COMMIT_BATCH = 50
+
+# Состояние прошлого прогона для --incremental (рядом со снимком дерева)
+STATE_PATH = Path("app/cache_seafile/auto_assign_state.json")
+
 
 # === ВАРИАНТЫ "НЕТ" / "ОТСУТСТВУЕТ" (всё в нижнем регистре) ===
 NO_VALUE_VARIANTS = {
@@ -112,6 +136,13 @@ _CYR_TO_LAT = str.maketrans({
 })
 
 
+# Размер кешей сопоставления: имена папок и значения из БД повторяются от машины к машине
+MATCH_CACHE_SIZE = 65536
+
+_VERSION_RE = re.compile(r'v\d+(\.\d+)?')
+
+
+@lru_cache(maxsize=MATCH_CACHE_SIZE)
 def norm_key(val: str) -> str:
     """Нормализует строку для сравнения (нижний регистр, без пробелов/разделителей)."""
     if not val:
@@ -145,19 +176,25 @@ def fuzzy_match(db_value: str, seafile_value: str) -> bool:
     if not db_value or not seafile_value:
         return False
 
-    db_norm = norm_key(db_value)
-    sf_norm = norm_key(seafile_value)
+    matched, jl15 = _fuzzy_match_norm(norm_key(db_value), norm_key(seafile_value))
+    if jl15 and VERBOSE:
+        print(f"  [fuzzy_match] JL15 match: '{db_value}' <-> '{seafile_value}'")
+    return matched
 
+
+@lru_cache(maxsize=MATCH_CACHE_SIZE)
+def _fuzzy_match_norm(db_norm: str, sf_norm: str) -> Tuple[bool, bool]:
+    """fuzzy_match по уже нормализованным строкам: (совпадение, сработало ли правило JL15)."""
     # Точное совпадение
     if db_norm == sf_norm:
-        return True
+        return True, False
 
     # Убираем версии из БД (v2.5, v3.0, etc.) для сравнения
-    db_no_version = re.sub(r'v\d+(\.\d+)?', '', db_norm)
+    db_no_version = _VERSION_RE.sub('', db_norm)
 
     # Проверяем совпадение без версии
     if db_no_version == sf_norm:
-        return True
+        return True, False
 
     # === СПЕЦИАЛЬНАЯ ЛОГИКА ДЛЯ JL15 ===
     # Обрабатываем случаи типа "JL15-BT PRO" vs "JL15_VIVA-BT-MW"
@@ -171,13 +208,11 @@ def fuzzy_match(db_value: str, seafile_value: str) -> bool:
         # Если в БД BT, а в Seafile ST (или наоборот) - НЕ совпадение
         if (db_has_bt and sf_has_st and not sf_has_bt) or \
            (db_has_st and sf_has_bt and not sf_has_st):
-            return False
+            return False, False
         
         # Если оба содержат jl15 и оба содержат либо bt, либо st - совпадение!
         if (db_has_bt and sf_has_bt) or (db_has_st and sf_has_st):
-            if VERBOSE:
-                print(f"  [fuzzy_match] JL15 match: '{db_value}' <-> '{seafile_value}'")
-            return True
+            return True, True
 
     # === СПЕЦИАЛЬНАЯ ЛОГИКА ДЛЯ JL36A ===
     # Аналогично для других моделей
@@ -189,16 +224,16 @@ def fuzzy_match(db_value: str, seafile_value: str) -> bool:
         
         if (db_has_bt and sf_has_st and not sf_has_bt) or \
            (db_has_st and sf_has_bt and not sf_has_st):
-            return False
+            return False, False
         
         if (db_has_bt and sf_has_bt) or (db_has_st and sf_has_st):
-            return True
+            return True, False
 
     # Частичное совпадение (seafile содержится в db или наоборот)
     if len(sf_norm) >= 3 and (sf_norm in db_norm or db_norm in sf_norm):
-        return True
+        return True, False
 
-    return False
+    return False, False
 
 
 def is_empty_value(val: Optional[str]) -> bool:
@@ -219,6 +254,7 @@ def is_no_frame_folder(name: str) -> bool:
     return n in NO_FRAME_FOLDER_VARIANTS
 
 
+@lru_cache(maxsize=MATCH_CACHE_SIZE)
 def match_frame(db_frame: str, folder_name: str) -> bool:
     """
     Сопоставляет название каркаса из БД с названием папки на Seafile.
@@ -267,8 +303,69 @@ def match_frame(db_frame: str, folder_name: str) -> bool:
     return False
 
 
+def _simple_key(val: str) -> str:
+    # Нормализация без транслитерации (для случая с кириллицей в названии)
+    return val.lower().replace(" ", "").replace("_", "").replace("-", "")
+
+
+class FolderIndex:
+    """
+    Имена папок одного списка, нормализованные один раз: таблицы norm_key -> первая папка и
+    «простой» ключ (без транслитерации) -> первая папка. Точное совпадение в pick_entry — два
+    поиска в словаре вместо прохода по списку; частичное проверяется по готовым ключам.
+    """
+
+    def __init__(self, names: Tuple[str, ...]):
+        self.names = names
+        self.norms = [norm_key(name) for name in names]
+        self.simples = [_simple_key(name) for name in names]
+        self.exact: Dict[str, int] = {}
+        self.exact_simple: Dict[str, int] = {}
+        for i, (name_norm, name_simple) in enumerate(zip(self.norms, self.simples)):
+            self.exact.setdefault(name_norm, i)
+            self.exact_simple.setdefault(name_simple, i)
+
+    def pick(self, target: str) -> Optional[str]:
+        """То же, что pick_entry: первое точное совпадение, иначе лучшее частичное (score, длина)."""
+        t_norm = norm_key(target)
+        t_simple = _simple_key(target)
+        hits = [i for i in (self.exact.get(t_norm), self.exact_simple.get(t_simple)) if i is not None]
+        if hits:
+            return self.names[min(hits)]
+
+        best = None
+        best_key = (0, 0)
+        for name, name_norm, name_simple in zip(self.names, self.norms, self.simples):
+            if t_norm and name_norm and (t_norm in name_norm or name_norm in t_norm):
+                score = 2
+            elif t_simple and name_simple and (t_simple in name_simple or name_simple in t_simple):
+                score = 1
+            else:
+                continue
+            # При равных (score, длина) остаётся первая папка, как при стабильной сортировке
+            if (score, len(name)) > best_key:
+                best, best_key = name, (score, len(name))
+        return best
+
+
+@lru_cache(maxsize=256)
+def folder_index(names: Tuple[str, ...]) -> FolderIndex:
+    return FolderIndex(names)
+
+
+def clear_match_caches() -> None:
+    """Сбрасывает кеши нормализации и индексы папок (для замеров и долгоживущих процессов)."""
+    for cached in (norm_key, _fuzzy_match_norm, match_frame, parse_signature_folder, folder_index):
+        cached.cache_clear()
+
+
 def pick_entry(items: List[dict], target: str) -> Optional[str]:
     """Выбирает имя из items по нормализованному соответствию target (регистронезависимо)."""
+    if not VERBOSE:
+        names = tuple(it.get("name") or "" for it in items if it.get("type") == "dir")
+        return folder_index(names).pick(target)
+
+    # Подробный режим: проход по списку с объяснением каждого кандидата
     t_norm = norm_key(target)
     # Также нормализуем без транслитерации (для случая с кириллицей в названии)
     t_simple = target.lower().replace(" ", "").replace("_", "").replace("-", "")
@@ -334,6 +431,7 @@ def pick_frame_entry(items: List[dict], db_frame: str) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=MATCH_CACHE_SIZE)
 def parse_signature_folder(name: str) -> Tuple[str, Optional[str], Optional[str]]:
     """
     ИСПРАВЛЕНО: Парсит подпапку вида '4_JL15_VIVA-ST-MW PRO+MC6D-B+vendista' -> (model, fridge, terminal)
@@ -655,10 +753,326 @@ def build_design_images(machine: CoffeeMachine, client: SeafileClient) -> Dict[s
     return result
 
 
+def merge_design_images(machine: CoffeeMachine, design_images: Dict[str, Dict[str, Dict[str, str]]]) -> None:
+    """Сливает найденные design_images с уже записанными у машины (без commit)."""
+    existing = machine.design_images if isinstance(machine.design_images, dict) else {}
+    # deepcopy чтобы изображения не собсобствовались автоматически dict и не вызывали ошибку SQLAlchemy
+    merged = copy.deepcopy(existing)
+    for fc, inserts in design_images.items():
+        merged.setdefault(fc, {})
+        merged[fc].update(inserts)
+    machine.design_images = merged
+    flag_modified(machine, "design_images")
+
+
 # Глобальная переменная для verbose режима
 VERBOSE = False
 
 
+def _sig_value(val: Optional[str]) -> Tuple[bool, str]:
+    # Все сравнения регистронезависимы и не видят крайних пробелов; истинность значения сохраняем
+    # (model "" и model "  " обрабатываются по-разному)
+    return bool(val), str(val).lower().strip(" ") if val else ""
+
+
+def match_signature(machine: CoffeeMachine) -> Tuple:
+    """
+    Поля машины, от которых зависит подбор путей. Машины с одинаковой сигнатурой
+    (различаются только ценой, ссылками и т. п.) получают одинаковые design_images.
+    """
+    has_fridge = not is_empty_value(machine.refrigerator)
+    has_terminal = not is_empty_value(machine.terminal)
+    return (
+        _sig_value(machine.model),
+        _sig_value(machine.name) if not machine.model else None,
+        None if is_empty_value(machine.frame) else _sig_value(machine.frame),
+        _sig_value(machine.frame_color),
+        _sig_value(machine.refrigerator) if has_fridge else None,
+        _sig_value(machine.terminal) if has_terminal else None,
+    )
+
+
+def tree_version(client: SeafileClient) -> Optional[str]:
+    """head репозитория: у снимка дерева — из снимка, иначе запросом (None, если узнать не удалось)."""
+    snapshot = getattr(client, "snapshot", None)
+    if snapshot is not None:
+        return snapshot.head
+    try:
+        return client.get_repo_head()
+    except Exception:
+        return None
+
+
+class SignatureMemo:
+    """
+    Результаты подбора по (вид подбора, версия дерева, сигнатура машины): каждая уникальная
+    сигнатура разбирается один раз за прогон. Потокобезопасно для --workers: одновременные
+    запросы одной сигнатуры ждут первый.
+    """
+
+    def __init__(self, version: Optional[str]):
+        self.version = version
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple, Tuple[int, Future]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, kind: str, machine: CoffeeMachine, build):
+        key = (kind, self.version, match_signature(machine))
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                future: Future = Future()
+                self._results[key] = (machine.id, future)
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            try:
+                future.set_result(build())
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            return copy.deepcopy(future.result())
+
+        source_id, future = entry
+        result = future.result()
+        print(f"[{machine.id}] Сигнатура как у машины {source_id}: пути из кеша подбора")
+        return copy.deepcopy(result)
+
+
+class FolderTracker:
+    """
+    Обёртка над клиентом, которая запоминает, какие папки прочитал подбор в текущем потоке.
+    По этому списку инкрементальный режим понимает, каких машин касается изменение папки.
+    """
+
+    def __init__(self, client: SeafileClient):
+        self._client = client
+        self._local = threading.local()
+
+    def list_directory(self, path: str = "/") -> List[Dict]:
+        folders = getattr(self._local, "folders", None)
+        if folders is not None:
+            folders.add("/" + path.strip("/"))
+        return self._client.list_directory(path)
+
+    def track(self, func):
+        """(результат func(), множество прочитанных папок)."""
+        self._local.folders = set()
+        try:
+            return func(), self._local.folders
+        finally:
+            self._local.folders = None
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def folder_fingerprint(client: SeafileClient, path: str) -> Optional[str]:
+    """Отпечаток содержимого папки по именам и mtime детей; None — папки нет или не читается."""
+    try:
+        items = client.list_directory(path)
+    except Exception:
+        return None
+    digest = hashlib.sha1()
+    for item in sorted(items, key=lambda it: (it.get("name") or "", it.get("type") or "")):
+        digest.update(f"{item.get('type')}\0{item.get('name')}\0{item.get('mtime')}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class AssignState:
+    """
+    Состояние прошлого прогона для --incremental (STATE_PATH, раздел на каждый вид подбора):
+    сигнатура каждой машины, прочитанные при подборе папки и отпечатки этих папок, head дерева.
+
+    Машина подбирается заново, если её нет в состоянии, изменилась её сигнатура (match_signature)
+    или изменилась хотя бы одна из её папок. Если head не менялся, папки не проверяются вовсе.
+    """
+
+    def __init__(self, kind: str, path: Path = STATE_PATH):
+        self.kind = kind
+        self.path = path
+        self._data: Dict = {}
+        if path.exists():
+            try:
+                self._data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                print(f"⚠️  Состояние {path} не читается ({e}), прогон будет полным")
+        section = self._data.get(kind) or {}
+        self.head: Optional[str] = section.get("head")
+        self.machines: Dict[str, Dict] = section.get("machines") or {}
+        self.folders: Dict[str, Optional[str]] = section.get("folders") or {}
+        self._fingerprints: Dict[str, Optional[str]] = {}
+
+    @staticmethod
+    def signature(machine: CoffeeMachine) -> str:
+        return hashlib.sha1(repr(match_signature(machine)).encode("utf-8")).hexdigest()[:16]
+
+    def _fingerprint(self, client: SeafileClient, path: str) -> Optional[str]:
+        if path not in self._fingerprints:
+            self._fingerprints[path] = folder_fingerprint(client, path)
+        return self._fingerprints[path]
+
+    def affected(self, machines: List[CoffeeMachine], client: SeafileClient) -> List[CoffeeMachine]:
+        """Машины, которые нужно подобрать заново (порядок сохраняется)."""
+        head = tree_version(client)
+        if head and head == self.head:
+            changed_folders = set()
+        else:
+            changed_folders = {p for p, fp in self.folders.items() if self._fingerprint(client, p) != fp}
+
+        result = []
+        new = changed_sig = by_folder = 0
+        for m in machines:
+            entry = self.machines.get(str(m.id))
+            if entry is None:
+                new += 1
+            elif entry.get("sig") != self.signature(m):
+                changed_sig += 1
+            elif changed_folders.intersection(entry.get("folders") or ()):
+                by_folder += 1
+            else:
+                continue
+            result.append(m)
+        print(
+            f"🔁 Инкрементальный режим: новых машин {new}, изменённых {changed_sig}, "
+            f"затронуто изменёнными папками ({len(changed_folders)}) {by_folder} — "
+            f"подбор для {len(result)} из {len(machines)}"
+        )
+        return result
+
+    def record(self, machine: CoffeeMachine, folders, client: SeafileClient) -> None:
+        self.machines[str(machine.id)] = {"sig": self.signature(machine), "folders": sorted(folders)}
+        for path in folders:
+            self.folders[path] = self._fingerprint(client, path)
+
+    def save(self, client: SeafileClient, keep_ids: Optional[set] = None) -> None:
+        """Записывает раздел; keep_ids — id всех машин каталога, остальные (удалённые) забываются."""
+        if keep_ids is not None:
+            self.machines = {k: v for k, v in self.machines.items() if int(k) in keep_ids}
+        used = {p for entry in self.machines.values() for p in entry.get("folders") or ()}
+        # Другие разделы перечитываем: их мог записать соседний AssignState того же прогона
+        if self.path.exists():
+            try:
+                self._data = json.loads(self.path.read_text(encoding="utf-8"))
+            except ValueError:
+                self._data = {}
+        self._data[self.kind] = {
+            "head": tree_version(client),
+            "saved_at": time.time(),
+            "machines": self.machines,
+            "folders": {p: fp for p, fp in self.folders.items() if p in used},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+class _ThreadOutput:
+    """
+    sys.stdout, который в рабочем потоке пишет в буфер текущей машины, а в главном — как обычно.
+    Так вывод параллельного прогона печатается по машинам в исходном порядке, как при последовательном.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self._stream).write(text)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+    def capture(self, func, *args):
+        self._local.buffer = io.StringIO()
+        try:
+            return func(*args), self._local.buffer.getvalue()
+        finally:
+            self._local.buffer = None
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _timed_build(machine: CoffeeMachine, tracker: FolderTracker, memo: Optional[SignatureMemo]):
+    started = time.perf_counter()
+
+    def build():
+        return tracker.track(lambda: build_design_images(machine, tracker))
+
+    design_images, folders = memo.resolve("design", machine, build) if memo is not None else build()
+    return design_images, folders, time.perf_counter() - started
+
+
+def resolve_machines(
+    machines: List[CoffeeMachine],
+    client: SeafileClient,
+    workers: int = 1,
+    memo: Optional[SignatureMemo] = None,
+) -> Iterator[Tuple[CoffeeMachine, Dict, set, float]]:
+    """
+    (машина, design_images, прочитанные папки, секунды на подбор) в порядке machines.
+
+    При workers > 1 build_design_images идёт в пуле потоков: папки берутся из общего снимка дерева
+    или, с --live, из общего listing_cache клиента (потокобезопасен, одновременные запросы одной
+    папки объединяются). Вывод каждой машины копится в буфере и печатается, когда до неё дошла очередь.
+    """
+    tracker = FolderTracker(client)
+    if workers <= 1:
+        for machine in machines:
+            yield (machine, *_timed_build(machine, tracker, memo))
+        return
+
+    output = _ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(output.capture, _timed_build, machine, tracker, memo) for machine in machines]
+            for machine, future in zip(machines, futures):
+                result, text = future.result()
+                output.write(text)
+                yield (machine, *result)
+    finally:
+        sys.stdout = output._stream
+
+
+def open_client(
+    settings: Settings,
+    refresh_tree: bool = False,
+    live: bool = False,
+    record: Optional[str] = None,
+    replay: Optional[str] = None,
+):
+    """
+    SeafileClient, у которого list_directory отвечает из снимка дерева BASE_DIR (если не live).
+
+    record/replay — путь к кассете: ответы Seafile пишутся в файл или читаются из него без сети.
+    С кассетой снимок строится из её ответов, а не из app/cache_seafile, чтобы кассета была самодостаточной.
+    """
+    client = SeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
+    if record or replay:
+        mode = seafile_cassette.RECORD if record else seafile_cassette.REPLAY
+        client = seafile_cassette.CassetteClient(client, Path(record or replay), mode)
+    if live:
+        return client
+    if record or replay:
+        return seafile_tree.SnapshotClient(client, seafile_tree.fetch(client, BASE_DIR))
+    return seafile_tree.SnapshotClient(client, seafile_tree.get_snapshot(client, BASE_DIR, force=refresh_tree))
+
+
+def check_cassette_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """
+    --replay только вместе с --dry-run: ссылки на скачивание в кассете протухли, а обычный прогон
+    кеширует картинки (cache_machine_media сначала очищает кеш машины) — рабочий кеш был бы удалён.
+    """
+    if args.replay and not args.dry_run:
+        parser.error("--replay можно использовать только с --dry-run")
+
+
 def main() -> None:
     global VERBOSE
 
@@ -669,13 +1083,29 @@ def main() -> None:
     parser.add_argument("--without-frame", action="store_true", help="Только записи БЕЗ каркаса")
     parser.add_argument("--no-cache", action="store_true", help="Не кешировать изображения на сервер")
     parser.add_argument("--machine-id", type=int, help="Обработать только конкретную машину по ID")
+    parser.add_argument("--refresh-tree", action="store_true", help="Перечитать снимок дерева Seafile")
+    parser.add_argument("--live", action="store_true", help="Не использовать снимок дерева")
+    parser.add_argument("--workers", type=int, default=1, help="Подбирать пути для N машин параллельно")
+    parser.add_argument("--no-memo", action="store_true", help="Подбирать пути для каждой машины заново")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Только новые/изменённые машины и машины с изменёнными папками"
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="PATH", help="Записать ответы Seafile в кассету")
+    cassette.add_argument("--replay", metavar="PATH", help="Брать ответы Seafile из кассеты, без сети")
     args = parser.parse_args()
+    check_cassette_args(parser, args)
 
     VERBOSE = args.verbose
 
     settings = Settings()
-    client = SeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
+    client = open_client(
+        settings, refresh_tree=args.refresh_tree, live=args.live, record=args.record, replay=args.replay
+    )
     db = SessionLocal()
+    # Машины читают рабочие потоки, поэтому после промежуточных commit объекты не должны
+    # перечитываться из БД (сессия не потокобезопасна); пишет в БД только этот скрипт
+    db.expire_on_commit = False
 
     # Если указан --machine-id, обрабатываем только эту машину
     if args.machine_id:
@@ -689,7 +1119,11 @@ def main() -> None:
 
     updated = 0
     skipped = 0
+    pending = 0
+    timings = {"build": 0.0, "cache": 0.0, "commit": 0.0}
+    started = time.perf_counter()
 
+    selected: List[CoffeeMachine] = []
     for m in machines:
         has_frame = not is_empty_value(m.frame)
 
@@ -700,11 +1134,21 @@ def main() -> None:
         if args.without_frame and has_frame:
             skipped += 1
             continue
+        selected.append(m)
+
+    state = AssignState("design")
+    total_selected = len(selected)
+    if args.incremental:
+        selected = state.affected(selected, client)
 
-        design_images = build_design_images(m, client)
+    memo = None if args.no_memo else SignatureMemo(tree_version(client))
+    for m, design_images, folders, elapsed in resolve_machines(selected, client, args.workers, memo):
+        timings["build"] += elapsed
+        state.record(m, folders, client)
         if not design_images:
             continue
 
+        has_frame = not is_empty_value(m.frame)
         frame_info = m.frame if has_frame else "Без каркаса"
 
         if args.dry_run:
@@ -717,34 +1161,51 @@ def main() -> None:
             updated += 1
             continue
 
-        # Сливаем с существующими
-        existing = m.design_images if isinstance(m.design_images, dict) else {}
-        # deepcopy чтобы изображения не собсобствовались автоматически dict и не вызывали ошибку SQLAlchemy
-        merged = copy.deepcopy(existing)
-        for fc, inserts in design_images.items():
-            merged.setdefault(fc, {})
-            merged[fc].update(inserts)
-        m.design_images = merged
-        flag_modified(m, "design_images")
+        merge_design_images(m, design_images)
         db.add(m)
         updated += 1
+        pending += 1
         total_combos = sum(len(inserts) for inserts in design_images.values())
         print(f"[OK] id={m.id} model={m.model or m.name} frame={frame_info}: обновлены design_images ({len(design_images)} цветов каркаса, {total_combos} комбинаций)")
 
         # Кешируем изображения на сервер
         if not args.no_cache:
+            t = time.perf_counter()
             print(f"[CACHE] Кеширование изображений для машины {m.id}...")
             media_cache.cache_machine_media(m, client)
             print(f"[CACHE] Готово для машины {m.id}")
+            timings["cache"] += time.perf_counter() - t
+
+        if pending >= COMMIT_BATCH:
+            t = time.perf_counter()
+            db.commit()
+            timings["commit"] += time.perf_counter() - t
+            pending = 0
 
     if not args.dry_run:
+        t = time.perf_counter()
         db.commit()
+        timings["commit"] += time.perf_counter() - t
+        # Состояние пишется только после записи в БД: иначе следующий --incremental пропустил бы машины
+        state.save(client, keep_ids=None if args.machine_id else {m.id for m in machines})
         print(f"\nГотово: обновлено {updated} записей, пропущено {skipped}")
     else:
         print(f"\nDRY RUN: найдено {updated} записей (без записи в БД)")
 
     db.close()
 
+    total = time.perf_counter() - started
+    print("=" * 60)
+    print(f"Машин: {len(selected)} из {total_selected}, потоков: {max(1, args.workers)}, всего {total:.2f} с")
+    print(f"  подбор путей (сумма по машинам): {timings['build']:.2f} с")
+    if memo is not None:
+        print(f"  уникальных сигнатур: {memo.misses}, из кеша подбора: {memo.hits}")
+    if not args.no_cache and not args.dry_run:
+        print(f"  кеширование изображений: {timings['cache']:.2f} с")
+    if not args.dry_run:
+        print(f"  запись в БД: {timings['commit']:.2f} с")
+    print("=" * 60)
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+scripts/auto_assign_images.py
+Единый автоподбор картинок за один обход дерева Seafile: design_images для машин с каркасом
+и main_image_path/gallery_folder для машин без каркаса, запись в БД одной транзакцией.
+
+Машины группируются по папке модели, и дерево обходится модель за моделью: каждая папка
+(каркасы, цвета, Без_каркаса, сигнатуры) читается один раз и нужна обоим подборам —
+поиск 'Без_каркаса' идёт по тем же спискам каркасов, что и подбор с каркасом. После модели
+её папки отпускаются. Правила сопоставления — функции auto_assign_design_images.py и
+auto_assign_no_frame_images.py, поэтому пути совпадают с запуском двух скриптов по очереди.
+
+Если что-то падает до commit, не записывается ничего (ни одна из двух частей).
+
+Использование:
+  python -m scripts.auto_assign_images                 # подобрать и записать в БД
+  python -m scripts.auto_assign_images --dry-run       # только вывести найденные пути
+  python -m scripts.auto_assign_images --incremental   # только изменённые машины и папки
+  python -m scripts.auto_assign_images --live --no-cache
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / "app"
+for p in (ROOT, APP_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from scripts import auto_assign_design_images as base  # noqa: E402
+from scripts import auto_assign_no_frame_images as no_frame  # noqa: E402
+
+CoffeeMachine = base.CoffeeMachine
+SeafileClient = base.SeafileClient
+
+DESIGN = "design"
+NO_FRAME = "no_frame"
+
+
+class PassListing:
+    """
+    Содержимое папок на время прохода: каждая папка читается у клиента один раз,
+    release() отпускает поддерево модели, когда её машины обработаны.
+    """
+
+    def __init__(self, client: SeafileClient):
+        self._client = client
+        self._listings: Dict[str, List[Dict]] = {}
+        self.reads = 0
+
+    def list_directory(self, path: str = "/") -> List[Dict]:
+        key = "/" + path.strip("/")
+        items = self._listings.get(key)
+        if items is None:
+            items = self._client.list_directory(key)
+            self._listings[key] = items
+            self.reads += 1
+        return list(items)
+
+    def release(self, prefix: str) -> None:
+        prefix = "/" + prefix.strip("/")
+        for key in [k for k in self._listings if k == prefix or k.startswith(prefix + "/")]:
+            del self._listings[key]
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def model_dir_for(machine: CoffeeMachine, model_entries: List[Dict]) -> Optional[str]:
+    """Папка модели, как её выберут build_design_images / build_no_frame_image (None — не найдена)."""
+    target = machine.model or machine.name
+    return base.pick_entry(model_entries, base.MODEL_FOLDER_MAPPING.get(base.norm_key(target), target))
+
+
+def group_by_model(machines: List[CoffeeMachine], listing: PassListing) -> List[Tuple[Optional[str], List]]:
+    """Машины по папкам моделей в порядке первого появления; ненайденные модели — последней группой."""
+    try:
+        model_entries = listing.list_directory(base.BASE_DIR)
+    except Exception:
+        # build_* сами сообщат, что корень не открылся
+        return [(None, list(machines))]
+    groups: Dict[Optional[str], List[CoffeeMachine]] = {}
+    for m in machines:
+        groups.setdefault(model_dir_for(m, model_entries), []).append(m)
+    unmatched = groups.pop(None, None)
+    ordered = list(groups.items())
+    if unmatched:
+        ordered.append((None, unmatched))
+    return ordered
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Автоподбор картинок с каркасом и без каркаса за один проход")
+    parser.add_argument("--dry-run", action="store_true", help="Только вывод, без записи в БД")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Подробный вывод")
+    parser.add_argument("--machine-id", type=int, help="Обработать только конкретную машину по ID")
+    parser.add_argument("--no-cache", action="store_true", help="Не кешировать изображения на сервер")
+    parser.add_argument("--refresh-tree", action="store_true", help="Перечитать снимок дерева Seafile")
+    parser.add_argument("--live", action="store_true", help="Не использовать снимок дерева")
+    parser.add_argument("--no-memo", action="store_true", help="Подбирать пути для каждой машины заново")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Только новые/изменённые машины и машины с изменёнными папками"
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="PATH", help="Записать ответы Seafile в кассету")
+    cassette.add_argument("--replay", metavar="PATH", help="Брать ответы Seafile из кассеты, без сети")
+    args = parser.parse_args()
+    base.check_cassette_args(parser, args)
+
+    base.VERBOSE = args.verbose
+
+    settings = base.Settings()
+    client = base.open_client(
+        settings, refresh_tree=args.refresh_tree, live=args.live, record=args.record, replay=args.replay
+    )
+    listing = PassListing(client)
+    tracker = base.FolderTracker(listing)
+    db = base.SessionLocal()
+
+    query = db.query(CoffeeMachine)
+    if args.machine_id:
+        query = query.filter(CoffeeMachine.id == args.machine_id)
+    machines: List[CoffeeMachine] = query.all()
+    if args.machine_id and not machines:
+        print(f"❌ Машина с ID {args.machine_id} не найдена в базе данных")
+        return
+
+    started = time.perf_counter()
+    states = {DESIGN: base.AssignState(DESIGN), NO_FRAME: base.AssignState(NO_FRAME)}
+    kinds = {m.id: NO_FRAME if base.is_empty_value(m.frame) else DESIGN for m in machines}
+    selected = machines
+    if args.incremental:
+        affected = set()
+        for kind, state in states.items():
+            affected.update(m.id for m in state.affected([m for m in machines if kinds[m.id] == kind], listing))
+        selected = [m for m in machines if m.id in affected]
+
+    memo = None if args.no_memo else base.SignatureMemo(base.tree_version(client))
+    builders = {DESIGN: base.build_design_images, NO_FRAME: no_frame.build_no_frame_image}
+    results: List[Tuple[CoffeeMachine, str, object]] = []
+
+    groups = group_by_model(selected, listing)
+    print(f"🚶 Обход: {len(selected)} машин из {len(machines)}, папок моделей: {sum(1 for d, _ in groups if d)}")
+    for model_dir, group in groups:
+        for m in group:
+            kind = kinds[m.id]
+
+            def build():
+                return tracker.track(lambda: builders[kind](m, tracker))
+
+            result, folders = memo.resolve(kind, m, build) if memo is not None else build()
+            states[kind].record(m, folders, listing)
+            if kind == NO_FRAME:
+                # auto_assign_design_images тоже учитывает машины без каркаса (не читая папок) —
+                # запись нужна, чтобы его --incremental после этого прохода не считал их новыми
+                states[DESIGN].record(m, set(), listing)
+            if result:
+                results.append((m, kind, result))
+        if model_dir:
+            listing.release(f"{base.BASE_DIR}/{model_dir}")
+    walked = time.perf_counter() - started
+
+    design_count = sum(1 for _, kind, _ in results if kind == DESIGN)
+    no_frame_count = len(results) - design_count
+
+    if args.dry_run:
+        for m, kind, result in results:
+            if kind == DESIGN:
+                print(f"[DRY] id={m.id} model={m.model or m.name} frame={m.frame}")
+                for fc, inserts in result.items():
+                    for ic, cfg in inserts.items():
+                        print(f"   {fc}/{ic}:")
+                        print(f"      main_image_path: {cfg.get('main_image_path')}")
+                        print(f"      gallery_folder:  {cfg.get('gallery_folder')}")
+            else:
+                print(f"[DRY] id={m.id} model={m.model or m.name} -> {result[0][:80]}...")
+        print(f"\nDRY RUN: найдено {design_count} с каркасом и {no_frame_count} без каркаса (без записи в БД)")
+        db.close()
+    else:
+        committed_at = time.perf_counter()
+        try:
+            for m, kind, result in results:
+                if kind == DESIGN:
+                    base.merge_design_images(m, result)
+                else:
+                    no_frame.apply_no_frame_image(m, *result)
+                db.add(m)
+            db.commit()
+        except Exception:
+            db.rollback()
+            print("❌ Ошибка записи, транзакция отменена — в БД ничего не изменилось")
+            raise
+        commit_time = time.perf_counter() - committed_at
+        keep_ids = None if args.machine_id else {m.id for m in machines}
+        for state in states.values():
+            state.save(client, keep_ids=keep_ids)
+        print(f"\nГотово: обновлено {design_count} с каркасом и {no_frame_count} без каркаса одной транзакцией")
+
+        if not args.no_cache:
+            for m, _, _ in results:
+                try:
+                    print(f"[CACHE] Кеширование изображений для машины {m.id}...")
+                    base.media_cache.cache_machine_media(m, client)
+                except Exception as e:
+                    print(f"[CACHE] ⚠️  Не удалось кешировать для {m.id}: {e}")
+        db.close()
+
+    print("=" * 60)
+    print(f"Машин: {len(selected)} из {len(machines)}, прочитано папок: {listing.reads}, обход {walked:.2f} с")
+    if memo is not None:
+        print(f"  уникальных сигнатур: {memo.misses}, из кеша подбора: {memo.hits}")
+    if not args.dry_run:
+        print(f"  запись в БД: {commit_time:.2f} с")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # Игнорируем BrokenPipeError при использовании с pipe (например, | head)
+        sys.stderr.close()
+        sys.exit(0)
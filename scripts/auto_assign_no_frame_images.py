@@ -10,6 +10,12 @@
 Использование:
   python -m scripts.auto_assign_no_frame_images          # записывает в БД
   python -m scripts.auto_assign_no_frame_images --dry-run  # только выводит найденные пути
+  python -m scripts.auto_assign_no_frame_images --refresh-tree  # перечитать снимок дерева Seafile
+  python -m scripts.auto_assign_no_frame_images --live     # без снимка дерева
+  python -m scripts.auto_assign_no_frame_images --incremental  # только изменённые машины и папки
+  python -m scripts.auto_assign_no_frame_images --dry-run --replay run.json  # ответы Seafile из кассеты
+
+Подбор с каркасом и без каркаса за один обход дерева и одну транзакцию — scripts/auto_assign_images.py.
 """
 
 import argparse
@@ -262,6 +268,15 @@ def build_no_frame_image(machine: CoffeeMachine, client: SeafileClient) -> Optio
     return None
 
 
+def apply_no_frame_image(machine: CoffeeMachine, file_path: str, gallery_folder: str) -> None:
+    """Записывает найденный путь в машину (без commit)."""
+    machine.main_image_path = file_path
+    machine.main_image = file_path
+    machine.gallery_folder = gallery_folder
+    # На всякий случай помечаем design_images как изменённые (могут быть пустыми)
+    flag_modified(machine, "design_images")
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Автоподбор main_image_path для машин без каркаса из Seafile")
     parser.add_argument("--dry-run", action="store_true", help="Только вывод, без записи в БД")
@@ -269,12 +284,24 @@ def main() -> None:
     parser.add_argument("--machine-id", type=int, help="Обработать только конкретную машину по ID")
     parser.add_argument("--no-cache", action="store_true", help="Не кешировать изображения на сервер")
     parser.add_argument("--no-gallery-cache", action="store_true", help="Не кешировать и не создавать папку gallery")
+    parser.add_argument("--refresh-tree", action="store_true", help="Перечитать снимок дерева Seafile")
+    parser.add_argument("--live", action="store_true", help="Не использовать снимок дерева")
+    parser.add_argument("--no-memo", action="store_true", help="Подбирать путь для каждой машины заново")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Только новые/изменённые машины и машины с изменёнными папками"
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="PATH", help="Записать ответы Seafile в кассету")
+    cassette.add_argument("--replay", metavar="PATH", help="Брать ответы Seafile из кассеты, без сети")
     args = parser.parse_args()
+    base.check_cassette_args(parser, args)
 
     base.VERBOSE = args.verbose
 
     settings = Settings()
-    client = SeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
+    client = base.open_client(
+        settings, refresh_tree=args.refresh_tree, live=args.live, record=args.record, replay=args.replay
+    )
     db = SessionLocal()
 
     # Забираем из БД и фильтруем по "нет" уже в Python (учитываем все варианты написания)
@@ -290,12 +317,24 @@ def main() -> None:
 
     print(f"Найдено {len(machines)} машин без каркаса для обработки")
 
+    state = base.AssignState("no_frame")
+    if args.incremental:
+        machines = state.affected(machines, client)
+
+    # Машины с одинаковой сигнатурой (модель, холодильник, терминал) получают один и тот же путь
+    memo = None if args.no_memo else base.SignatureMemo(base.tree_version(client))
+    tracker = base.FolderTracker(client)
+
     updated = 0
     for m in machines:
         if base.VERBOSE:
             print(f"\n[{m.id}] Обрабатываем: model={m.model or m.name}")
-        
-        result = build_no_frame_image(m, client)
+
+        def build():
+            return tracker.track(lambda: build_no_frame_image(m, tracker))
+
+        result, folders = memo.resolve("no_frame", m, build) if memo is not None else build()
+        state.record(m, folders, client)
         if not result:
             continue
         file_path, gallery_folder = result
@@ -305,11 +344,7 @@ def main() -> None:
             updated += 1
             continue
 
-        m.main_image_path = file_path
-        m.main_image = file_path
-        m.gallery_folder = gallery_folder
-        # На всякий случай помечаем design_images как изменённые (могут быть пустыми)
-        flag_modified(m, "design_images")
+        apply_no_frame_image(m, file_path, gallery_folder)
         db.add(m)
         updated += 1
 
@@ -330,9 +365,12 @@ def main() -> None:
 
     if not args.dry_run:
         db.commit()
+        state.save(client, keep_ids=None if args.machine_id else {m.id for m in candidates})
         print(f"\nГотово: обновлено {updated} записей")
     else:
         print(f"\nDRY RUN: найдено {updated} записей (без записи в БД)")
+    if memo is not None:
+        print(f"Уникальных сигнатур: {memo.misses}, из кеша подбора: {memo.hits}")
 
     db.close()
 
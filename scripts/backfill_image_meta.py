@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Дописывает размеры и LQIP-заглушки (см. app/services/image_meta.py) в манифест
+для файлов, закешированных до появления этих полей.
+
+Использование:
+    python scripts/backfill_image_meta.py
+    python scripts/backfill_image_meta.py --all   # пересчитать и для записей, где сведения уже есть
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services import image_meta, media_manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Размеры и заглушки для закешированных картинок")
+    parser.add_argument("--all", action="store_true", help="Пересчитать для всех записей")
+    args = parser.parse_args()
+
+    missing = image_meta.missing_dependencies()
+    if "Pillow" in missing:
+        print("⚠️  Pillow не установлен: запишутся только размеры, заглушек не будет (pip install -r requirements.txt)")
+    elif "cairosvg" in missing:
+        print("⚠️  cairosvg не установлен: векторные SVG без встроенной картинки останутся без заглушки")
+
+    assets = [a for a in media_manifest.all_assets() if a.local_url and (args.all or a.width is None)]
+    print(f"🔍 Записей для обработки: {len(assets)}")
+
+    updated = missing = 0
+    for i, asset in enumerate(assets, 1):
+        path = Path("app") / asset.local_url.lstrip("/")
+        if not path.exists():
+            missing += 1
+            print(f"[{i}/{len(assets)}] ⚠️  Нет файла: {path}")
+            continue
+        meta = image_meta.inspect_image(path)
+        media_manifest.set_variants(asset.local_url, asset.variants or {}, meta=meta)
+        updated += 1
+        placeholder = f"{len(meta['placeholder'])} B" if meta["placeholder"] else "нет"
+        print(f"[{i}/{len(assets)}] {asset.local_url}: {meta['width']}x{meta['height']}, заглушка {placeholder}")
+
+    print("=" * 60)
+    print(f"✅ Обновлено: {updated}")
+    if missing:
+        print(f"   Файлов нет на диске: {missing}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Замер сопоставления имён папок (norm_key, pick_entry, fuzzy_match, parse_signature_folder)
+на синтетическом дереве из scripts/fake_services.generate_tree — без Seafile и без БД.
+
+Прогоняет build_design_images / build_no_frame_image для машин всех моделей дерева дважды:
+  - холодные кеши: перед каждой машиной сбрасываются кеши нормализации и индексы папок,
+    то есть каждая машина заново разбирает все имена (как до FolderIndex);
+  - тёплые кеши: имена нормализуются один раз за прогон, поиск — по таблицам.
+Результаты обоих прогонов сверяются.
+
+Использование:
+    python scripts/bench_name_matching.py                   # дерево ~10 000 папок
+    python scripts/bench_name_matching.py --folders 50000 --rounds 5
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / "app"
+for p in (ROOT, APP_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from app.models import CoffeeMachine  # noqa: E402
+from app.services.seafile_tree import SnapshotClient, TreeSnapshot  # noqa: E402
+from scripts import auto_assign_design_images as base  # noqa: E402
+from scripts import auto_assign_no_frame_images as no_frame  # noqa: E402
+from scripts.fake_services import BASE_DIR, FakeConfig, generate_tree  # noqa: E402
+
+
+def build_client(folders: int) -> SnapshotClient:
+    """Снимок дерева не меньше folders папок (число синтетических моделей подбирается)."""
+    per_model = len(generate_tree(FakeConfig(models=1))) - len(generate_tree(FakeConfig()))
+    models = max(0, -(-(folders - len(generate_tree(FakeConfig()))) // per_model))
+    tree = generate_tree(FakeConfig(models=models, files_per_folder=1))
+    items = [
+        {**entry, "parent_dir": parent}
+        for parent, entries in tree.items()
+        if parent.startswith(BASE_DIR)
+        for entry in entries
+    ]
+    print(f"🌳 Синтетическое дерево: {len(tree)} папок, {len(items)} элементов, моделей: {models + 4}")
+    return SnapshotClient(None, TreeSnapshot(BASE_DIR, "bench", items))
+
+
+def build_machines(client: SnapshotClient) -> List[CoffeeMachine]:
+    machines: List[CoffeeMachine] = []
+    for entry in client.list_directory(BASE_DIR):
+        for frame in ("Coffee Zone Business", "Coffee Zone Mini", "нет"):
+            for fridge, terminal in ((None, None), ("MC6D-B", "Vendista v2.5")):
+                machines.append(
+                    CoffeeMachine(
+                        id=len(machines) + 1,
+                        name=entry["name"],
+                        model=entry["name"],
+                        frame=frame,
+                        frame_color="Белый" if frame != "нет" else None,
+                        refrigerator=fridge,
+                        terminal=terminal,
+                    )
+                )
+    return machines
+
+
+def run_pass(machines: List[CoffeeMachine], client: SnapshotClient, cold: bool):
+    base.clear_match_caches()
+    results = []
+    started = time.perf_counter()
+    # Вывод подбора не нужен и только исказил бы замер
+    with contextlib.redirect_stdout(io.StringIO()):
+        for m in machines:
+            if cold:
+                base.clear_match_caches()
+            if base.is_empty_value(m.frame):
+                results.append(no_frame.build_no_frame_image(m, client))
+            else:
+                results.append(base.build_design_images(m, client))
+    return time.perf_counter() - started, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замер сопоставления имён папок на синтетическом дереве")
+    parser.add_argument("--folders", type=int, default=10000, help="Сколько папок в дереве (не меньше)")
+    parser.add_argument("--rounds", type=int, default=3, help="Сколько раз повторить каждый прогон")
+    args = parser.parse_args()
+
+    client = build_client(args.folders)
+    machines = build_machines(client)
+    print(f"🧪 Машин: {len(machines)}, повторов: {args.rounds}")
+
+    cold_times, warm_times = [], []
+    cold_results = warm_results = None
+    for _ in range(max(1, args.rounds)):
+        elapsed, cold_results = run_pass(machines, client, cold=True)
+        cold_times.append(elapsed)
+        elapsed, warm_results = run_pass(machines, client, cold=False)
+        warm_times.append(elapsed)
+
+    cold, warm = min(cold_times), min(warm_times)
+    found = sum(1 for r in warm_results if r)
+    print("=" * 60)
+    print(f"Холодные кеши: {cold * 1000:.1f} мс ({cold / len(machines) * 1e6:.0f} мкс на машину)")
+    print(f"Тёплые кеши:   {warm * 1000:.1f} мс ({warm / len(machines) * 1e6:.0f} мкс на машину)")
+    print(f"Ускорение: x{cold / warm:.1f}, найдено путей: {found}/{len(machines)}")
+    if cold_results != warm_results:
+        print("❌ Результаты прогонов различаются")
+        sys.exit(1)
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
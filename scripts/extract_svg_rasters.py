@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Выносит встроенные base64-картинки из закешированных SVG в отдельные файлы (офлайн-экспорт).
+
+В папку --out пишутся копии SVG (с той же структурой, что в кеше) со ссылками на картинки
+в <out>/shared, одинаковые картинки сохраняются один раз. Кеш и манифест не меняются, сайт
+экспорт не использует — он нужен, чтобы оценить экономию (см. app/services/svg_rasters.py).
+
+Использование:
+    python scripts/extract_svg_rasters.py
+    python scripts/extract_svg_rasters.py --out /tmp/svg_export
+"""
+import argparse
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.media_cache import CACHE_ROOT, _is_cache_entry
+from app.services.svg_rasters import SHARED_DIR, extract_rasters
+
+DEFAULT_OUT = ROOT / "svg_rasters_export"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-экспорт SVG с вынесенными картинками")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help=f"Папка экспорта (по умолчанию {DEFAULT_OUT})")
+    args = parser.parse_args()
+
+    cache_dir = Path(CACHE_ROOT)
+
+    if not cache_dir.exists():
+        print(f"❌ Кэш директория не найдена: {cache_dir}")
+        return
+
+    svg_files = [p for p in cache_dir.rglob("*.svg") if _is_cache_entry(p)]
+    if not svg_files:
+        print("ℹ️  SVG файлы не найдены в кэше")
+        return
+
+    shared_root = args.out / SHARED_DIR
+    print(f"🔍 Найдено {len(svg_files)} SVG файлов")
+    print(f"📁 Путь: {cache_dir} → {args.out}\n")
+
+    total_original = 0
+    total_linked = 0
+    processed = 0
+    new_rasters = 0
+
+    for i, svg_path in enumerate(svg_files, 1):
+        relative = svg_path.relative_to(cache_dir)
+        print(f"[{i}/{len(svg_files)}] {relative}")
+        target = args.out / relative
+        try:
+            created = extract_rasters(svg_path, target, shared_root)
+        except Exception as e:
+            print(f"  ⚠️  Ошибка: {e}")
+            continue
+        if created is None:
+            print("  ℹ️  Встроенных картинок нет")
+            continue
+
+        original_size = svg_path.stat().st_size
+        linked_size = target.stat().st_size
+        total_original += original_size
+        total_linked += linked_size
+        processed += 1
+        new_rasters += len(created)
+        print(f"  ✓ {original_size:,} → {linked_size:,} bytes, новых картинок: {len(created)}")
+
+    shared_size = sum(p.stat().st_size for p in shared_root.glob("img.*")) if shared_root.exists() else 0
+
+    print("=" * 60)
+    print(f"✅ Обработано: {processed} из {len(svg_files)} файлов")
+    print(f"   Новых картинок в {shared_root}: {new_rasters}")
+    print(f"   SVG до: {total_original:,} bytes ({total_original / 1024 / 1024:.1f} MB)")
+    print(f"   SVG после: {total_linked:,} bytes ({total_linked / 1024 / 1024:.1f} MB)")
+    print(f"   Вынесенные картинки: {shared_size:,} bytes ({shared_size / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Локальные заглушки Seafile, Ozon и Telegram для замеров и проверок без живых сервисов.
+
+Один HTTP-сервер отвечает на те же запросы, что делает приложение:
+  Seafile  GET  /api2/repos/<repo>/                  head_commit_id библиотеки
+           GET  /api2/repos/<repo>/dir/?p=&recursive=  содержимое папки (или всё дерево)
+           GET  /api2/repos/<repo>/file/?p=&reuse=1    ссылка на скачивание (протухает через --link-ttl)
+           GET  /seafhttp/files/<token>/<name>         сам файл (SVG или PNG)
+  Ozon     POST /v3/product/info/list                  цена по SKU
+  Telegram POST /bot<token>/sendMessage                сообщение складывается в память
+  Служебные: GET /_fake/stats (счётчики запросов), GET /_fake/telegram (полученные сообщения),
+             POST /_fake/touch?p=<путь> (меняет файл и head, как новая загрузка в Seafile).
+
+Дерево генерируется в формате /Конфигуратор/Графика/<model>/<frame>/<color>/<insert>/<signature>/<файлы>
+(плюс <model>/<frame>/Без_каркаса/<signature>). Задержка, доля ошибок 5xx и срок жизни ссылок настраиваются.
+
+Использование:
+    python scripts/fake_services.py                                  # порт 8800
+    python scripts/fake_services.py --latency-ms 80 --jitter-ms 40 --error-rate 0.05
+    python scripts/fake_services.py --models 40 --files 3 --link-ttl 30 --no-recursive
+
+Затем приложение или скрипты запускаются с
+    SEAFILE_SERVER=http://127.0.0.1:8800 OZON_API_URL=http://127.0.0.1:8800 TELEGRAM_API_URL=http://127.0.0.1:8800
+
+Из кода (замеры, проверки):
+    services = FakeServices(FakeConfig(latency_ms=50)).start()
+    client = SeafileClient(services.url, FAKE_REPO_ID, "token")
+    ...
+    services.stop()
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BASE_DIR = "/Конфигуратор/Графика"
+FAKE_REPO_ID = "fake-repo"
+
+MODELS = ("JL36A-BT-MW", "JL36A-ST-MW", "JL15_VIVA-BT-MW", "JL15_VIVA-ST-MW-PRO")
+FRAMES = ("Business", "Mini")
+NO_FRAME_FOLDER = "Без_каркаса"
+FRAME_COLORS = ("Белый", "Черный")
+INSERT_COLORS = ("Желтый", "Зеленый", "Красный", "Серый", "Синий", "Фиолетовый")
+FRIDGE = "MC6D-B"
+TERMINAL = "vendista"
+
+
+class FakeConfig(NamedTuple):
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Доля запросов, на которые отвечаем 503 (Seafile, Ozon и Telegram одинаково)
+    error_rate: float = 0.0
+    # Сколько секунд живёт ссылка на скачивание; просроченная отдаёт 403 или страницу логина
+    link_ttl: float = 300.0
+    expired_html: bool = False
+    # Поддерживает ли "сервер" recursive=1 (старые Seafile — нет)
+    recursive: bool = True
+    models: int = 0
+    files_per_folder: int = 2
+    file_size: int = 20 * 1024
+    seed: int = 1
+
+
+def signature_folders(model: str) -> List[str]:
+    return [
+        f"1_{model}",
+        f"2_{model}+{TERMINAL}",
+        f"3_{model}+{FRIDGE}",
+        f"4_{model}+{FRIDGE}+{TERMINAL}",
+    ]
+
+
+def generate_tree(config: FakeConfig) -> Dict[str, List[Dict]]:
+    """
+    Дерево папок: путь папки -> её содержимое в формате Seafile (type, name, id, mtime, size).
+    models > 0 добавляет к реальным именам моделей синтетические JLX<n>-BT-MW.
+    """
+    rng = random.Random(config.seed)
+    now = int(time.time())
+    tree: Dict[str, List[Dict]] = {}
+
+    def add(parent: str, name: str, kind: str) -> str:
+        path = f"{parent.rstrip('/')}/{name}"
+        entry = {
+            "type": kind,
+            "name": name,
+            "id": hashlib.sha1(path.encode("utf-8")).hexdigest(),
+            "mtime": now - rng.randint(0, 90 * 86400),
+        }
+        if kind == "file":
+            entry["size"] = config.file_size
+        tree.setdefault(parent, []).append(entry)
+        if kind == "dir":
+            tree.setdefault(path, [])
+        return path
+
+    def add_files(folder: str, stem: str) -> None:
+        add(folder, f"{stem}.svg", "file")
+        for i in range(1, config.files_per_folder):
+            add(folder, f"photo_{i}.png", "file")
+
+    parent = "/"
+    for part in BASE_DIR.strip("/").split("/"):
+        parent = add(parent, part, "dir")
+
+    models = list(MODELS) + [f"JLX{i}-BT-MW" for i in range(1, config.models + 1)]
+    for model in models:
+        model_path = add(BASE_DIR, model, "dir")
+        for frame in FRAMES:
+            frame_path = add(model_path, frame, "dir")
+            for frame_color in FRAME_COLORS:
+                color_path = add(frame_path, frame_color, "dir")
+                for insert_color in INSERT_COLORS:
+                    insert_path = add(color_path, insert_color, "dir")
+                    for signature in signature_folders(model):
+                        add_files(add(insert_path, signature, "dir"), f"{model}_{frame_color}_{insert_color}")
+            no_frame_path = add(frame_path, NO_FRAME_FOLDER, "dir")
+            for signature in signature_folders(model):
+                add_files(add(no_frame_path, signature, "dir"), f"{model}_{NO_FRAME_FOLDER}")
+    return tree
+
+
+def _png(width: int, height: int, seed: int) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    color = bytes(((seed * 67) % 256, (seed * 131) % 256, (seed * 29) % 256))
+    raw = b"".join(b"\x00" + color * width for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def _svg(name: str, size: int) -> bytes:
+    head = f'<svg xmlns="http://www.w3.org/2000/svg" width="800" height="600"><title>{name}</title>'
+    # Комментарий добивает файл до нужного размера, чтобы скачивание было похоже на настоящее
+    padding = max(0, size - len(head.encode("utf-8")) - 60)
+    return (head + f'<rect width="800" height="600" fill="#ccc"/><!--{"x" * padding}--></svg>').encode("utf-8")
+
+
+def file_body(path: str, config: FakeConfig) -> Tuple[bytes, str]:
+    seed = int(hashlib.sha1(path.encode("utf-8")).hexdigest()[:6], 16)
+    if path.endswith(".png"):
+        return _png(64, 48, seed), "image/png"
+    return _svg(Path(path).name, config.file_size), "image/svg+xml"
+
+
+class FakeServices:
+    """Сервер-заглушка в фоновом потоке; config можно менять на лету (services.config = ...)."""
+
+    def __init__(self, config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeConfig()
+        self.tree = generate_tree(self.config)
+        self.head = hashlib.sha1(f"head-{self.config.seed}".encode()).hexdigest()
+        self.links: Dict[str, Tuple[str, float]] = {}
+        self.messages: List[Dict] = []
+        self.counters: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(self.config.seed)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeServices":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- состояние ---
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            dirs = len(self.tree)
+            files = sum(1 for items in self.tree.values() for it in items if it["type"] == "file")
+            return {"head": self.head, "dirs": dirs, "files": files, "requests": dict(self.counters)}
+
+    def listing(self, path: str, recursive: bool) -> Optional[List[Dict]]:
+        path = "/" + path.strip("/")
+        if path not in self.tree:
+            return None
+        if not recursive:
+            return [dict(it) for it in self.tree[path]]
+        result, pending = [], [path]
+        while pending:
+            folder = pending.pop()
+            for it in self.tree.get(folder, ()):
+                result.append({**it, "parent_dir": folder})
+                if it["type"] == "dir":
+                    pending.append(f"{folder.rstrip('/')}/{it['name']}")
+        return result
+
+    def find_file(self, path: str) -> Optional[Dict]:
+        parent, _, name = ("/" + path.strip("/")).rpartition("/")
+        return next((it for it in self.tree.get(parent or "/", ()) if it["name"] == name and it["type"] == "file"), None)
+
+    def issue_link(self, path: str) -> str:
+        token = hashlib.sha1(f"{path}-{time.time()}-{self.rng.random()}".encode()).hexdigest()[:20]
+        with self.lock:
+            self.links[token] = (path, time.time() + self.config.link_ttl)
+        return f"{self.url}/seafhttp/files/{token}/{quote(Path(path).name)}"
+
+    def touch(self, path: str) -> bool:
+        """Имитирует новую версию файла: меняются id, mtime и head библиотеки."""
+        entry = self.find_file(path)
+        if entry is None:
+            return False
+        with self.lock:
+            entry["id"] = hashlib.sha1(f"{entry['id']}-{time.time()}".encode()).hexdigest()
+            entry["mtime"] = int(time.time())
+            self.head = hashlib.sha1(f"{self.head}-{path}".encode()).hexdigest()
+        return True
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят разными write: без TCP_NODELAY keep-alive клиенты ждут ~40 мс delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _json(self, data, status: int = 200) -> None:
+                self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+            def _body(self) -> Dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    return json.loads(raw or b"{}")
+                except ValueError:
+                    return {}
+
+            def _simulate(self, name: str) -> bool:
+                """Счётчик, задержка и случайная ошибка; False — ответ уже отправлен (503)."""
+                services.count(name)
+                config = services.config
+                delay = config.latency_ms + (services.rng.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+                if delay:
+                    time.sleep(delay / 1000)
+                if config.error_rate and services.rng.random() < config.error_rate:
+                    services.count("errors")
+                    self._json({"error_msg": "Service temporarily unavailable"}, 503)
+                    return False
+                return True
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                parts = [unquote(p) for p in url.path.strip("/").split("/")]
+
+                if url.path == "/_fake/stats":
+                    return self._json(services.stats())
+                if url.path == "/_fake/telegram":
+                    return self._json(services.messages)
+
+                if len(parts) >= 3 and parts[0] == "api2" and parts[1] == "repos":
+                    return self._seafile_api(parts[3:] if len(parts) > 3 else [], query)
+                if len(parts) >= 3 and parts[0] == "seafhttp" and parts[1] == "files":
+                    return self._seafile_file(parts[2])
+                self._json({"error": "not found"}, 404)
+
+            def _seafile_api(self, rest: List[str], query: Dict[str, str]) -> None:
+                if not self.headers.get("Authorization", "").startswith("Token "):
+                    return self._json({"detail": "Invalid token"}, 401)
+                if not rest:
+                    if self._simulate("seafile.repo_info"):
+                        self._json({"id": FAKE_REPO_ID, "name": "fake", "head_commit_id": services.head})
+                    return
+                if rest[0] == "dir":
+                    recursive = query.get("recursive") == "1" and services.config.recursive
+                    if not self._simulate("seafile.list_recursive" if recursive else "seafile.list_directory"):
+                        return
+                    items = services.listing(query.get("p", "/"), recursive)
+                    if items is None:
+                        return self._json({"error_msg": "Folder not found."}, 404)
+                    return self._json(items)
+                if rest[0] == "file":
+                    if not self._simulate("seafile.download_link"):
+                        return
+                    path = query.get("p", "")
+                    if services.find_file(path) is None:
+                        return self._json({"error_msg": "File not found."}, 404)
+                    return self._send(200, json.dumps(services.issue_link(path)).encode("utf-8"))
+                self._json({"error": "not found"}, 404)
+
+            def _seafile_file(self, token: str) -> None:
+                if not self._simulate("seafhttp.download"):
+                    return
+                with services.lock:
+                    path, expires_at = services.links.get(token, (None, 0.0))
+                if path is None or expires_at < time.time():
+                    if services.config.expired_html:
+                        # Так ведёт себя Seafile за прокси: страница логина с кодом 200
+                        return self._send(200, b"<!DOCTYPE html><html><body>Log in</body></html>", "text/html")
+                    return self._send(403, b"Link expired", "text/plain")
+                body, content_type = file_body(path, services.config)
+                self._send(200, body, content_type)
+
+            def do_POST(self) -> None:
+                url = urlparse(self.path)
+                if url.path == "/_fake/touch":
+                    path = parse_qs(url.query).get("p", [""])[0]
+                    return self._json({"touched": services.touch(path), "head": services.head})
+                if url.path == "/v3/product/info/list":
+                    return self._ozon(self._body())
+                if url.path.startswith("/bot") and url.path.endswith("/sendMessage"):
+                    return self._telegram(self._body())
+                self._json({"error": "not found"}, 404)
+
+            def _ozon(self, payload: Dict) -> None:
+                if not self._simulate("ozon.product_info"):
+                    return
+                if not self.headers.get("Client-Id") or not self.headers.get("Api-Key"):
+                    return self._json({"code": 7, "message": "Invalid Api-Key"}, 403)
+                items = [
+                    {
+                        "id": int(sku),
+                        "offer_id": f"FAKE-{sku}",
+                        "name": f"Товар {sku}",
+                        "price": f"{100000 + int(sku) % 50000}.00",
+                        "currency_code": "RUB",
+                    }
+                    for sku in payload.get("sku") or []
+                    if str(sku).isdigit()
+                ]
+                self._json({"items": items})
+
+            def _telegram(self, payload: Dict) -> None:
+                if not self._simulate("telegram.send_message"):
+                    return
+                with services.lock:
+                    services.messages.append(payload)
+                    message_id = len(services.messages)
+                self._json({"ok": True, "result": {"message_id": message_id, "chat": {"id": payload.get("chat_id")}}})
+
+            do_HEAD = do_GET
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заглушки Seafile, Ozon и Telegram")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка каждого ответа")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Случайная добавка к задержке")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503 (0..1)")
+    parser.add_argument("--link-ttl", type=float, default=300.0, help="Срок жизни ссылки на скачивание, с")
+    parser.add_argument("--expired-html", action="store_true", help="Просроченная ссылка отдаёт HTML с кодом 200")
+    parser.add_argument("--no-recursive", action="store_true", help="Не поддерживать recursive=1")
+    parser.add_argument("--models", type=int, default=0, help="Сколько синтетических моделей добавить")
+    parser.add_argument("--files", type=int, default=2, help="Файлов в папке сигнатуры")
+    parser.add_argument("--file-size", type=int, default=20 * 1024, help="Размер SVG, байт")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        link_ttl=args.link_ttl,
+        expired_html=args.expired_html,
+        recursive=not args.no_recursive,
+        models=args.models,
+        files_per_folder=max(1, args.files),
+        file_size=args.file_size,
+        seed=args.seed,
+    )
+    services = FakeServices(config, args.host, args.port)
+    stats = services.stats()
+    print(f"🧪 Заглушки сервисов: {services.url}")
+    print(f"   Дерево {BASE_DIR}: {stats['dirs']} папок, {stats['files']} файлов")
+    print(f"   Задержка {config.latency_ms:.0f}±{config.jitter_ms:.0f} мс, ошибки {config.error_rate:.0%}, ссылки {config.link_ttl:.0f} с")
+    print("=" * 60)
+    print(f"SEAFILE_SERVER={services.url} SEAFILE_REPO_ID={FAKE_REPO_ID} SEAFILE_TOKEN=fake")
+    print(f"OZON_API_URL={services.url} OZON_CLIENT_ID=fake OZON_API_KEY=fake")
+    print(f"TELEGRAM_API_URL={services.url} TELEGRAM_BOT_TOKEN=fake TELEGRAM_CHAT_ID=1")
+    try:
+        services.server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹  Остановлено")
+    finally:
+        services.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
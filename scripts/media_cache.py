@@ -2,10 +2,11 @@ import shutil
 from pathlib import Path
 from typing import Iterable, List, Optional, Tuple
 from urllib.parse import urlparse
-import subprocess
 
 import requests
 
+from app.services import svg_optimizer
+
 # Все файлы кеша складываются в /app/static/cache/machines/{id}/...
 CACHE_ROOT = Path("app/static/cache/machines")
 STATIC_PREFIX = "/static/cache/machines"
@@ -93,52 +94,24 @@ def clear_machine_cache(machine_id: int) -> None:
 
 
 def _optimize_svg(path: Path) -> None:
-    """Оптимизирует SVG файл с помощью scour для уменьшения размера."""
+    """
+    Оптимизирует SVG файл в памяти (app.services.svg_optimizer) для уменьшения размера.
+    scour, если установлен, вызывается через Python API; его наличие проверяется один раз.
+    """
     try:
-        # Проверяем что установлен scour
-        result = subprocess.run(
-            ["scour", "--version"],
-            capture_output=True,
-            timeout=5
-        )
-        if result.returncode != 0:
-            print(f"⚠️  scour not installed, skipping SVG optimization")
-            return
-
-        # Оптимизируем SVG
-        temp_path = path.with_suffix('.svg.tmp')
-        result = subprocess.run(
-            [
-                "scour",
-                "--enable-id-stripping",
-                "--enable-comment-stripping",
-                "--shorten-ids",
-                "--indent=none",
-                "-i", str(path),
-                "-o", str(temp_path)
-            ],
-            capture_output=True,
-            timeout=30
-        )
-
-        if result.returncode == 0 and temp_path.exists():
-            # Проверяем что оптимизированный файл меньше
-            original_size = path.stat().st_size
-            optimized_size = temp_path.stat().st_size
-
-            if optimized_size < original_size:
-                temp_path.replace(path)
-                reduction = (1 - optimized_size / original_size) * 100
-                print(f"  ✓ SVG optimized: {original_size:,} → {optimized_size:,} bytes ({reduction:.1f}% reduction)")
-            else:
-                temp_path.unlink()
-                print(f"  ℹ️  Optimization didn't reduce size, keeping original")
+        original = path.read_bytes()
+        optimized = svg_optimizer.optimize_svg(original, use_scour=svg_optimizer.scour_available())
+
+        original_size = len(original)
+        optimized_size = len(optimized)
+        if optimized_size < original_size:
+            temp_path = path.with_suffix(".svg.tmp")
+            temp_path.write_bytes(optimized)
+            temp_path.replace(path)
+            reduction = (1 - optimized_size / original_size) * 100
+            print(f"  ✓ SVG optimized: {original_size:,} → {optimized_size:,} bytes ({reduction:.1f}% reduction)")
         else:
-            if temp_path.exists():
-                temp_path.unlink()
-            print(f"  ⚠️  SVG optimization failed: {result.stderr.decode()[:100]}")
-    except FileNotFoundError:
-        print(f"  ⚠️  scour not found, skipping SVG optimization")
+            print(f"  ℹ️  Optimization didn't reduce size, keeping original")
     except Exception as e:
         print(f"  ⚠️  SVG optimization error: {e}")
 
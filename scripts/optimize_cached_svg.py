@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 """
 Оптимизирует уже существующие SVG файлы в кэше.
-Использует ту же функцию _optimize_svg из media_cache.
+Использует ту же оптимизацию, что и _optimize_svg из media_cache.
+Уменьшенный файл сохраняется под новым именем с отпечатком содержимого (main.<hash>.svg —
+имя неизменяемого файла, перезаписывать его нельзя), манифест получает новые url, размер
+и sha256, а .gz/.br и прочие производные файлы пересоздаются конвейером media_cache.
+Список файлов берётся из манифеста кеша (media_assets); если он пуст — обходом каталога.
 
 Использование:
     python scripts/optimize_cached_svg.py
@@ -12,7 +16,21 @@ import sys
 # Добавляем корневую директорию в PYTHONPATH
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from scripts.media_cache import CACHE_ROOT, _optimize_svg
+import hashlib
+
+from scripts.media_cache import CACHE_ROOT
+from app.services import media_cache, media_manifest, svg_optimizer
+
+
+def _manifest_svg_files():
+    """SVG из манифеста: url /static/... -> путь app/static/..."""
+    files = []
+    for asset in media_manifest.all_assets():
+        if asset.local_url and asset.local_url.endswith(".svg"):
+            path = Path("app") / asset.local_url.lstrip("/")
+            if path.exists():
+                files.append((asset, path))
+    return files
 
 
 def main():
@@ -23,7 +41,9 @@ def main():
         return
 
     # Находим все SVG файлы
-    svg_files = list(cache_dir.rglob("*.svg"))
+    manifest_files = _manifest_svg_files()
+    svg_files = [path for _, path in manifest_files] or list(cache_dir.rglob("*.svg"))
+    assets = {path: asset for asset, path in manifest_files}
 
     if not svg_files:
         print("ℹ️  SVG файлы не найдены в кэше")
@@ -44,7 +64,34 @@ def main():
         print(f"[{i}/{len(svg_files)}] {svg_path.relative_to(cache_dir)}")
         print(f"  Original: {original_size:,} bytes")
 
-        _optimize_svg(svg_path)
+        original = svg_path.read_bytes()
+        optimized = svg_optimizer.optimize_svg(original, use_scour=svg_optimizer.scour_available())
+        if len(optimized) < original_size:
+            sha256 = hashlib.sha256(optimized).hexdigest()
+            new_path = media_cache.content_name(svg_path, sha256)
+            tmp = new_path.with_name(new_path.name + ".tmp")
+            tmp.write_bytes(optimized)
+            tmp.replace(new_path)
+            if new_path != svg_path:
+                svg_path.unlink(missing_ok=True)
+            for sidecar in media_cache.SIDECAR_SUFFIXES.values():
+                Path(f"{svg_path}{sidecar}").unlink(missing_ok=True)
+            asset = assets.get(svg_path)
+            if asset is not None:
+                media_manifest.set_variants(
+                    asset.local_url,
+                    {},
+                    new_local_url=media_cache._path_to_url(new_path),
+                    size=len(optimized),
+                    sha256=sha256,
+                )
+            # .gz/.br и размеры — заново для нового файла (слушатель запишет их в манифест)
+            svg_path = media_cache.PIPELINE.process(new_path)
+            reduction = (1 - len(optimized) / original_size) * 100
+            print(f"  ✓ SVG optimized: {original_size:,} → {len(optimized):,} bytes ({reduction:.1f}% reduction)")
+            print(f"  → {svg_path.name}")
+        else:
+            print("  ℹ️  Optimization didn't reduce size, keeping original")
 
         new_size = svg_path.stat().st_size
         total_optimized += new_size
@@ -56,6 +103,9 @@ def main():
 
         print()
 
+    # Дожидаемся фоновых стадий конвейера, чтобы производные файлы успели записаться
+    media_cache.PIPELINE.shutdown(wait=True)
+
     # Итоги
     print("=" * 60)
     print(f"✅ Обработано: {len(svg_files)} файлов")
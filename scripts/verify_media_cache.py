@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Проверка целостности кеша картинок (см. app/services/media_integrity.py).
+
+Параллельно проверяет все файлы из манифеста (media_assets) и файлы на диске, которых
+в манифесте нет: HTML вместо картинки, формат и возможность разобрать файл, а также
+sha256 содержимого. Имя файла в кеше содержит отпечаток (main.<sha256[:12]>.svg): если
+содержимое ему не соответствует, файл битый, даже если разбирается. Для старых имён без
+отпечатка сверяется sha256 из манифеста; при расхождении в манифест записываются
+настоящие размер и sha256 (такие файлы могли быть оптимизированы на месте).
+Битые файлы переносятся в app/cache_quarantine, их записи снимаются с кеша, поэтому
+следующий прогрев (scripts/warm_media_cache.py) или запрос через /api/media скачает их заново.
+
+Использование:
+    python scripts/verify_media_cache.py
+    python scripts/verify_media_cache.py --dry-run     # только отчёт, ничего не трогать
+    python scripts/verify_media_cache.py --repair      # сразу перекачать битые файлы
+    python scripts/verify_media_cache.py --workers 8
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services import media_cache, media_integrity, media_manifest
+
+
+def _check(job: Tuple[str, Optional[str]]) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+    """(проблема, sha256 и размер файла — если он цел, но sha256 в манифесте устарел)."""
+    path, expected_sha256 = job
+    problem = media_integrity.check_file(Path(path))
+    if problem:
+        return problem, None, None
+    data = Path(path).read_bytes()
+    actual = hashlib.sha256(data).hexdigest()
+    fingerprint = media_cache.name_fingerprint(Path(path))
+    if fingerprint is not None:
+        if not actual.startswith(fingerprint):
+            return f"content sha256 {actual[:12]} does not match name fingerprint {fingerprint}", None, None
+    elif not expected_sha256:
+        return None, None, None
+    if expected_sha256 and actual != expected_sha256:
+        return None, actual, len(data)
+    return None, None, None
+
+
+def _orphan_files(known: set) -> List[Path]:
+    """Файлы кеша, которых нет в манифесте (производные .gz/.br не считаются)."""
+    if not media_cache.CACHE_ROOT.exists():
+        return []
+    orphans = []
+    for path in media_cache.CACHE_ROOT.rglob("*"):
+        if not media_cache._is_cache_entry(path):
+            continue
+        if path.as_posix() not in known:
+            orphans.append(path)
+    return orphans
+
+
+def repair(machine_ids: List[int]) -> None:
+    from app.config import Settings
+    from app.database import SessionLocal
+    from app.models import CoffeeMachine
+    from app.seafile_client import SeafileClient
+    from scripts.warm_media_cache import snapshot
+
+    settings = Settings()
+    client = SeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
+    db = SessionLocal()
+    try:
+        machines = [snapshot(m) for m in db.query(CoffeeMachine).filter(CoffeeMachine.id.in_(machine_ids)).all()]
+    finally:
+        db.close()
+    for m in machines:
+        stats = media_cache.warm_machine_media(m, client)
+        print(f"  🔁 id={m.id} {m.model or m.name}: скачано {stats['cached']}, ошибок {stats['failed']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка целостности кеша картинок")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dry-run", action="store_true", help="Только отчёт")
+    parser.add_argument("--repair", action="store_true", help="Перекачать битые файлы после проверки")
+    args = parser.parse_args()
+
+    assets = [a for a in media_manifest.all_assets() if a.local_url]
+    known = {media_cache.local_path(a.local_url).as_posix() for a in assets}
+    orphans = _orphan_files(known)
+    jobs = [(media_cache.local_path(a.local_url).as_posix(), a.sha256) for a in assets]
+    jobs += [(p.as_posix(), None) for p in orphans]
+    print(f"🔍 Проверяем {len(assets)} файлов из манифеста и {len(orphans)} файлов без записи, потоков: {args.workers}")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        results = list(pool.map(_check, jobs, chunksize=16))
+    elapsed = time.perf_counter() - started
+
+    good_ids: List[int] = []
+    bad_machines = set()
+    bad = 0
+    restamped = 0
+    for (path, _), (problem, sha256, size), asset in zip(jobs, results, assets + [None] * len(orphans)):
+        if problem is None:
+            if asset is not None:
+                good_ids.append(asset.id)
+                if sha256 is not None:
+                    restamped += 1
+                    print(f"🔄 {path}: sha256 в манифесте устарел, записываем {sha256[:12]} ({size:,} bytes)")
+                    if not args.dry_run:
+                        media_manifest.update_checksum(asset.id, size, sha256)
+            continue
+        bad += 1
+        print(f"❌ {path}: {problem}")
+        if args.dry_run:
+            continue
+        if asset is not None:
+            media_cache.quarantine_asset(asset, problem)
+            bad_machines.add(asset.machine_id)
+        else:
+            media_integrity.quarantine(Path(path), media_cache.CACHE_ROOT)
+
+    if not args.dry_run:
+        media_manifest.mark_verified(good_ids)
+
+    print("=" * 60)
+    print(f"✅ Проверено: {len(jobs)} за {elapsed:.1f} с ({len(jobs) / elapsed if elapsed else 0:.0f} файлов/с)")
+    print(f"   В порядке: {len(jobs) - bad}")
+    print(f"   Битых: {bad}")
+    if restamped:
+        print(f"   Обновлён sha256 в манифесте: {restamped}")
+    if bad and not args.dry_run:
+        print(f"   Перенесены в {media_integrity.QUARANTINE_ROOT}")
+
+    if bad_machines:
+        if args.repair:
+            print(f"\n🔁 Перекачиваем файлы для {len(bad_machines)} записей")
+            repair(sorted(bad_machines))
+        else:
+            print("ℹ️  Записи сняты с кеша и будут скачаны заново при прогреве или первом запросе (--repair — сразу)")
+
+
+if __name__ == "__main__":
+    main()
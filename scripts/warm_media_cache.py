@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Параллельный прогрев кеша картинок (main + design_images + gallery) с возобновлением.
+
+В отличие от refresh_media_cache.py:
+  - ничего не удаляет: файлы, которые уже есть в манифесте (media_assets) и не поменялись
+    в Seafile, пропускаются;
+  - машины обрабатываются в N потоков (--workers);
+  - прогресс пишется в файл после каждой машины, прерванный запуск продолжается с того же места
+    (машина считается готовой только после коммита её main_image; с --ids файл прогресса не используется);
+  - main_image в БД обновляется пачками (--batch-size), а не коммитом на каждую машину;
+  - выводится скорость и оценка оставшегося времени.
+
+Использование:
+    python scripts/warm_media_cache.py
+    python scripts/warm_media_cache.py --workers 16 --batch-size 100
+    python scripts/warm_media_cache.py --force         # перекачать всё, даже свежие файлы
+    python scripts/warm_media_cache.py --restart       # игнорировать сохранённый прогресс
+    python scripts/warm_media_cache.py --ids 10 11 12  # только указанные записи
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Set
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.config import Settings
+from app.database import SessionLocal
+from app.models import CoffeeMachine
+from app.seafile_client import SeafileClient
+from app.services import media_cache
+
+DEFAULT_PROGRESS_FILE = ROOT / ".warm_media_cache.json"
+MACHINE_FIELDS = ("id", "name", "model", "main_image", "main_image_path", "gallery_folder", "design_images")
+
+
+def load_progress(path: Path) -> Set[int]:
+    if not path.exists():
+        return set()
+    try:
+        return set(json.loads(path.read_text(encoding="utf-8")).get("done", []))
+    except (ValueError, OSError):
+        print(f"⚠️  Не удалось прочитать {path}, начинаем заново")
+        return set()
+
+
+def save_progress(path: Path, done: Set[int]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"done": sorted(done), "updated_at": time.time()}), encoding="utf-8")
+    tmp.replace(path)
+
+
+def snapshot(machine: CoffeeMachine) -> SimpleNamespace:
+    """ORM-объекты нельзя делить между потоками — отдаём воркерам копию нужных полей."""
+    return SimpleNamespace(**{field: getattr(machine, field, None) for field in MACHINE_FIELDS})
+
+
+def warm_one(machine: SimpleNamespace, client: SeafileClient, force: bool) -> Dict:
+    stats = media_cache.warm_machine_media(machine, client, force=force)
+    stats["main"] = media_cache.get_cached_main(machine.id)
+    if not stats["main"]:
+        gallery = media_cache.get_cached_gallery(machine.id)
+        # Как и в refresh_media_cache: если main не скачался, но есть галерея — берём первую картинку
+        stats["main"] = gallery[0] if gallery else None
+    return stats
+
+
+def flush_main_images(pending: Dict[int, str]) -> int:
+    """Одна транзакция на пачку обновлений main_image."""
+    if not pending:
+        return 0
+    db = SessionLocal()
+    try:
+        machines = db.query(CoffeeMachine).filter(CoffeeMachine.id.in_(list(pending))).all()
+        for m in machines:
+            m.main_image = pending[m.id]
+        db.commit()
+        return len(machines)
+    finally:
+        db.close()
+        pending.clear()
+
+
+def format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Параллельный прогрев кеша картинок")
+    parser.add_argument("--workers", type=int, default=8, help="Число параллельных потоков (по умолчанию 8)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Сколько обновлений main_image коммитить разом")
+    parser.add_argument("--progress-file", type=Path, default=DEFAULT_PROGRESS_FILE)
+    parser.add_argument("--force", action="store_true", help="Перекачать и свежие файлы")
+    parser.add_argument("--restart", action="store_true", help="Не продолжать прошлый запуск")
+    parser.add_argument("--ids", type=int, nargs="*", help="Обработать только эти записи")
+    args = parser.parse_args()
+
+    settings = Settings()
+    client = SeafileClient(settings.seafile_server, settings.seafile_repo_id, settings.seafile_token)
+
+    db = SessionLocal()
+    try:
+        query = db.query(CoffeeMachine).order_by(CoffeeMachine.id)
+        if args.ids:
+            query = query.filter(CoffeeMachine.id.in_(args.ids))
+        machines: List[SimpleNamespace] = [snapshot(m) for m in query.all()]
+    finally:
+        db.close()
+
+    # --ids — разовый прогон выбранных записей: общий файл прогресса не читаем и не трогаем
+    use_progress = not args.ids
+    done = load_progress(args.progress_file) if use_progress and not args.restart else set()
+    todo = [m for m in machines if m.id not in done]
+    print(f"🔥 Прогрев кеша: {len(todo)} из {len(machines)} записей, потоков: {args.workers}")
+    if done and len(todo) < len(machines):
+        print(f"ℹ️  Продолжаем прошлый запуск: {len(machines) - len(todo)} уже готовы ({args.progress_file})")
+
+    totals = {"cached": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    pending: Dict[int, str] = {}
+    # Готовы, но их main_image ещё не закоммичен — в прогресс попадут после flush
+    awaiting: Set[int] = set()
+    updated_db = 0
+    started = time.perf_counter()
+
+    def mark_done(ids) -> None:
+        done.update(ids)
+        if use_progress:
+            save_progress(args.progress_file, done)
+
+    def flush() -> None:
+        nonlocal updated_db
+        updated_db += flush_main_images(pending)
+        if awaiting:
+            mark_done(awaiting)
+            awaiting.clear()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {pool.submit(warm_one, m, client, args.force): m for m in todo}
+            for index, future in enumerate(as_completed(futures), 1):
+                m = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as exc:
+                    print(f"[FAIL] id={m.id} model={m.model or m.name}: {exc}")
+                    continue
+
+                for key in totals:
+                    totals[key] += stats[key]
+                needs_update = bool(stats["main"] and m.main_image != stats["main"])
+                if needs_update:
+                    pending[m.id] = stats["main"]
+
+                # Записи с ошибками не отмечаем: при следующем запуске они будут повторены.
+                # Прогресс сохраняется в основном потоке, поэтому файл не пишут несколько потоков сразу
+                if not stats["failed"]:
+                    if needs_update:
+                        awaiting.add(m.id)
+                    else:
+                        mark_done([m.id])
+                if len(pending) >= args.batch_size:
+                    flush()
+
+                elapsed = time.perf_counter() - started
+                rate = index / elapsed if elapsed else 0.0
+                eta = (len(todo) - index) / rate if rate else 0.0
+                print(
+                    f"[{index}/{len(todo)}] id={m.id} {m.model or m.name}: "
+                    f"+{stats['cached']} ={stats['skipped']} !{stats['failed']} | "
+                    f"{rate:.2f} зап/с, {totals['bytes'] / 1024 / 1024 / max(elapsed, 1e-6):.1f} MB/s, ETA {format_eta(eta)}"
+                )
+    finally:
+        # И при Ctrl-C: накопленные main_image коммитятся, и только потом их машины отмечаются готовыми
+        flush()
+
+    elapsed = time.perf_counter() - started
+
+    print("=" * 60)
+    print(f"✅ Готово за {format_eta(elapsed)}")
+    print(f"   Скачано: {totals['cached']} ({totals['bytes'] / 1024 / 1024:.1f} MB)")
+    print(f"   Пропущено (свежие): {totals['skipped']}")
+    print(f"   Ошибок: {totals['failed']}")
+    print(f"   main_image обновлён в БД: {updated_db}")
+
+    if not use_progress:
+        return
+    if {m.id for m in machines} <= done:
+        # Полный проход завершён — следующий запуск начнётся с начала
+        args.progress_file.unlink(missing_ok=True)
+    else:
+        print(f"ℹ️  Прогресс сохранён в {args.progress_file}")
+
+
+if __name__ == "__main__":
+    main()